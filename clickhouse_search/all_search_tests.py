@@ -1,13 +1,17 @@
-import re
+from clickhouse_driver.dbapi.errors import OperationalError as DriverOperationalError
+from clickhouse_driver.errors import ErrorCodes, ServerException
 from collections import defaultdict
 from datetime import timedelta
 from django.core.management import call_command
 from django.db import connections
+from django.db.utils import OperationalError
 from django.urls.base import reverse
+from fnmatch import fnmatch
 import json
 import mock
 import random
 import responses
+import time
 
 from clickhouse_search.models.gt_stats_models import ProjectGtStatsSnvIndel, \
     ProjectsToGtStatsGRCh37SnvIndel, ProjectsToGtStatsSnvIndel, ProjectsToGtStatsMito, ProjectsToGtStatsSv, \
@@ -24,7 +28,8 @@ from clickhouse_search.models.reference_data_models import ClinvarMvSnvIndel, Cl
     TopmedGRCh37Dict, GnomadmitoMv, GnomadmitoDict, GnomadmitoheteroplasmyMv, GnomadmitoheteroplasmyDict, HelixmitoMv, \
     HelixmitoDict, HelixmitoheteroplasmyMv, HelixmitoheteroplasmyDict, ScreenDict, MitomapMv, MitomapDict, Absplice2Mv, \
     Absplice2Dict, PromoterAIMv, PromoterAIDict, PextSnvIndelMv, PextSnvIndelDict, PextMitoMv, PextMitoDict
-from clickhouse_search.models.search_models import EntriesSnvIndel, VariantsSnvIndel, EntriesSv, EntriesGcnv
+from clickhouse_search.models.search_models import EntriesSnvIndel, VariantsSnvIndel, EntriesSv, EntriesGcnv, \
+    SearchResultKeys
 from clickhouse_search.test_utils import VARIANT1, VARIANT2, VARIANT3, VARIANT4, CACHED_CONSEQUENCES_BY_KEY, \
     VARIANT_ID_SEARCH, VARIANT_IDS, LOCATION_SEARCH, GENE_IDS, SELECTED_TRANSCRIPT_MULTI_FAMILY_VARIANT, \
     SELECTED_ANNOTATION_TRANSCRIPT_VARIANT_4, SELECTED_ANNOTATION_TRANSCRIPT_VARIANT_3, COMP_HET_ALL_PASS_FILTERS, \
@@ -40,12 +45,14 @@ from clickhouse_search.test_utils import VARIANT1, VARIANT2, VARIANT3, VARIANT4,
     format_cached_variant
 from reference_data.models import Omim
 from seqr.models import Project, Family, Dataset, VariantSearch, VariantSearchResults, Individual
+from seqr.utils.liftover_utils import LIFTOVERS, _liftover_coordinate
 from seqr.views.apis.data_manager_api import trigger_delete_project
 from seqr.views.utils.test_utils import AnvilAuthenticationTestCase, GENE_VARIANT_FIELDS, MATCHMAKER_SUBMISSION_FIELDS, \
     SAVED_VARIANT_DETAIL_FIELDS, FUNCTIONAL_FIELDS, TAG_FIELDS, FAMILY_FIELDS, INDIVIDUAL_FIELDS, IGV_SAMPLE_FIELDS, \
     FAMILY_NOTE_FIELDS, GENE_VARIANT_DISPLAY_FIELDS, LOCUS_LIST_FIELDS
 from seqr.views.apis.variant_search_api import query_variants_handler, get_variant_gene_breakdown, export_variants_handler, \
-    query_single_variant_handler, variant_lookup_handler
+    query_single_variant_handler, variant_lookup_handler, variant_lookup_batch_handler
+from seqr.views.utils.variant_utils import get_search_results_cache_id
 
 
 SEARCH_RESPONSE_KEYS = {
@@ -116,6 +123,22 @@ class ClickhouseSearchTests(ClickhouseSearchTestCase):
         patcher = mock.patch('seqr.utils.redis_utils.redis.StrictRedis')
         self.mock_redis = patcher.start().return_value
         self.mock_redis.get.side_effect = self.MOCK_CACHE.get
+        self.mock_redis.mget.side_effect = lambda keys: [self.MOCK_CACHE.get(key) for key in keys]
+        self.mock_redis.lrange.side_effect = lambda key, start, end: self.MOCK_CACHE.get(key, [])[start:(end + 1) or None]
+        self.mock_redis.keys.side_effect = lambda pattern: [
+            key for key in list(self.MOCK_CACHE.keys()) if fnmatch(key, pattern)
+        ]
+        self.mock_redis_pipeline = self.mock_redis.pipeline.return_value
+        pipeline_results = []
+        def _pipeline_command(command):
+            return lambda *args, **kwargs: pipeline_results.append(command(*args))
+        self.mock_redis_pipeline.delete.side_effect = _pipeline_command(lambda key: self.MOCK_CACHE.pop(key, None))
+        self.mock_redis_pipeline.rpush.side_effect = _pipeline_command(
+            lambda key, *values: self.MOCK_CACHE.setdefault(key, []).extend(values))
+        self.mock_redis_pipeline.set.side_effect = _pipeline_command(lambda key, value: self.MOCK_CACHE.update({key: value}))
+        self.mock_redis_pipeline.lindex.side_effect = _pipeline_command(
+            lambda key, index: self.MOCK_CACHE[key][index] if index < len(self.MOCK_CACHE.get(key, [])) else None)
+        self.mock_redis_pipeline.execute.side_effect = lambda: [pipeline_results.pop(0) for _ in list(pipeline_results)]
         self.addCleanup(patcher.stop)
 
         patcher = mock.patch('seqr.models.VariantSearchResults._compute_guid')
@@ -123,21 +146,57 @@ class ClickhouseSearchTests(ClickhouseSearchTestCase):
         self.mock_results_guid.return_value = random.randint(1000, 10000)  # nosec
         self.addCleanup(patcher.stop)
 
+        # Liftover instances and results are memoized per process, so must not leak between tests mocking LiftOver
+        LIFTOVERS.clear()
+        _liftover_coordinate.cache_clear()
+        self.addCleanup(LIFTOVERS.clear)
+        self.addCleanup(_liftover_coordinate.cache_clear)
+
         super().setUp()
 
     def set_cache(self, cache_key, cached):
         self.MOCK_CACHE[cache_key] = json.dumps(cached)
-        self.mock_redis.keys.side_effect = lambda pattern: [
-            key for key in list(self.MOCK_CACHE.keys()) if re.match(pattern, key)
-        ]
+
+    def set_search_cache(self, cache_key, cached):
+        self.MOCK_CACHE[cache_key] = [json.dumps(variant) for variant in cached]
+        self.MOCK_CACHE[f'{cache_key}__total'] = str(len(cached))
 
     def assert_cached_results(self, expected_results, cache_key):
-        self.mock_redis.set.assert_any_call(cache_key, mock.ANY)
+        self.mock_redis.set.assert_any_call(cache_key, mock.ANY, ex=timedelta(weeks=2))
         call_index = next(i for i, call in enumerate(self.mock_redis.set.call_args_list) if call.args[0] == cache_key)
         self.assertEqual(json.loads(self.mock_redis.set.call_args_list[call_index].args[1]), expected_results)
-        self.mock_redis.expire.assert_any_call(cache_key, timedelta(weeks=2))
         self.mock_redis.set.reset_mock()
-        self.mock_redis.expire.reset_mock()
+
+    @staticmethod
+    def get_search_cache_key_prefix(search_hash=None, families=None, search=None):
+        if search_hash:
+            results_model = VariantSearchResults.objects.get(search_hash=search_hash)
+            families = results_model.families.all()
+            search = results_model.variant_search.search
+        return f'search_results__{get_search_results_cache_id(families, search)}'
+
+    def assert_cached_search_results(self, expected_results, search_hash, sort):
+        cache_key_prefix = self.get_search_cache_key_prefix(search_hash)
+        if f'{cache_key_prefix}__xpos' not in self.MOCK_CACHE:
+            # Searches sorted in clickhouse only cache the requested page
+            page_cache_key, cached_page = next(
+                call.args[:2] for call in self.mock_redis.set.call_args_list
+                if call.args[0].startswith(f'{cache_key_prefix}__{sort}__')
+            )
+            start, end = [int(i) for i in page_cache_key.split('__')[-1].split('_')]
+            self.assertEqual(json.loads(cached_page), expected_results[start:end + 1])
+            self.mock_redis.set.assert_any_call(page_cache_key, mock.ANY, ex=timedelta(weeks=2))
+            return
+
+        cached_results = [json.loads(variant) for variant in self.MOCK_CACHE.get(f'{cache_key_prefix}__xpos', [])]
+        if sort != 'xpos':
+            cached_results = [
+                cached_results[i][::-1] if reverse_pair else cached_results[i] for i, reverse_pair in
+                [json.loads(sort_order) for sort_order in self.MOCK_CACHE.get(f'{cache_key_prefix}__{sort}', [])]
+            ]
+        self.assertEqual(cached_results, expected_results)
+        self.mock_redis_pipeline.expire.assert_any_call(f'{cache_key_prefix}__{sort}', timedelta(weeks=2))
+        self.mock_redis_pipeline.expire.reset_mock()
 
     def _execute_search(self, sort='xpos', inheritance_mode=None, inheritance_filter=None, quality_filter=None, project_families=None, request_body=None, check_login=None, query_params=None, search_hash=None, **search_kwargs):
         search_hash = search_hash or random.randint(1000, 9000000)  # nosec
@@ -196,9 +255,8 @@ class ClickhouseSearchTests(ClickhouseSearchTestCase):
         self.assertDictEqual(response.json(), expected_response)
 
         if not skip_cache_check:
-            cache_key = f'search_results__VRS{search_hash:07d}__{cache_sort or sort}'
             cached_variants = self._format_cached_variants(expected_results, cached_variant_fields=cached_variant_fields)
-            self.assert_cached_results(cached_variants, cache_key)
+            self.assert_cached_search_results(cached_variants, search_hash, cache_sort or sort)
 
         if gene_counts:
             self._assert_expected_gene_counts(search_hash, gene_counts)
@@ -224,7 +282,12 @@ class ClickhouseSearchTests(ClickhouseSearchTestCase):
         url = reverse(export_variants_handler, args=[search_hash])
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
-        self.assertListEqual([line.split('\t') for line in response.content.decode().strip('\n').split('\n')], export_data)
+        # Results are read from the cache before the response starts streaming
+        cached = {**self.MOCK_CACHE}
+        self.MOCK_CACHE.clear()
+        content = b''.join(response.streaming_content).decode()
+        self.MOCK_CACHE.update(cached)
+        self.assertListEqual([line.split('\t') for line in content.strip('\n').split('\n')], export_data)
 
     def _assert_expected_search_error(self, error, **kwargs):
         response, search_hash, _ = self._execute_search(**kwargs)
@@ -263,11 +326,17 @@ class ClickhouseSearchTests(ClickhouseSearchTestCase):
             [VARIANT1, VARIANT2, VARIANT3, VARIANT4], gene_counts=variant_gene_counts, locus={'rawItems': '1:1-100000000'},
             exclude_svs=True, project_families=SINGLE_FAMILY_PROJECT_FAMILIES, check_login=self.check_collaborator_login,
         )
+        self.assertIn('sample_metadata__R0001_1kg', self.MOCK_CACHE)
+        self.mock_redis_pipeline.set.reset_mock()
 
         self._assert_expected_search(
             [MITO_VARIANT1, MITO_VARIANT2, MITO_VARIANT3], gene_counts=MITO_GENE_COUNTS, locus={'rawItems': 'M:1-100000000'},
             exclude_svs=False, project_families=SINGLE_FAMILY_PROJECT_FAMILIES,
         )
+        # Sample metadata is loaded from the cache
+        self.assertListEqual([
+            call.args[0] for call in self.mock_redis_pipeline.set.call_args_list if call.args[0].startswith('sample_metadata')
+        ], [])
 
         self._assert_expected_search(
             [GCNV_VARIANT1, GCNV_VARIANT2, GCNV_VARIANT3, GCNV_VARIANT4], gene_counts=GCNV_GENE_COUNTS,
@@ -366,6 +435,45 @@ class ClickhouseSearchTests(ClickhouseSearchTestCase):
             ]
         )
 
+    @mock.patch('clickhouse_search.search.CLICKHOUSE_SEARCH_MAX_WORKERS', 3)
+    def test_concurrent_search(self):
+        self.login_manager()
+        locus = {'rawItems': 'chr1:1-100000000, chr13:1-100000000, chr14:1-100000000, chr16:1-100000000, chr17:1-100000000, M:1-100000000'}
+        self._assert_expected_search(
+            [PROJECT_2_VARIANT, MULTI_PROJECT_VARIANT1, SV_VARIANT1, SV_VARIANT2, MULTI_PROJECT_VARIANT2, VARIANT3,
+             VARIANT4, SV_VARIANT3, GCNV_VARIANT1, GCNV_VARIANT2, GCNV_VARIANT3, SV_VARIANT4, GCNV_VARIANT4, MITO_VARIANT1,
+             MITO_VARIANT2, MITO_VARIANT3], locus=locus, project_families=[
+                *MULTI_PROJECT_PROJECT_FAMILIES, *SV_PROJECT_FAMILIES,
+            ]
+        )
+
+        search_profile = VariantSearchResults.objects.order_by('-id').first().search_profile
+        phases = {phase['phase']: phase for phase in search_profile['phases']}
+        for phase in ['SNV_INDEL:get_search_results', 'MITO:get_search_results', 'add_individual_guids', 'sort_results', 'cache_results']:
+            self.assertIn(phase, phases)
+        self.assertDictEqual(phases['SNV_INDEL:get_search_results']['queries'][0], {
+            'queryId': mock.ANY, 'wallTimeMs': mock.ANY, 'readRows': mock.ANY, 'readBytes': mock.ANY,
+        })
+        self.assertListEqual(phases['cache_results']['queries'], [])
+        self.assertGreater(search_profile['readRows'], 0)
+        self.assertGreaterEqual(search_profile['totalWallTimeMs'], phases['sort_results']['wallTimeMs'])
+
+        with mock.patch('clickhouse_search.search.CLICKHOUSE_SEARCH_QUERY_TIMEOUT', 0.01), mock.patch(
+                'clickhouse_search.search._run_threaded_search_query', side_effect=lambda get_results: time.sleep(1)):
+            self._assert_expected_search_error(
+                'This search took too long to run. Try adding additional filters to narrow the search',
+                locus=locus, project_families=[*MULTI_PROJECT_PROJECT_FAMILIES, *SV_PROJECT_FAMILIES],
+            )
+
+        timeout_error = OperationalError('Timeout exceeded')
+        timeout_error.__cause__ = DriverOperationalError(ServerException('Timeout exceeded', code=ErrorCodes.TIMEOUT_EXCEEDED))
+        with mock.patch('clickhouse_search.search.CLICKHOUSE_SEARCH_MAX_WORKERS', 1), mock.patch(
+                'clickhouse_search.search._evaluate_results', side_effect=timeout_error):
+            self._assert_expected_search_error(
+                'This search took too long to run. Try adding additional filters to narrow the search',
+                locus=locus, project_families=[*MULTI_PROJECT_PROJECT_FAMILIES, *SV_PROJECT_FAMILIES],
+            )
+
     def test_all_project_search(self):
         request_body = {'allGenomeProjectFamilies': '38'}
         self._assert_expected_search_error(
@@ -690,17 +798,14 @@ class ClickhouseSearchTests(ClickhouseSearchTestCase):
     def test_exclude_previous_search_results(self):
         self.mock_results_guid.return_value = 'VRS00079516'
         vsr = VariantSearchResults.objects.create(variant_search_id=79516, search_hash='abc1234')
-        cache_key = f'search_results__{vsr.guid}__gnomad'
-        self.set_cache(cache_key, [
+        cache_key = f'{self.get_search_cache_key_prefix(vsr.search_hash)}__xpos'
+        self.set_search_cache(cache_key, [
             VARIANT1, VARIANT2, [VARIANT3, VARIANT2], [GCNV_VARIANT4, GCNV_VARIANT3],
         ])
 
         request_body = {'projectFamilies': DEFAULT_PROJECT_FAMILIES, 'previousSearchHash': 'abc1234'}
         exclude = {'previousSearch': True}
-        response_search = {
-            'exclude_keys': {'SNV_INDEL': [1, 2]},
-            'exclude_key_pairs': {'SNV_INDEL': [[2, 3]],'SV_WES': [[18, 19]]},
-        }
+        response_search = {'exclude_previous_search_hash': 'abc1234'}
         self._assert_expected_search(
             [[MULTI_DATA_TYPE_COMP_HET_VARIANT2, GCNV_VARIANT4], [VARIANT3, VARIANT4], GCNV_VARIANT3, MITO_VARIANT3],
             inheritance_mode='recessive', **COMP_HET_ALL_PASS_FILTERS,
@@ -710,20 +815,33 @@ class ClickhouseSearchTests(ClickhouseSearchTestCase):
                 {}, {},
             ], check_login=self.check_collaborator_login,
         )
+        self._assert_expected_search_result_keys(vsr, [
+            ('SNV_INDEL', 1, 0), ('SNV_INDEL', 2, 0), ('SNV_INDEL', 2, 3), ('SV_WES', 18, 19), ('_COMPLETE', 0, 0),
+        ])
 
-        self.set_cache(cache_key, [
+        self.mock_results_guid.return_value = 'VRS00079517'
+        vsr = VariantSearchResults.objects.create(variant_search_id=79516, search_hash='abc5678')
+        vsr.families.set(Family.objects.filter(guid='F000002_2'))
+        self.set_search_cache(f'{self.get_search_cache_key_prefix(vsr.search_hash)}__xpos', [
             [MULTI_DATA_TYPE_COMP_HET_VARIANT2, GCNV_VARIANT4], [VARIANT3, VARIANT4], GCNV_VARIANT3, MITO_VARIANT3,
         ])
-        response_search = {
-            'exclude_keys': {'MITO': [8], 'SV_WES': [18]},
-            'exclude_key_pairs': {'SNV_INDEL': [[3, 4]], 'SNV_INDEL,SV_WES': [[2, 19]]},
-        }
+        request_body['previousSearchHash'] = 'abc5678'
+        response_search = {'exclude_previous_search_hash': 'abc5678'}
         self._assert_expected_search(
             [VARIANT2, [GCNV_VARIANT3, GCNV_VARIANT4]], exclude=exclude, **COMP_HET_ALL_PASS_FILTERS,
             request_body=request_body, response_search=response_search, inheritance_mode='recessive', cached_variant_fields=[
                 {}, [{'selectedGeneId': 'ENSG00000275023'}, {'selectedGeneId': 'ENSG00000275023'}],
             ],
         )
+        self._assert_expected_search_result_keys(vsr, [
+            ('MITO', 8, 0), ('SNV_INDEL', 3, 4), ('SNV_INDEL,SV_WES', 2, 19), ('SV_WES', 18, 0), ('_COMPLETE', 0, 0),
+        ])
+
+    def _assert_expected_search_result_keys(self, results_model, expected_keys):
+        search_id = get_search_results_cache_id(results_model.families.all(), results_model.variant_search.search)
+        self.assertListEqual(sorted(SearchResultKeys.objects.filter(search_id=search_id).values_list(
+            'dataset_type', 'key', 'secondary_key',
+        )), expected_keys)
 
     def test_quality_filter(self):
         quality_filter = {'vcf_filter': 'pass'}
@@ -825,6 +943,7 @@ class ClickhouseSearchTests(ClickhouseSearchTestCase):
             [GRCH37_VARIANT], quality_filter=quality_filter, inheritance_filter={'allowNoCall': True}, is_37=True,
         )
 
+    @mock.patch('seqr.views.apis.variant_search_api.EXPORT_CHUNK_SIZE', 1)
     @mock.patch('seqr.views.apis.variant_search_api.MAX_FAMILIES_PER_ROW', 1)
     def test_location_search(self):
         self._assert_expected_search(
@@ -884,6 +1003,45 @@ class ClickhouseSearchTests(ClickhouseSearchTestCase):
             [],locus={'rawVariantItems': VARIANT_IDS[1]},
         )
 
+    @mock.patch('clickhouse_search.search.MAX_VARIANTS', 3)
+    def test_server_sorted_search_page(self):
+        # Searches which run a single query are paged with sorting applied in clickhouse, so even searches with too many
+        # results to cache can be paged
+        search_kwargs = {
+            'locus': {'rawItems': '1:1-100000000'}, 'exclude_svs': True, 'project_families': SINGLE_FAMILY_PROJECT_FAMILIES,
+        }
+        self._assert_expected_search(
+            [VARIANT1, VARIANT2, VARIANT3, VARIANT4], results_page=[VARIANT1, VARIANT2], query_params={'per_page': 2},
+            **search_kwargs,
+        )
+        self.mock_redis_pipeline.rpush.assert_not_called()
+
+        # The total is cached, so later pages skip the count
+        total_cache_key = next(
+            call.args[0] for call in self.mock_redis.set.call_args_list if call.args[0].endswith('__total')
+        )
+        self.mock_redis.set.assert_any_call(total_cache_key, '{"total": 4}', ex=timedelta(weeks=2))
+        self.MOCK_CACHE[total_cache_key] = '{"total": 4}'
+        with mock.patch('seqr.views.apis.variant_search_api.get_clickhouse_variants') as mock_get_variants, mock.patch(
+                'clickhouse_search.managers.SearchQuerySet.count') as mock_count:
+            self._assert_expected_search(
+                [VARIANT1, VARIANT2, VARIANT3, VARIANT4], results_page=[VARIANT3, VARIANT4], skip_cache_check=True,
+                query_params={'per_page': 2, 'page': 2}, **search_kwargs,
+            )
+            mock_get_variants.assert_not_called()
+            mock_count.assert_not_called()
+
+            # Score sorts are also applied in clickhouse
+            self._assert_expected_search(
+                [VARIANT4, VARIANT3, VARIANT2, VARIANT1], results_page=[VARIANT4, VARIANT3], skip_cache_check=True,
+                sort='cadd', query_params={'per_page': 2}, **search_kwargs,
+            )
+            mock_get_variants.assert_not_called()
+        self.mock_redis_pipeline.rpush.assert_not_called()
+
+        # Sorts which require gene metadata are not applied in clickhouse
+        self._assert_expected_search_error('This search returned too many results', sort='prioritized_gene', **search_kwargs)
+
     @mock.patch('seqr.views.apis.variant_search_api.MAX_EXPORT_VARIANTS', 2)
     @mock.patch('clickhouse_search.search.MAX_GENES_FOR_FILTER', 2)
     @mock.patch('clickhouse_search.search.MAX_NO_LOCATION_COMP_HET_FAMILIES', 1)
@@ -902,7 +1060,7 @@ class ClickhouseSearchTests(ClickhouseSearchTestCase):
             'Invalid variants: 2-A-C', locus={'rawVariantItems': 'chr2-A-C'},
         )
 
-        self.set_cache(f'search_results__VRS{search_hash:07d}__xpos', [VARIANT1, VARIANT2, VARIANT3, VARIANT4])
+        self.set_search_cache(f'{self.get_search_cache_key_prefix(search_hash)}__xpos', [VARIANT1, VARIANT2, VARIANT3, VARIANT4])
         export_url = reverse(export_variants_handler, args=[search_hash])
         response = self.client.get(export_url)
         self.assertEqual(response.status_code, 400)
@@ -1007,7 +1165,7 @@ class ClickhouseSearchTests(ClickhouseSearchTestCase):
         response = self.client.get(export_url)
         self.assertEqual(response.status_code, 403)
 
-    @mock.patch('clickhouse_search.search.LiftOver')
+    @mock.patch('seqr.utils.liftover_utils.LiftOver')
     def test_variant_lookup(self, mock_liftover):
         mock_convert_coordinate = mock_liftover.return_value.convert_coordinate
         mock_convert_coordinate.side_effect = lambda chrom, pos: [(chrom, pos + 10000)]
@@ -1547,6 +1705,62 @@ class ClickhouseSearchTests(ClickhouseSearchTestCase):
         },
     }
 
+    @mock.patch('seqr.utils.liftover_utils.LiftOver')
+    def test_variant_lookup_batch(self, mock_liftover):
+        mock_liftover.return_value.convert_coordinate.side_effect = lambda chrom, pos: [(chrom, pos + 10000)]
+        url = reverse(variant_lookup_batch_handler)
+        self.check_require_login(url)
+        self.login_manager()
+
+        response = self.client.post(url, content_type='application/json', data=json.dumps({'variantIds': []}))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'No variants specified')
+
+        response = self.client.post(url, content_type='application/json', data=json.dumps({
+            'variantIds': [f'1-{i}-A-G' for i in range(1001)]
+        }))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Unable to look up more than 1000 variants (1001 requested)')
+
+        # Batch results should match the results of looking up each variant individually
+        found_variant_ids = ['1-10439-AC-A', '21-3343353-GAGA-G']
+        expected_variants = {}
+        expected_individuals = {}
+        for variant_id in found_variant_ids:
+            response = self.client.get(f'{reverse(variant_lookup_handler)}?variantId={variant_id}')
+            self.assertEqual(response.status_code, 200)
+            expected_variants.update(response.json()['variantsById'])
+            expected_individuals.update(response.json()['individualsByGuid'])
+        self.MOCK_CACHE.clear()
+        self.mock_redis_pipeline.set.reset_mock()
+
+        body = json.dumps({'variantIds': [
+            '1-10439-AC-A', '21-3343353-GAGA-G', '1-91511686-TCA-G', 'phase2_DEL_chr14_4640', '1-10439-AC-A',
+        ]})
+        response = self.client.post(url, content_type='application/json', data=body)
+        self.assertEqual(response.status_code, 200)
+        response_json = response.json()
+        self.assertDictEqual(response_json['variantsById'], expected_variants)
+        self.assertDictEqual(response_json['individualsByGuid'], expected_individuals)
+        self.assertDictEqual(response_json['lookupErrors'], {
+            '1-91511686-TCA-G': 'Variant not present in seqr',
+            'phase2_DEL_chr14_4640': 'Sample type must be specified to look up a structural variant',
+        })
+        self.assertSetEqual(
+            {call.args[0] for call in self.mock_redis_pipeline.set.call_args_list if call.args[0].startswith('variant_lookup')},
+            {f'variant_lookup_results__{variant_id}__38' for variant_id in found_variant_ids},
+        )
+
+        # Cached variants are not looked up again
+        self.mock_redis_pipeline.set.reset_mock()
+        response = self.client.post(url, content_type='application/json', data=body)
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(response.json()['variantsById'], expected_variants)
+        self.mock_redis.mget.assert_any_call([
+            f'variant_lookup_results__{variant_id}__38' for variant_id in [*found_variant_ids, '1-91511686-TCA-G', 'phase2_DEL_chr14_4640']
+        ])
+        self.mock_redis_pipeline.set.assert_not_called()
+
     def _assert_expected_lookup(self, variant_id, variant, cache_key, genome_version='38', hom_only=False, affected_only=False, project_guids=None, family_guids=None, individual_guids=None, expected_individuals=None, skip_fields=None, cached_variants=None, additional_variant=None, sample_type=None, **kwargs):
         url = f'{reverse(variant_lookup_handler)}?variantId={variant_id}&genomeVersion={genome_version}'
         if hom_only:
@@ -1652,7 +1866,9 @@ class ClickhouseSearchTests(ClickhouseSearchTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertDictEqual(response.json()['variantsById'], {'7-143270172-A-G': GRCH37_VARIANT})
 
-        self.assertTrue(all(call.args[0].startswith('projects__') for call in self.mock_redis.get.mock_calls))
+        self.assertTrue(all(
+            call.args[0].startswith(('projects__', 'cache_namespace_version__')) for call in self.mock_redis.get.mock_calls
+        ))
         self.assertTrue(all(call.args[0].startswith('projects__') for call in self.mock_redis.set.mock_calls))
 
     def test_frequency_filter(self):
@@ -2657,14 +2873,22 @@ class ClickhouseSearchTests(ClickhouseSearchTestCase):
 
     def test_cached_query_variants(self):
         search_hash = 987
-        cache_key_prefix = 'search_results__VRS0000987'
+        cache_key_prefix = self.get_search_cache_key_prefix(
+            families=Family.objects.filter(guid__in=DEFAULT_PROJECT_FAMILIES[0]['familyGuids']),
+            search={'inheritance': {'mode': None}, 'freqs': {'callset': {'ac': 1000}}, 'qualityFilter': None},
+        )
         cached_variants = [VARIANT1, SV_VARIANT1, GCNV_VARIANT1, MITO_VARIANT1, VARIANT2]
         cache_result = self._format_cached_variants(cached_variants)
-        self.set_cache(f'{cache_key_prefix}__xpos', cache_result)
+        self.set_search_cache(f'{cache_key_prefix}__xpos', cache_result)
 
         self._assert_expected_search(
             cached_variants, search_hash=search_hash, skip_cache_check=True, check_login=self.check_collaborator_login,
         )
+        details_cache_keys = [
+            f'variant_details__38__SNV_INDEL__result__{key}' for key in sorted([VARIANT1['key'], VARIANT2['key']])
+        ]
+        for cache_key in details_cache_keys:
+            self.assertIn(cache_key, self.MOCK_CACHE)
 
         self._assert_expected_search(
             cached_variants,  search_hash=search_hash, skip_cache_check=True,
@@ -2676,9 +2900,15 @@ class ClickhouseSearchTests(ClickhouseSearchTestCase):
             },
         )
 
+        self.mock_redis_pipeline.set.reset_mock()
         self._assert_expected_search(
             [VARIANT2, VARIANT1, SV_VARIANT1, GCNV_VARIANT1, MITO_VARIANT1], search_hash=search_hash, sort='cadd',
         )
+        # Variant details are loaded from the cache
+        self.mock_redis.mget.assert_any_call(details_cache_keys)
+        self.assertListEqual([
+            call.args[0] for call in self.mock_redis_pipeline.set.call_args_list if call.args[0].startswith('variant_details')
+        ], [])
 
 class ClickhouseDeleteDataTests(ClickhouseSearchTestCase):
     databases = '__all__'
@@ -3,7 +3,7 @@ from collections import OrderedDict, defaultdict
 
 from django.db.models import Count, F, QuerySet, Q, Value
 from django.db.models.expressions import Col
-from django.db.models.functions import Cast
+from django.db.models.functions import Cast, Coalesce
 from django.db.models.sql.constants import INNER
 
 from clickhouse_search.backend.fields import NestedField, NamedTupleField
@@ -18,7 +18,8 @@ from clickhouse_search.constants import INHERITANCE_FILTERS, ANY_AFFECTED, AFFEC
     EXTENDED_SPLICE_REGION_CONSEQUENCE, CLINVAR_PATH_RANGES, CLINVAR_PATH_SIGNIFICANCES, CLINVAR_LIKELY_PATH_FILTER, \
     CLINVAR_CONFLICTING_P_LP, CLINVAR_CONFLICTING_NO_P, CLINVAR_CONFLICTING, PATH_FREQ_OVERRIDE_CUTOFF, \
     HGMD_CLASS_FILTERS, SV_TYPE_FILTER_FIELD, SV_CONSEQUENCES_FIELD, COMPOUND_HET, COMPOUND_HET_ALLOW_HOM_ALTS, \
-    X_LINKED_RECESSIVE_MALE_AFFECTED, FEMALE_SEXES, SV_ANNOTATION_TYPES
+    X_LINKED_RECESSIVE_MALE_AFFECTED, FEMALE_SEXES, SV_ANNOTATION_TYPES, XPOS_SORT_KEY, PREDICTION_SORTS, MAX_SORT_RANK, \
+    MIN_PRED_SORT_RANK
 from seqr.utils.xpos_utils import get_xpos, parse_variant_id, MIN_POS, MAX_POS, CHROMOSOME_CHOICES
 
 
@@ -28,6 +29,9 @@ class InvalidSearchException(Exception):
 class InvalidDatasetTypeException(Exception):
     pass
 
+class TooManyResultsException(InvalidSearchException):
+    pass
+
 
 class SearchQuerySet(QuerySet):
 
@@ -35,6 +39,12 @@ class SearchQuerySet(QuerySet):
     def table_basename(self):
         return self.model._meta.db_table.rsplit('/', 1)[0]
 
+    def settings(self, **kwargs):
+        # Search models use the default django query class, but the clickhouse compiler still adds any query settings
+        clone = self._chain()
+        clone.query.setting_info = {**getattr(clone.query, 'setting_info', {}), **kwargs}
+        return clone
+
     @staticmethod
     def _pathogenicity_tuple(model, field_prefix, **kwargs):
         fields = OrderedDict({
@@ -220,6 +230,19 @@ class BaseVariantsQuerySet(SearchQuerySet):
 
     SELECTED_GENE_FIELD = 'selectedGeneId'
 
+    # Sorts which only depend on a single numeric field of the variant itself can be applied in clickhouse. Each sort
+    # is a list of the possible fields to sort on, the first of which present for the dataset type is used, along with
+    # the value to sort missing fields by and whether to sort descending, matching the python sort. Position and then
+    # the variant key are used as tiebreakers so pagination is deterministic
+    SERVER_SORT_FIELDS = {
+        XPOS_SORT_KEY: ([], None, False),
+        'gnomad': ([
+            'populations__gnomad_genomes__af', 'populations__gnomad_mito__af', 'populations__gnomad_svs__af',
+        ], MAX_SORT_RANK, False),
+        'gnomad_exomes': (['populations__gnomad_exomes__af'], MAX_SORT_RANK, False),
+        **{sort: ([f'predictions__{sort}'], MIN_PRED_SORT_RANK, True) for sort in PREDICTION_SORTS},
+    }
+
     @property
     def key_lookup_model(self):
         return next(obj.related_model for obj in self.model._meta.related_objects if obj.name.startswith('keylookup'))
@@ -353,6 +376,22 @@ class BaseVariantsQuerySet(SearchQuerySet):
             **{f'{alias}_{field}': value for field, value in query_select.items() if field not in self.skip_annotations},
         )
 
+    def search_sort(self, sort):
+        sort_fields, default, descending = self.SERVER_SORT_FIELDS[sort]
+        sort_field = next((field for field in sort_fields if self._has_tuple_subfield(field)), None)
+        order_by = ['xpos', 'key']
+        if sort_field:
+            sort_expression = Coalesce(F(sort_field), Value(default))
+            order_by.insert(0, sort_expression.desc() if descending else sort_expression.asc())
+        return self.order_by(*order_by)
+
+    def _has_tuple_subfield(self, field):
+        annotation, *subfields = field.split('__')
+        output_field = self.query.annotations[annotation].output_field if annotation in self.query.annotations else None
+        for subfield in subfields:
+            output_field = dict(output_field.base_fields).get(subfield) if isinstance(output_field, NamedTupleField) else None
+        return output_field is not None
+
     def search(self, **kwargs):
         results = self._filter_frequency(self, **kwargs)
         results = self._filter_in_silico(results, **kwargs)
@@ -1020,7 +1059,7 @@ class BaseEntriesManager(SearchQuerySet):
     def search(self, sample_data, exclude_keys=None, **kwargs):
         entries = self
 
-        if exclude_keys:
+        if exclude_keys is not None:
             entries = entries.exclude(key__in=exclude_keys)
 
         entries = self._join_annotations(entries)
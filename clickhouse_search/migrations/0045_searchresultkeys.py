@@ -0,0 +1,34 @@
+# Generated by Django 4.2.27 on 2026-10-18 14:02
+
+import clickhouse_backend.models
+from django.db import migrations
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clickhouse_search', '0044_omimdict'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchResultKeys',
+            fields=[
+                ('search_id', clickhouse_backend.models.StringField()),
+                ('dataset_type', clickhouse_backend.models.StringField(low_cardinality=True)),
+                ('key', clickhouse_backend.models.UInt32Field(primary_key=True, serialize=False)),
+                ('secondary_key', clickhouse_backend.models.UInt32Field(default=0)),
+                ('created_date', clickhouse_backend.models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'seqrdb_search_result_keys',
+                'engine': clickhouse_backend.models.MergeTree(order_by=('search_id', 'dataset_type', 'key')),
+            },
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('_overwrite_base_manager', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.RunSQL('ALTER TABLE "seqrdb_search_result_keys" MODIFY TTL created_date + INTERVAL 14 DAY'),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.27 on 2026-10-18 15:10
+
+import clickhouse_backend.models
+from django.db import migrations
+import django.db.models.manager
+
+
+# The VLM service looks up HPO term labels in this dictionary, so its ClickHouse user must be granted access, i.e.
+# GRANT dictGet ON seqrdb_hpo TO <VLM user>
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clickhouse_search', '0045_searchresultkeys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HpoDict',
+            fields=[
+                ('hpo_id', clickhouse_backend.models.StringField(primary_key=True, serialize=False)),
+                ('name', clickhouse_backend.models.StringField()),
+            ],
+            options={
+                'db_table': 'seqrdb_hpo',
+                'engine': clickhouse_backend.models.MergeTree(primary_key='hpo_id'),
+                'layout': 'HASHED()',
+                'postgres_query': 'SELECT hpo_id, name FROM reference_data_humanphenotypeontology',
+                'postgres_db': 'reference_data',
+            },
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('_overwrite_base_manager', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.RunSQL('SYSTEM RELOAD DICTIONARY "seqrdb_hpo"'),
+    ]
@@ -51,6 +51,18 @@ class OmimDict(Dictionary):
         postgres_query = 'SELECT phenotype_mim_number, phenotype_description FROM reference_data_omim where phenotype_mim_number is not null'
 
 
+class HpoDict(Dictionary):
+    hpo_id = models.StringField(primary_key=True)
+    name = models.StringField()
+
+    class Meta:
+        db_table = 'seqrdb_hpo'
+        engine = models.MergeTree(primary_key='hpo_id')
+        layout = 'HASHED()'
+        postgres_db = 'reference_data'
+        postgres_query = 'SELECT hpo_id, name FROM reference_data_humanphenotypeontology'
+
+
 class IndividualMetadataDict(Dictionary):
     family_guid = models.StringField(primary_key=True)
     sampleId = models.StringField()
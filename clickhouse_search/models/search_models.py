@@ -620,6 +620,20 @@ class ProjectPartitionsDict(Dictionary):
         layout = 'HASHED()' # hashed layout supports string keys
 
 
+
+class SearchResultKeys(models.ClickhouseModel):
+    """The variant keys returned by a search, so subsequent searches can exclude them with a server-side anti-join"""
+    search_id = models.StringField()
+    dataset_type = models.StringField(low_cardinality=True)
+    key = models.UInt32Field(primary_key=True)
+    # Only set for compound heterozygous pairs, where key is the lower key in the pair and so is never 0
+    secondary_key = models.UInt32Field(default=0)
+    created_date = models.DateTimeField()
+
+    class Meta:
+        db_table = 'seqrdb_search_result_keys'
+        engine = models.MergeTree(order_by=('search_id', 'dataset_type', 'key'))
+
 ENTRY_CLASS_MAP = {
     GENOME_VERSION_GRCh37: {Dataset.DATASET_TYPE_VARIANT_CALLS: EntriesGRCh37SnvIndel},
     GENOME_VERSION_GRCh38: {
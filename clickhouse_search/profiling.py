@@ -0,0 +1,71 @@
+from contextlib import contextmanager
+from django.db import connections
+from functools import partial
+import threading
+import time
+import uuid
+
+CLICKHOUSE_READ_ALIAS = 'clickhouse'
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def _profile_query(queries, execute, sql, params, many, context):
+    # The underlying clickhouse driver cursor supports assigning the query ID, which is also recorded in system.query_log
+    db_cursor = getattr(context['cursor'], 'cursor', None)
+    query_id = str(uuid.uuid4())
+    if hasattr(db_cursor, 'set_query_id'):
+        db_cursor.set_query_id(query_id)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        query = {'queryId': query_id, 'wallTimeMs': _elapsed_ms(start)}
+        progress = getattr(getattr(getattr(db_cursor, '_client', None), 'last_query', None), 'progress', None)
+        if progress:
+            query.update({'readRows': progress.rows, 'readBytes': progress.bytes})
+        queries.append(query)
+        if hasattr(db_cursor, 'set_query_id'):
+            db_cursor.set_query_id(None)
+
+
+class SearchProfile(object):
+
+    def __init__(self):
+        """Records the wall time and the ClickHouse queries run in each phase of a search"""
+        self._start = time.perf_counter()
+        self._phases = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        phase = {'phase': name, 'queries': []}
+        start = time.perf_counter()
+        # Database connections are thread local, so queries are only captured for the thread running the phase
+        try:
+            with connections[CLICKHOUSE_READ_ALIAS].execute_wrapper(partial(_profile_query, phase['queries'])):
+                yield phase
+        finally:
+            phase['wallTimeMs'] = _elapsed_ms(start)
+            with self._lock:
+                self._phases.append(phase)
+
+    def profiled(self, name, func):
+        """Returns a callable which runs the given function as a profiled phase"""
+        def wrapped(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+        return wrapped
+
+    def to_json(self):
+        with self._lock:
+            phases = [{**phase, 'queries': list(phase['queries'])} for phase in self._phases]
+        return {
+            'totalWallTimeMs': _elapsed_ms(self._start),
+            'clickhouseWallTimeMs': round(sum(q['wallTimeMs'] for phase in phases for q in phase['queries']), 1),
+            'readRows': sum(q.get('readRows') or 0 for phase in phases for q in phase['queries']),
+            'readBytes': sum(q.get('readBytes') or 0 for phase in phases for q in phase['queries']),
+            'phases': phases,
+        }
@@ -1,31 +1,43 @@
 from clickhouse_backend.models import ArrayField, BoolField, StringField, UInt32Field
+from clickhouse_driver.errors import ErrorCodes
 from collections import defaultdict
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import timedelta
 from django.contrib.postgres.aggregates import ArrayAgg
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import connections
-from django.db.models import Count, F, Min, Q
-from django.db.models.functions import JSONObject
+from django.db.models import F, Min, Q
 from django.db.utils import OperationalError
+from django.utils import timezone
+from functools import partial
 import json
-from pyliftover.liftover import LiftOver
+import numpy as np
 
 from clickhouse_search.backend.fields import NamedTupleField
 from clickhouse_search.backend.functions import Array, ArrayFilter, ArrayIntersect, ArraySort, GroupArrayArray, If, Tuple, \
     ArrayMap, Modulo
-from clickhouse_search.managers import InvalidDatasetTypeException, InvalidSearchException
+from clickhouse_search.managers import BaseVariantsQuerySet, InvalidDatasetTypeException, InvalidSearchException, \
+    TooManyResultsException
 from clickhouse_search.models.gt_stats_models import PROJECT_GT_STATS_VIEW_CLASS_MAP
 from clickhouse_search.models.postgres_dicts import SexDict, AffectedDict, IndividualMetadataDict, ExcludedVariantDict
 from clickhouse_search.models.reference_data_models import BaseClinvar, BaseHgmd
 from clickhouse_search.models.search_models import BaseVariants, BaseVariantsSvGcnv, EntriesSnvIndel,  \
-    ENTRY_CLASS_MAP, VARIANTS_CLASS_MAP, VARIANT_DETAILS_CLASS_MAP
-from reference_data.models import GeneInfo, GeneConstraint, Omim, GENOME_VERSION_LOOKUP, GENOME_VERSION_GRCh38, GENOME_VERSION_GRCh37
+    SearchResultKeys, ENTRY_CLASS_MAP, VARIANTS_CLASS_MAP, VARIANT_DETAILS_CLASS_MAP
+from clickhouse_search.profiling import SearchProfile
+from reference_data.models import GeneInfo, GeneConstraint, Omim, GENOME_VERSION_LOOKUP, GENOME_VERSION_GRCh38
 from seqr.models import Dataset, PhenotypePrioritization, Family, Individual
 from seqr.utils.gene_utils import parse_locus_list_items
+from seqr.utils.liftover_utils import liftover_coordinates
 from seqr.utils.logging_utils import SeqrLogger
+from seqr.utils.redis_utils import safe_redis_get_json_multi, safe_redis_set_json_multi, safe_redis_namespace_keys, \
+    redis_reset_namespace, safe_tiered_cache_delete
+from seqr.utils.xpos_utils import parse_variant_id
 from clickhouse_search.constants import MAX_VARIANTS, XPOS_SORT_KEY, PATHOGENICTY_SORT_KEY, PATHOGENICTY_HGMD_SORT_KEY, \
     PRIORITIZED_GENE_SORT, COMPOUND_HET, COMPOUND_HET_ALLOW_HOM_ALTS, RECESSIVE, AFFECTED, MALE_SEXES, \
-    X_LINKED_RECESSIVE, X_LINKED_RECESSIVE_MALE_AFFECTED
+    X_LINKED_RECESSIVE, X_LINKED_RECESSIVE_MALE_AFFECTED, PREDICTION_SORTS, MAX_SORT_RANK, MIN_PRED_SORT_RANK
 from seqr.views.utils.json_utils import DjangoJSONEncoderWithSets
+from settings import CLICKHOUSE_SEARCH_MAX_WORKERS, CLICKHOUSE_SEARCH_QUERY_TIMEOUT
 
 logger = SeqrLogger(__name__)
 
@@ -33,15 +45,75 @@ logger = SeqrLogger(__name__)
 BATCH_SIZE = 10000
 MAX_GENES_FOR_FILTER = 10000
 MAX_NO_LOCATION_COMP_HET_FAMILIES = 100
+GENOTYPE_FAMILY_BATCH_SIZE = 500
 MIN_MULTI_FAMILY_SEQR_AC = 5000
 
 TRANSCRIPT_CONSEQUENCES_FIELD = 'sortedTranscriptConsequences'
 SELECTED_GENE_FIELD = 'selectedGeneId'
 SELECTED_TRANSCRIPT_FIELD = 'selectedTranscript'
+TOO_MANY_RESULTS_ERROR = 'This search returned too many results'
+SEARCH_TIMEOUT_ERROR = 'This search took too long to run. Try adding additional filters to narrow the search'
+VARIANT_DETAILS_CACHE_NAMESPACE = 'variant_details'
+VARIANT_DETAILS_CACHE_EXPIRE = timedelta(days=1)
+SAMPLE_METADATA_CACHE_NAMESPACE = 'sample_metadata'
+SAMPLE_METADATA_CACHE_EXPIRE = timedelta(days=1)
+# Written after the last batch of search result keys, so only fully saved searches are used for exclusions
+SEARCH_RESULT_KEYS_COMPLETE_MARKER = '_COMPLETE'
+# Sorts which can be applied in clickhouse for searches with a single query, so only the requested page is loaded
+SERVER_SORTS = set(BaseVariantsQuerySet.SERVER_SORT_FIELDS.keys())
+
+
+def get_clickhouse_variants(families, user, sort=None, search_profile=None, **kwargs):
+    search_profile = search_profile or SearchProfile()
+    search_queries = _get_search_queries(families, user, search_profile, **kwargs)
+    return _get_sorted_search_queries_results(search_queries, families, user, sort, search_profile)
+
+
+def get_clickhouse_variants_page(families, user, start, end, sort=XPOS_SORT_KEY, total=None, search_profile=None, **kwargs):
+    """
+    Returns a single sorted page of results and the total number of results, with the sort and pagination applied in
+    clickhouse. The total is only counted if it is not already known. This is only supported for searches with a single
+    non comp het query, all other searches return all results sorted by xpos with no total
+    """
+    search_profile = search_profile or SearchProfile()
+    search_queries = _get_search_queries(families, user, search_profile, **kwargs)
+    if len(search_queries) != 1 or search_queries[0][0].func is not _get_search_results or sort not in SERVER_SORTS:
+        return _get_sorted_search_queries_results(search_queries, families, user, XPOS_SORT_KEY, search_profile), None
+
+    get_results, group, add_individual_guids = search_queries[0]
+    with search_profile.phase(_search_query_phase_name(get_results, group)), _raise_search_timeout():
+        results, total = get_results(results_page=(sort, start, end, total))
+    if add_individual_guids:
+        _add_individual_guids(results)
+
+    logger.info(f'Total results: {total}', user)
+    return results, total
+
+
+def _get_sorted_search_queries_results(search_queries, families, user, sort, search_profile):
+    grouped_results = defaultdict(list)
+    add_individual_guid_groups = set()
+    for (_, group, add_individual_guids), query_results in zip(search_queries, _run_search_queries(search_queries, search_profile)):
+        grouped_results[group] += query_results
+        if add_individual_guids:
+            add_individual_guid_groups.add(group)
+    results = []
+    with search_profile.phase('add_individual_guids'):
+        for group, group_results in grouped_results.items():
+            if group in add_individual_guid_groups:
+                _add_individual_guids(group_results)
+            results += group_results
+
+    logger.info(f'Total results: {len(results)}', user)
+    with search_profile.phase('sort_results'):
+        return get_sorted_search_results(results, sort, families)
 
 
-def get_clickhouse_variants(families, user, genome_version=None, sort=None, sample_data_by_dataset_type=None, inheritance=None, locus=None, exclude_keys=None, exclude_key_pairs=None, no_access_project_genome_version=None, **search):
+def _get_search_queries(families, user, search_profile, genome_version=None, sample_data_by_dataset_type=None, inheritance=None, locus=None, exclude_keys=None, exclude_key_pairs=None, exclude_search_id=None, no_access_project_genome_version=None, **search):
     genome_version = genome_version or no_access_project_genome_version or _get_search_genome_version(families)
+    if exclude_search_id:
+        with search_profile.phase('exclude_search_keys'):
+            exclude_keys, exclude_key_pairs = _get_search_result_keys_exclusions(exclude_search_id)
 
     search['inheritance_filter'] = (inheritance or {}).get('filter') or {}
     inheritance_mode = None if search['inheritance_filter'].get('genotype') else (inheritance or {}).get('mode')
@@ -51,9 +123,10 @@ def get_clickhouse_variants(families, user, genome_version=None, sort=None, samp
     has_x_chrom_comp_het = has_comp_het and _is_x_chrom_only(**search)
     has_x_linked = inheritance_mode in {RECESSIVE, X_LINKED_RECESSIVE} and _has_x_chrom(**search)
     sample_data_by_dataset_type = sample_data_by_dataset_type or {}
-    results = []
     searched_dataset_types = set()
     sample_data_errors = set()
+    # Each query is a (get_results, result_group, add_individual_guids) tuple. All queries are independent and may run concurrently
+    search_queries = []
     for dataset_type in ENTRY_CLASS_MAP[genome_version]:
         try:
             entry_qs, variants_qs, parsed_filters = _parse_dataset_type_query(
@@ -65,10 +138,11 @@ def get_clickhouse_variants(families, user, genome_version=None, sort=None, samp
             continue
 
         if dataset_type == Dataset.DATASET_TYPE_VARIANT_CALLS and no_access_project_genome_version:
-            results += _get_no_access_search_results(
+            search_queries.append((partial(
+                _get_no_access_search_results,
                 entry_qs, variants_qs, has_comp_het, user, **search, **parsed_filters,
                 exclude_projects=sample_data_by_dataset_type[dataset_type].get('project_guids'), inheritance_mode=inheritance_mode,
-            )
+            ), 'no_access', False))
             searched_dataset_types.add(dataset_type)
 
         sample_data = sample_data_by_dataset_type[dataset_type]
@@ -77,39 +151,91 @@ def get_clickhouse_variants(families, user, genome_version=None, sort=None, samp
 
         logger.info(f'Loading {dataset_type} data for {sample_data["num_families"]} families', user)
 
-        dataset_results = []
+        add_individual_guids = 'samples' not in sample_data
         if inheritance_mode != COMPOUND_HET:
-            dataset_results += _get_search_results(
+            search_queries.append((partial(
+                _get_search_results,
                 entry_qs, variants_qs, sample_data, inheritance_mode=inheritance_mode, exclude_keys=(exclude_keys or {}).get(dataset_type), **search, **parsed_filters,
-            )
+            ), dataset_type, add_individual_guids))
 
         run_x_linked_male_search = has_x_linked and not (inheritance_mode == X_LINKED_RECESSIVE and sample_data.get('samples'))
         if run_x_linked_male_search:
-            dataset_results += _get_x_linked_male_search_results(
+            search_queries.append((partial(
+                _get_x_linked_male_search_results,
                 entry_qs, variants_qs, dataset_type, user, sample_data, exclude_keys=(exclude_keys or {}).get(dataset_type),
                 **search, **parsed_filters,
-            )
+            ), dataset_type, add_individual_guids))
 
         if has_comp_het:
-            dataset_results += _get_data_type_comp_het_results_queryset(
+            search_queries.append((partial(
+                _get_data_type_comp_het_results_queryset,
                 entry_qs, variants_qs, sample_data, user, parsed_filters, **search,
                 exclude_key_pairs=(exclude_key_pairs or {}).get(dataset_type),
                 is_x_chrom=has_x_chrom_comp_het and dataset_type == Dataset.DATASET_TYPE_VARIANT_CALLS,
-            )
+            ), dataset_type, add_individual_guids))
 
-        if 'samples' not in sample_data:
-            _add_individual_guids(dataset_results)
-        results += dataset_results
         searched_dataset_types.add(dataset_type)
 
     if has_comp_het and any(dt.startswith(Dataset.DATASET_TYPE_SV_CALLS) for dt in VARIANTS_CLASS_MAP[genome_version]):
-        results += _get_multi_data_type_comp_het_results(genome_version, families, sample_data_by_dataset_type, user, exclude_key_pairs or {}, searched_dataset_types, **search)
+        search_queries += _get_multi_data_type_comp_het_queries(genome_version, families, sample_data_by_dataset_type, user, exclude_key_pairs or {}, searched_dataset_types, **search)
 
     if not searched_dataset_types:
         _raise_dataset_type_errors(sample_data_errors, sample_data_by_dataset_type)
 
-    logger.info(f'Total results: {len(results)}', user)
-    return get_sorted_search_results(results, sort, families)
+    return search_queries
+
+
+def _run_search_queries(search_queries, search_profile):
+    get_results_callbacks = [
+        search_profile.profiled(_search_query_phase_name(get_results, group), get_results)
+        for get_results, group, _ in search_queries
+    ]
+    if CLICKHOUSE_SEARCH_MAX_WORKERS <= 1 or len(get_results_callbacks) <= 1:
+        with _raise_search_timeout():
+            return [get_results() for get_results in get_results_callbacks]
+
+    executor = ThreadPoolExecutor(max_workers=min(CLICKHOUSE_SEARCH_MAX_WORKERS, len(get_results_callbacks)))
+    try:
+        with _raise_search_timeout():
+            futures = [executor.submit(_run_threaded_search_query, get_results) for get_results in get_results_callbacks]
+            # The timeout applies to the search as a whole, not to each query individually
+            done, not_done = wait(futures, timeout=CLICKHOUSE_SEARCH_QUERY_TIMEOUT, return_when=FIRST_EXCEPTION)
+            for future in done:
+                future.result()
+            if not_done:
+                raise InvalidSearchException(SEARCH_TIMEOUT_ERROR)
+            # Results are collected in submission order so the merged results are identical to a serial search
+            return [future.result() for future in futures]
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+@contextmanager
+def _raise_search_timeout():
+    try:
+        yield
+    except OperationalError as e:
+        # Queries are run with max_execution_time, so clickhouse stops any query that exceeds the search timeout
+        driver_error = e.__cause__.args[0] if e.__cause__ and e.__cause__.args else None
+        if getattr(driver_error, 'code', None) == ErrorCodes.TIMEOUT_EXCEEDED:
+            raise InvalidSearchException(SEARCH_TIMEOUT_ERROR) from e
+        raise
+
+
+def _with_search_timeout(result_q):
+    return result_q.settings(max_execution_time=CLICKHOUSE_SEARCH_QUERY_TIMEOUT)
+
+
+def _search_query_phase_name(get_results, group):
+    return f'{group}:{getattr(get_results, "func", get_results).__name__.lstrip("_")}'
+
+
+def _run_threaded_search_query(get_results):
+    try:
+        return get_results()
+    finally:
+        # Django opens new database connections per thread, so they need to be explicitly closed
+        connections.close_all()
 
 
 def  _get_search_genome_version(families):
@@ -204,9 +330,13 @@ def _raise_dataset_type_errors(sample_data_errors, sample_data_by_dataset_type):
     raise InvalidSearchException(f'Unable to search against dataset type "{no_data_type}"')
 
 
-def _get_search_results(entry_qs, variants_qs, sample_data, skip_entry_fields=False, **search_kwargs):
+def _get_search_results(entry_qs, variants_qs, sample_data, skip_entry_fields=False, results_page=None, **search_kwargs):
     entries = entry_qs.search(sample_data, skip_entry_fields=skip_entry_fields, **search_kwargs)
     results = variants_qs.subquery_join(entries).search(skip_entry_fields=skip_entry_fields, **search_kwargs)
+    if results_page:
+        sort, start, end, total = results_page
+        page_q = _with_search_timeout(results.result_values(skip_entry_fields=skip_entry_fields).search_sort(sort))
+        return list(page_q[start:end + 1]), _with_search_timeout(results).count() if total is None else total
     return _evaluate_results(results.result_values(skip_entry_fields=skip_entry_fields))
 
 
@@ -238,12 +368,12 @@ def _get_x_linked_male_search_results(entry_qs, variants_qs, dataset_type, user,
 
 
 def _evaluate_results(result_q, is_comp_het=False):
-    results = [list(result[1:]) if is_comp_het else result for result in result_q[:MAX_VARIANTS + 1]]
+    results = [list(result[1:]) if is_comp_het else result for result in _with_search_timeout(result_q)[:MAX_VARIANTS + 1]]
     if len(results) > MAX_VARIANTS:
-        raise InvalidSearchException('This search returned too many results')
+        raise TooManyResultsException(TOO_MANY_RESULTS_ERROR)
     return results
 
-def _get_multi_data_type_comp_het_results(genome_version, all_families, sample_data_by_dataset_type, user, exclude_key_pairs, searched_dataset_types, annotations=None, annotations_secondary=None, **search_kwargs):
+def _get_multi_data_type_comp_het_queries(genome_version, all_families, sample_data_by_dataset_type, user, exclude_key_pairs, searched_dataset_types, annotations=None, annotations_secondary=None, **search_kwargs):
     if annotations_secondary:
         annotations = {
             **annotations,
@@ -271,7 +401,7 @@ def _get_multi_data_type_comp_het_results(genome_version, all_families, sample_d
         return []
     snv_indel_families = set().union(*snv_indel_sample_data['sample_type_families'].values())
 
-    results = []
+    queries = []
     for sample_type in [Dataset.SAMPLE_TYPE_WES, Dataset.SAMPLE_TYPE_WGS]:
         sv_dataset_type = f'{Dataset.DATASET_TYPE_SV_CALLS}_{sample_type}'
         if sv_dataset_type not in sample_data_by_dataset_type:
@@ -323,10 +453,11 @@ def _get_multi_data_type_comp_het_results(genome_version, all_families, sample_d
             snv_indel_variants_qs, snv_indel_q, sv_q, len(families),
             exclude_key_pairs=exclude_key_pairs.get(f'{Dataset.DATASET_TYPE_VARIANT_CALLS},{sv_dataset_type}'),
         )
-        dataset_results = _evaluate_results(result_q, is_comp_het=True)
-        if not (sv_sample_data['samples'] and type_snv_indel_sample_data['samples']):
-            _add_individual_guids(dataset_results)
-        results += dataset_results
+        queries.append((
+            partial(_evaluate_results, result_q, is_comp_het=True),
+            f'{Dataset.DATASET_TYPE_VARIANT_CALLS},{sv_dataset_type}',
+            not (sv_sample_data['samples'] and type_snv_indel_sample_data['samples']),
+        ))
         searched_dataset_types.add(sv_dataset_type)
 
     if not searched_dataset_types:
@@ -334,7 +465,7 @@ def _get_multi_data_type_comp_het_results(genome_version, all_families, sample_d
             'Unable to search for comp-het pairs with dataset type "SV". This may be because inheritance based search is disabled in families with no loaded affected individuals'
         )
 
-    return results
+    return queries
 
 
 def _get_data_type_comp_het_results_queryset(entry_qs, variants_qs, sample_data, user, parsed_filters, is_x_chrom=False, annotations_secondary=None, exclude_key_pairs=None, **search_kwargs):
@@ -427,7 +558,7 @@ def _get_comp_het_results_queryset(variants_qs, primary_q, secondary_q, num_fami
     pair_results = results.annotate(
         pair_key=ArraySort(Array('primary_key', 'secondary_key')),
     ).distinct('pair_key')
-    if exclude_key_pairs:
+    if exclude_key_pairs is not None:
         pair_results = pair_results.exclude(pair_key__in=exclude_key_pairs)
     return pair_results.values_list(
         'pair_key',
@@ -448,10 +579,12 @@ def _add_individual_guids(results):
     for result in results:
         for r in (result if isinstance(result, list) else [result]):
             families.update(r.get('familyGenotypes', {}).keys())
+    family_projects = dict(Family.objects.filter(guid__in=families).values_list('guid', 'project__guid'))
+    snapshots = get_project_sample_snapshots(family_projects.values())
     sample_map = {
-        (family_guid, sample_id): individual_guid for family_guid, individual_guid, sample_id in Individual.objects.filter(
-            family__guid__in=families, active_datasets__isnull=False,
-        ).values_list('family__guid', 'guid', 'individual_id')
+        (sample['family_guid'], sample['sample_id']): sample['individual_guid']
+        for project_guid in set(family_projects.values()) for sample in snapshots[project_guid]['samples']
+        if sample['family_guid'] in families
     }
     for result in results:
         if isinstance(result, list):
@@ -474,16 +607,16 @@ def _set_individual_guids(result, sample_map):
 
 
 def get_sorted_search_results(results, sort, families):
-    sort_metadata = _get_sort_gene_metadata(sort, results, families)
-    sort_key = _get_sort_key(sort, sort_metadata)
-    sorted_results = sorted([
-        sorted(result, key=sort_key) if isinstance(result, list) else result for result in results
-    ], key=sort_key)
-    return sorted_results
+    sort_index = get_search_results_sort_index(results, sorts=[sort])
+    return apply_search_results_sort_order(results, get_search_results_sort_order(sort_index, sort, families))
+
+
+def apply_search_results_sort_order(results, sort_order):
+    return [results[i][::-1] if reverse_pair else results[i] for i, reverse_pair in sort_order]
 
 
 def format_clickhouse_export_results(results):
-    details_by_key = _get_details_by_key(results, lambda detail_qs: detail_qs.values(
+    details_by_key = _get_details_by_key(results, 'export', lambda detail_qs: detail_qs.values(
         'key', 'rsid', mainTranscript=F('transcripts__0'), variantId=F('variant_id'),
         **detail_qs.split_variant_id_annotations(),
     ))
@@ -506,23 +639,43 @@ def format_clickhouse_export_results(results):
     return formatted_results
 
 
-def _get_details_by_key(results, format_details):
+def _get_details_by_key(results, details_format, format_details):
     if not results:
         return {}
 
     genome_version = (results[0] if isinstance(results[0], list) else results)[0]['genomeVersion']
-    keys_with_no_details = {
+    keys_with_no_details = sorted({
         variant['key'] for result in results for variant in (result if isinstance(result, list) else [result]) if
         not 'transcripts' in variant
+    })
+    if not keys_with_no_details:
+        return {}
+
+    # Details are cached per variant, so popular variants are not refetched for every page of every search
+    cache_keys = dict(zip(keys_with_no_details, safe_redis_namespace_keys(VARIANT_DETAILS_CACHE_NAMESPACE, [
+        f'{genome_version}__{Dataset.DATASET_TYPE_VARIANT_CALLS}__{details_format}__{key}' for key in keys_with_no_details
+    ])))
+    cached_details = safe_redis_get_json_multi(cache_keys.values())
+    details_by_key = {
+        key: cached_details[cache_key] for key, cache_key in cache_keys.items() if cache_key in cached_details
     }
-    return {
-        detail['key']: detail for detail in
-        format_details(get_variant_details_queryset(genome_version, Dataset.DATASET_TYPE_VARIANT_CALLS, keys_with_no_details))
-    }
+
+    missing_keys = [key for key in keys_with_no_details if key not in details_by_key]
+    if missing_keys:
+        fetched_details = {
+            detail['key']: detail for detail in
+            format_details(get_variant_details_queryset(genome_version, Dataset.DATASET_TYPE_VARIANT_CALLS, missing_keys))
+        }
+        safe_redis_set_json_multi(
+            {cache_keys[key]: detail for key, detail in fetched_details.items()}, expire=VARIANT_DETAILS_CACHE_EXPIRE,
+        )
+        details_by_key.update(fetched_details)
+
+    return details_by_key
 
 
 def format_clickhouse_results(results):
-    details_by_key = _get_details_by_key(results, lambda detail_qs: detail_qs.result_values())
+    details_by_key = _get_details_by_key(results, 'result', lambda detail_qs: detail_qs.result_values())
 
     formatted_results = []
     for variant in results:
@@ -574,67 +727,125 @@ def _is_matched_minimal_transcript(transcript, minimal_transcript):
      and transcript.get('spliceregion', {}).get('extended_intronic_splice_region_variant') == minimal_transcript.get('extendedIntronicSpliceRegionVariant'))
 
 
+def _sample_metadata_cache_keys(project_guids):
+    return dict(zip(project_guids, safe_redis_namespace_keys(SAMPLE_METADATA_CACHE_NAMESPACE, project_guids)))
+
+
+def get_project_sample_snapshots(project_guids):
+    """Returns the active search samples for each of the given projects, which are cached so searches do not need to
+    aggregate them from postgres. Snapshots are reset whenever search samples are loaded or individuals are edited"""
+    project_guids = sorted(set(project_guids))
+    if not project_guids:
+        return {}
+    cache_keys = _sample_metadata_cache_keys(project_guids)
+    cached_snapshots = safe_redis_get_json_multi(cache_keys.values())
+    snapshots = {
+        project_guid: cached_snapshots[cache_key] for project_guid, cache_key in cache_keys.items()
+        if cache_key in cached_snapshots
+    }
+
+    missing_project_guids = [project_guid for project_guid in project_guids if project_guid not in snapshots]
+    if missing_project_guids:
+        fetched_snapshots = {project_guid: {'name': None, 'samples': []} for project_guid in missing_project_guids}
+        for sample in Individual.objects.filter(
+            family__project__guid__in=missing_project_guids, active_datasets__isnull=False,
+        ).values(
+            'affected', 'sex', sample_id=F('individual_id'), individual_guid=F('guid'), family_guid=F('family__guid'),
+            dataset_type=F('active_datasets__dataset_type'), sample_type=F('active_datasets__sample_type'),
+            project_guid=F('family__project__guid'), project_name=F('family__project__name'),
+        ).distinct():
+            snapshot = fetched_snapshots[sample.pop('project_guid')]
+            snapshot['name'] = sample.pop('project_name')
+            snapshot['samples'].append(sample)
+        safe_redis_set_json_multi(
+            {cache_keys[project_guid]: snapshot for project_guid, snapshot in fetched_snapshots.items()},
+            expire=SAMPLE_METADATA_CACHE_EXPIRE,
+        )
+        snapshots.update(fetched_snapshots)
+
+    return snapshots
+
+
+def reset_cached_sample_metadata(project_guids=None):
+    if project_guids is None:
+        redis_reset_namespace(SAMPLE_METADATA_CACHE_NAMESPACE)
+    else:
+        safe_tiered_cache_delete(_sample_metadata_cache_keys(sorted(set(project_guids))).values())
+
+
 def _get_valid_samples(families, dataset_type, sample_type, allow_no_samples):
-    individuals = Individual.objects.filter(family__in=families, active_datasets__isnull=False)
-    if not individuals.exists():
+    family_projects = dict(Family.objects.filter(pk__in=families).values_list('guid', 'project__guid'))
+    snapshots = get_project_sample_snapshots(family_projects.values())
+    samples = [
+        {**sample, 'project_guid': project_guid, 'project_name': snapshots[project_guid]['name']}
+        for project_guid in sorted(set(family_projects.values())) for sample in snapshots[project_guid]['samples']
+        if sample['family_guid'] in family_projects
+    ]
+    if not samples:
         if allow_no_samples:
             return None
         raise InvalidSearchException(f'No search data found for families {", ".join([f.family_id for f in families])}')
 
-    individuals = individuals.filter(active_datasets__dataset_type=dataset_type)
-    if sample_type:
-        individuals = individuals.filter(active_datasets__sample_type=sample_type)
-
-    mismatch_affected_samples = individuals.values('individual_id').annotate(
-        projects=ArrayAgg('family__project__name', distinct=True),
-        affected=ArrayAgg('affected', distinct=True),
-    ).filter(affected__len__gt=1)
+    samples = [
+        sample for sample in samples
+        if sample['dataset_type'] == dataset_type and (not sample_type or sample['sample_type'] == sample_type)
+    ]
+
+    sample_affected = defaultdict(set)
+    sample_projects = defaultdict(set)
+    for sample in samples:
+        sample_affected[sample['sample_id']].add(sample['affected'])
+        sample_projects[sample['sample_id']].add(sample['project_name'])
+    mismatch_affected_samples = sorted(sample_id for sample_id, affected in sample_affected.items() if len(affected) > 1)
     if mismatch_affected_samples:
         raise InvalidSearchException(
             'The following samples are incorrectly configured and have different affected statuses in different projects: ' +
-            ', '.join([f'{agg["individual_id"]} ({"/ ".join(agg["projects"])})' for agg in mismatch_affected_samples]),
+            ', '.join([f'{sample_id} ({"/ ".join(sorted(sample_projects[sample_id]))})' for sample_id in mismatch_affected_samples]),
         )
 
-    return individuals
+    return samples
 
 
-def _get_sample_metadata(individuals, affected_family_only, annotate_affected_males):
-    skip_individual_guid = individuals.values('family__project_id').distinct().count() > 1
-    family_array_kwargs = {'distinct': True}
-    if affected_family_only:
-        family_array_kwargs['filter'] = Q(affected=Individual.AFFECTED_STATUS_AFFECTED)
-    annotations = {
-        'project_guids': ArrayAgg('family__project__guid', distinct=True),
-        'family_guids': ArrayAgg('family__guid', **family_array_kwargs),
+def _get_sample_metadata(samples, affected_family_only, annotate_affected_males):
+    project_guids = sorted({sample['project_guid'] for sample in samples})
+    sample_data = {
+        'project_guids': project_guids,
+        'family_guids': sorted({
+            sample['family_guid'] for sample in samples
+            if not affected_family_only or sample['affected'] == Individual.AFFECTED_STATUS_AFFECTED
+        }),
     }
-    if skip_individual_guid:
-        annotations['num_unaffected'] = Count(
-            'id', distinct=True, filter=Q(affected=Individual.AFFECTED_STATUS_UNAFFECTED),
-        )
+    if len(project_guids) > 1:
+        sample_data['num_unaffected'] = len({
+            sample['individual_guid'] for sample in samples if sample['affected'] == Individual.AFFECTED_STATUS_UNAFFECTED
+        })
         if annotate_affected_males:
-            annotations['affected_male_family_guids'] = ArrayAgg('family__guid', distinct=True, filter=Q(
-                affected=Individual.AFFECTED_STATUS_AFFECTED, sex__in=Individual.MALE_SEXES,
-            ))
+            sample_data['affected_male_family_guids'] = sorted({
+                sample['family_guid'] for sample in samples
+                if sample['affected'] == Individual.AFFECTED_STATUS_AFFECTED and sample['sex'] in Individual.MALE_SEXES
+            })
     else:
-        annotations['samples'] = ArrayAgg(JSONObject(
-            affected='affected', sex='sex', sample_id='individual_id', sample_type='active_datasets__sample_type',
-            family_guid=F('family__guid'), individual_guid=F('guid'),
-        ), distinct=True)
+        # Samples are ordered consistently with the postgres ordering for aggregated JSON objects
+        sample_fields = ['sex', 'affected', 'sample_id', 'family_guid', 'sample_type', 'individual_guid']
+        sample_data['samples'] = [
+            dict(zip(sample_fields, sample)) for sample in
+            sorted({tuple(sample[field] for field in sample_fields) for sample in samples})
+        ]
 
-    return individuals.aggregate(**annotations)
+    return sample_data
 
 
 def _get_sample_data(families, dataset_type, annotate_affected_males=False, allow_no_samples=False, inheritance_mode=None, inheritance_filter=None, has_location_filter=False):
     sample_type = None
     if dataset_type.startswith(Dataset.DATASET_TYPE_SV_CALLS):
         dataset_type, sample_type = dataset_type.split('_')
-    individuals = _get_valid_samples(families, dataset_type, sample_type, allow_no_samples)
-    if not individuals:
+    samples = _get_valid_samples(families, dataset_type, sample_type, allow_no_samples)
+    if not samples:
         return {}
 
     individual_affected_status = (inheritance_filter or {}).get('affected')
     affected_family_only = inheritance_mode and not individual_affected_status
-    sample_data = _get_sample_metadata(individuals, affected_family_only, annotate_affected_males)
+    sample_data = _get_sample_metadata(samples, affected_family_only, annotate_affected_males)
 
     family_guids = set(sample_data.pop('family_guids'))
     if not has_location_filter:
@@ -649,16 +860,9 @@ def _get_sample_data(families, dataset_type, annotate_affected_males=False, allo
     if sample_type:
         sample_data['sample_type_families'] = {sample_type: family_guids}
     else:
-        if sample_data.get('samples'):
-            sample_data['sample_type_families'] = defaultdict(set)
-            for sample in sample_data['samples']:
-                sample_data['sample_type_families'][sample['sample_type']].add(sample['family_guid'])
-        else:
-            sample_data['sample_type_families'] = dict(
-                individuals.filter(family__guid__in=family_guids).values('active_datasets__sample_type').values_list(
-                    'active_datasets__sample_type', ArrayAgg('family__guid', distinct=True),
-                )
-            )
+        sample_data['sample_type_families'] = defaultdict(set)
+        for sample in sample_data.get('samples') or [s for s in samples if s['family_guid'] in family_guids]:
+            sample_data['sample_type_families'][sample['sample_type']].add(sample['family_guid'])
         if len(sample_data['sample_type_families']) == 2:
             st_families_1, st_families_2 = sample_data['sample_type_families'].values()
             multi_families = set(st_families_1).intersection(st_families_2)
@@ -669,30 +873,24 @@ def _get_sample_data(families, dataset_type, annotate_affected_males=False, allo
                     if set(families) - multi_families
                 }
                 sample_data['sample_type_families']['multi'] = multi_families
-                _add_missing_multi_type_samples(individuals, sample_data)
+                _add_missing_multi_type_samples(samples, sample_data)
 
     return sample_data
 
 
-def _add_missing_multi_type_samples(individuals, data):
+def _add_missing_multi_type_samples(samples, data):
     data['family_missing_type_samples'] = defaultdict(lambda: defaultdict(list))
-    if 'samples'  in data:
-        individual_sample_types = defaultdict(list)
-        for s in data['samples']:
-            individual_sample_types[s['individual_guid']].append(s)
-        individual_samples = [
-            {'samples': samples, 'family_guid': samples[0]['family_guid']}
-            for samples in individual_sample_types.values() if len(samples) == 1
-        ]
-    else:
-        individual_samples = individuals.filter(family__guid__in=data['sample_type_families']['multi'],
-        ).values('id', family_guid=F('family__guid')).annotate(
-            samples=ArrayAgg(JSONObject(sample_id='individual_id', sample_type='active_datasets__sample_type'))
-        ).filter(samples__len=1)
-    for agg in individual_samples:
-        sample = agg['samples'][0]
+    if 'samples' not in data:
+        samples = [s for s in samples if s['family_guid'] in data['sample_type_families']['multi']]
+    individual_sample_types = defaultdict(list)
+    for s in data.get('samples', samples):
+        individual_sample_types[s['individual_guid']].append(s)
+    for individual_samples in individual_sample_types.values():
+        if len(individual_samples) != 1:
+            continue
+        sample = individual_samples[0]
         missing_type = Dataset.SAMPLE_TYPE_WES if sample['sample_type'] == Dataset.SAMPLE_TYPE_WGS else Dataset.SAMPLE_TYPE_WGS
-        data['family_missing_type_samples'][agg['family_guid']][missing_type].append(sample['sample_id'])
+        data['family_missing_type_samples'][sample['family_guid']][missing_type].append(sample['sample_id'])
 
 
 def _no_affected_male_families(sample_data, user):
@@ -757,24 +955,12 @@ GENE_SORTS = {
     PRIORITIZED_GENE_SORT: _prioritized_gene_sort,
 }
 
-def _get_sort_gene_metadata(sort, results, families):
-    get_metadata = GENE_SORTS.get(sort)
-    if not get_metadata:
-        return None
+def _variant_gene_ids(variant):
+    if variant.get(TRANSCRIPT_CONSEQUENCES_FIELD):
+        return sorted({t['geneId'] for t in variant[TRANSCRIPT_CONSEQUENCES_FIELD]})
+    return sorted(variant.get('transcripts', {}).keys())
 
-    gene_ids = set()
-    for result in results:
-        if not isinstance(result, list):
-            result = [result]
-        for variant in result:
-            if variant.get(TRANSCRIPT_CONSEQUENCES_FIELD):
-                gene_ids.update([t['geneId'] for t in variant[TRANSCRIPT_CONSEQUENCES_FIELD]])
-            else:
-                gene_ids.update(variant.get('transcripts', {}).keys())
-    return get_metadata(gene_ids, families)
 
-
-MAX_SORT_RANK = 1e10
 def _subfield_sort(*fields, rank_lookup=None, default=MAX_SORT_RANK, reverse=False):
     def _sort(item):
         for field in fields:
@@ -815,13 +1001,11 @@ def _sv_size(x):
     return x['pos'] - x['end']
 
 MIN_SORT_RANK = 0
-MIN_PRED_SORT_RANK = -1
 CLINVAR_RANK_LOOKUP = {path: rank for rank, path in BaseClinvar.PATHOGENICITY_CHOICES}
 HGMD_RANK_LOOKUP = {class_: rank for rank, class_ in BaseHgmd.HGMD_CLASSES}
 ABSENT_CLINVAR_SORT_OFFSET = 12.5
 CONSEQUENCE_RANK_LOOKUP = {csq: rank for rank, csq in BaseVariants.CONSEQUENCE_TERMS}
 SV_CONSEQUENCE_LOOKUP = {csq: rank for rank, csq in BaseVariantsSvGcnv.SV_CONSEQUENCE_RANKS}
-PREDICTION_SORTS = {'cadd', 'revel', 'splice_ai', 'eigen', 'mpc', 'primate_ai'}
 CLINVAR_SORT =  _subfield_sort(
     'clinvar', 'pathogenicity', rank_lookup=CLINVAR_RANK_LOOKUP, default=ABSENT_CLINVAR_SORT_OFFSET,
 )
@@ -851,28 +1035,124 @@ SORT_EXPRESSIONS = {
     'size': [_sv_size],
 }
 
-def _get_sort_key(sort, gene_metadata):
-    sort_expressions = SORT_EXPRESSIONS.get(sort, [])
+SORT_INDEX_PAIR_FIELD = 'isPair'
+SORT_INDEX_SELECTED_GENE_FIELD = 'selectedGeneId'
+SORT_INDEX_GENE_IDS_FIELD = 'geneIds'
+# Numeric and string sort values can be sorted as typed arrays, anything else falls back to sorting python tuples
+VECTORIZED_SORT_DTYPE_KINDS = {'b', 'i', 'u', 'f', 'U'}
+
+
+def get_search_results_sort_index(results, sorts=None):
+    """
+    Returns a compact, columnar index of the per-variant values used to sort the given results, which can be used to
+    sort the results for any sort without reloading the full variants. Each column has one value per result, which is
+    in turn a list with one value per variant in the result
+    """
+    variant_results = [result if isinstance(result, list) else [result] for result in results]
+    sort_expressions = SORT_EXPRESSIONS if sorts is None else {
+        sort: SORT_EXPRESSIONS[sort] for sort in sorts if sort in SORT_EXPRESSIONS
+    }
+    sort_index = {
+        SORT_INDEX_PAIR_FIELD: [isinstance(result, list) for result in results],
+        XPOS_SORT_KEY: [[variant[XPOS_SORT_KEY] for variant in result] for result in variant_results],
+        **{sort: [
+            [[expr(variant) for expr in expressions] for variant in result] for result in variant_results
+        ] for sort, expressions in sort_expressions.items()},
+    }
+    if sorts is None or any(sort in GENE_SORTS for sort in sorts):
+        sort_index.update({
+            SORT_INDEX_SELECTED_GENE_FIELD: [[
+                (variant.get(SELECTED_TRANSCRIPT_FIELD) or {}).get('geneId') or variant.get(SELECTED_GENE_FIELD)
+                for variant in result
+            ] for result in variant_results],
+            SORT_INDEX_GENE_IDS_FIELD: [[_variant_gene_ids(variant) for variant in result] for result in variant_results],
+        })
+    return sort_index
+
+
+def get_search_results_sort_order(sort_index, sort, families):
+    """
+    Returns the order of the indexed results for the given sort, as a list of (result index, reverse pair) tuples,
+    where reverse pair indicates that the variants in a compound het pair should be swapped
+    """
+    if sort in GENE_SORTS:
+        sort_values = _get_indexed_gene_sort_values(sort_index, sort, families)
+    else:
+        sort_values = sort_index[sort] if sort in SORT_EXPRESSIONS else []
+
+    sort_columns = _get_sort_columns(sort_index, sort_values)
+    if sort_columns is None:
+        return _get_iterative_sort_order(sort_index, sort_values)
+
+    first_columns, last_columns = sort_columns
+    # Compare the first and last variant in each result lexicographically, working back from the least significant column
+    last_is_less = np.zeros(len(sort_index[XPOS_SORT_KEY]), dtype=bool)
+    for first_column, last_column in zip(reversed(first_columns), reversed(last_columns)):
+        last_is_less = (last_column < first_column) | ((last_column == first_column) & last_is_less)
+    result_sort_columns = [
+        np.where(last_is_less, last_column, first_column) for first_column, last_column in zip(first_columns, last_columns)
+    ]
+    reverse_pairs = np.array(sort_index[SORT_INDEX_PAIR_FIELD], dtype=bool) & last_is_less
+    # lexsort is stable and uses the last column as the primary sort key
+    order = np.lexsort(result_sort_columns[::-1])
+    return list(zip(order.tolist(), reverse_pairs[order].tolist()))
+
+
+def _get_sort_columns(sort_index, sort_values):
+    """
+    Returns typed arrays of each sort value and the position for the first and last variant in each result, or None if
+    the results can not be sorted as arrays
+    """
+    xpos = sort_index[XPOS_SORT_KEY]
+    if not xpos or any(len(variant_xpos) > 2 for variant_xpos in xpos):
+        return None
+    num_sort_values = len(sort_values[0][0]) if sort_values else 0
+    first_columns = []
+    last_columns = []
+    for variant_index in [0, -1]:
+        columns = first_columns if variant_index == 0 else last_columns
+        for value_index in range(num_sort_values):
+            column = np.asarray([result[variant_index][value_index] for result in sort_values])
+            if column.dtype.kind not in VECTORIZED_SORT_DTYPE_KINDS:
+                return None
+            columns.append(column)
+        columns.append(np.asarray([variant_xpos[variant_index] for variant_xpos in xpos], dtype=np.int64))
+    return first_columns, last_columns
+
+
+def _get_iterative_sort_order(sort_index, sort_values):
+    result_sort_keys = []
+    for i, xpos in enumerate(sort_index[XPOS_SORT_KEY]):
+        variant_sort_keys = [
+            (*(sort_values[i][j] if sort_values else []), variant_xpos) for j, variant_xpos in enumerate(xpos)
+        ]
+        # Python sorts are stable, so pairs are only reversed if the second variant is strictly ahead of the first
+        reverse_pair = sort_index[SORT_INDEX_PAIR_FIELD][i] and variant_sort_keys[-1] < variant_sort_keys[0]
+        result_sort_keys.append((min(variant_sort_keys), reverse_pair))
+    order = sorted(range(len(result_sort_keys)), key=lambda i: result_sort_keys[i][0])
+    return [(i, result_sort_keys[i][1]) for i in order]
 
+
+def _get_indexed_gene_sort_values(sort_index, sort, families):
+    gene_ids = {gene_id for result in sort_index[SORT_INDEX_GENE_IDS_FIELD] for variant_gene_ids in result for gene_id in variant_gene_ids}
+    gene_metadata = GENE_SORTS[sort](gene_ids, families)
     if sort == OMIM_SORT:
-        sort_expressions = [
-            lambda x: 0 if ((x.get(SELECTED_TRANSCRIPT_FIELD) or {}).get('geneId') or x.get(SELECTED_GENE_FIELD)) in gene_metadata else 1,
-            lambda x: -len(
-                set(t['geneId'] for t in x[TRANSCRIPT_CONSEQUENCES_FIELD] if t['geneId'] in gene_metadata)
-                if x.get(TRANSCRIPT_CONSEQUENCES_FIELD) else set(x.get('transcripts', {}).keys()).intersection(gene_metadata)
-            ),
+        get_sort_values = lambda selected_gene_id, variant_gene_ids: [
+            0 if selected_gene_id in gene_metadata else 1,
+            -len(set(variant_gene_ids).intersection(gene_metadata)),
         ]
     elif gene_metadata:
-        sort_expressions = [
-            lambda x: gene_metadata.get((x.get(SELECTED_TRANSCRIPT_FIELD) or {}).get('geneId') or x.get(SELECTED_GENE_FIELD), MAX_SORT_RANK),
-            lambda x: min(
-                ([gene_metadata.get(t['geneId'], MAX_SORT_RANK)for t in x[TRANSCRIPT_CONSEQUENCES_FIELD] if t['geneId'] in gene_metadata]
-                if x.get(TRANSCRIPT_CONSEQUENCES_FIELD) else [gene_metadata.get(gene_id, MAX_SORT_RANK) for gene_id in x.get('transcripts', {}).keys()])
-                or [MAX_SORT_RANK]
-            ),
+        get_sort_values = lambda selected_gene_id, variant_gene_ids: [
+            gene_metadata.get(selected_gene_id, MAX_SORT_RANK),
+            min([gene_metadata.get(gene_id, MAX_SORT_RANK) for gene_id in variant_gene_ids] or [MAX_SORT_RANK]),
         ]
+    else:
+        return []
 
-    return lambda x: tuple(expr(x[0] if isinstance(x, list) else x) for expr in [*sort_expressions, lambda x: x[XPOS_SORT_KEY]])
+    return [
+        [get_sort_values(selected_gene_id, variant_gene_ids) for selected_gene_id, variant_gene_ids in zip(*result)]
+        for result in zip(sort_index[SORT_INDEX_SELECTED_GENE_FIELD], sort_index[SORT_INDEX_GENE_IDS_FIELD])
+    ]
 
 
 def _clickhouse_variants_lookup(entries, genome_version, data_type, format_results, affected_only=False, hom_only=False):
@@ -891,16 +1171,6 @@ def _add_results_override_annotations(results):
         results = results.add_genotype_override_annotations(results)
     return results
 
-def _clickhouse_variant_lookup(entries, genome_version, data_type, **kwargs):
-    results = _clickhouse_variants_lookup(
-        entries, genome_version, data_type, format_results=_add_results_override_annotations, **kwargs,
-    )
-
-    variant = results.first()
-    if variant:
-        variant = format_clickhouse_results([variant])[0]
-    return variant
-
 def _filter_lookup_entries(entries, affected_only, hom_only):
     if affected_only:
         entries = entries.filter(entries.any_affected_q())
@@ -927,13 +1197,10 @@ def _lookup_genotype_expressions():
         ])),
     }
 
-def clickhouse_variant_lookup(user, variant_id, sample_type, genome_version, affected_only, hom_only):
-    data_type = entry_qs = None
+def _get_lookup_data_type(variant_id, sample_type, genome_version):
     for dataset_type, entry_cls in sorted(ENTRY_CLASS_MAP[genome_version].items()):
         try:
-            entry_qs = entry_cls.objects.filter_locus(
-                variant_ids=[variant_id], raw_variant_items=variant_id,
-            )
+            entry_cls.objects.filter_locus(variant_ids=[variant_id], raw_variant_items=variant_id)
         except InvalidDatasetTypeException:
             continue
         if dataset_type.startswith(Dataset.DATASET_TYPE_SV_CALLS):
@@ -941,34 +1208,102 @@ def clickhouse_variant_lookup(user, variant_id, sample_type, genome_version, aff
                 raise InvalidSearchException('Sample type must be specified to look up a structural variant')
             elif not dataset_type.endswith(sample_type):
                 continue
-        data_type = dataset_type
-        break
-    if data_type is None:
-        raise InvalidSearchException('Invalid genome build for dataset type')
+        return dataset_type
+    raise InvalidSearchException('Invalid genome build for dataset type')
+
 
+def _lookup_variant_id(variant_id):
+    # Results are keyed by the normalized variant ID, which omits any "chr" prefix for SNVs/indels
+    normalized_id = variant_id.replace('chr', '')
+    return normalized_id if parse_variant_id(normalized_id) else variant_id
+
+
+def clickhouse_variant_lookup(user, variant_id, sample_type, genome_version, affected_only, hom_only):
+    data_type = _get_lookup_data_type(variant_id, sample_type, genome_version)
     logger.info(f'Looking up variant {variant_id} with data type {data_type}', user)
 
-    variant = _clickhouse_variant_lookup(
-        entry_qs, genome_version, data_type, affected_only=affected_only, hom_only=hom_only,
+    variants_by_id = _clickhouse_data_type_variants_lookup(
+        [variant_id], genome_version, data_type, affected_only=affected_only, hom_only=hom_only,
     )
-    if variant:
-        _add_liftover_genotypes(variant, data_type, affected_only, hom_only)
-    else:
-        lifted_genome_version = next(gv for gv in ENTRY_CLASS_MAP.keys() if gv != genome_version)
-        lifted_entry_cls = ENTRY_CLASS_MAP[lifted_genome_version].get(data_type)
-        if lifted_entry_cls:
-            chrom, pos, base_id = variant_id.split('-', 2)
-            liftover_results = _run_liftover(lifted_genome_version, chrom, int(pos))
-            if liftover_results:
-                lifted_id = f'{liftover_results[0]}-{liftover_results[1]}-{base_id}'
-                entry_qs = lifted_entry_cls.objects.filter_locus(raw_variant_items=lifted_id)
-                variant = _clickhouse_variant_lookup(
-                    entry_qs, lifted_genome_version, data_type, affected_only=affected_only, hom_only=hom_only,
-                )
-
+    variant = variants_by_id.get(variant_id)
     if not variant:
         raise ObjectDoesNotExist('Variant not present in seqr')
 
+    return _with_padded_interval_variants(variant, genome_version, data_type, affected_only, hom_only)
+
+
+def clickhouse_variants_lookup(user, variant_ids, sample_type, genome_version, affected_only, hom_only):
+    """Looks up many variants with a single query per dataset type, returning the found variants and the lookup errors
+    by variant ID"""
+    errors = {}
+    variant_ids_by_data_type = defaultdict(list)
+    for variant_id in variant_ids:
+        try:
+            variant_ids_by_data_type[_get_lookup_data_type(variant_id, sample_type, genome_version)].append(variant_id)
+        except InvalidSearchException as e:
+            errors[variant_id] = str(e)
+
+    variants_by_id = {}
+    for data_type, data_type_variant_ids in sorted(variant_ids_by_data_type.items()):
+        logger.info(f'Looking up {len(data_type_variant_ids)} variants with data type {data_type}', user)
+        data_type_variants_by_id = _clickhouse_data_type_variants_lookup(
+            data_type_variant_ids, genome_version, data_type, affected_only=affected_only, hom_only=hom_only,
+        )
+        for variant_id in data_type_variant_ids:
+            variant = data_type_variants_by_id.get(variant_id)
+            if variant:
+                variants_by_id[variant_id] = _with_padded_interval_variants(
+                    variant, genome_version, data_type, affected_only, hom_only,
+                )
+            else:
+                errors[variant_id] = 'Variant not present in seqr'
+
+    return variants_by_id, errors
+
+
+def _clickhouse_data_type_variants_lookup(variant_ids, genome_version, data_type, **kwargs):
+    entry_qs = ENTRY_CLASS_MAP[genome_version][data_type].objects.filter_locus(
+        variant_ids=variant_ids, raw_variant_items=' '.join(variant_ids),
+    )
+    variants_by_lookup_id = _format_lookup_variants(entry_qs, genome_version, data_type, **kwargs)
+    _add_liftover_genotypes(list(variants_by_lookup_id.values()), data_type, **kwargs)
+    variants_by_id = {
+        variant_id: variants_by_lookup_id[_lookup_variant_id(variant_id)] for variant_id in variant_ids
+        if _lookup_variant_id(variant_id) in variants_by_lookup_id
+    }
+
+    lifted_genome_version = next(gv for gv in ENTRY_CLASS_MAP.keys() if gv != genome_version)
+    lifted_entry_cls = ENTRY_CLASS_MAP[lifted_genome_version].get(data_type)
+    missing_variant_ids = [variant_id for variant_id in variant_ids if variant_id not in variants_by_id]
+    if not (lifted_entry_cls and missing_variant_ids):
+        return variants_by_id
+
+    missing_variants = [(variant_id, *_lookup_variant_id(variant_id).split('-', 2)) for variant_id in missing_variant_ids]
+    lifted_coords = liftover_coordinates(lifted_genome_version, [(chrom, int(pos)) for _, chrom, pos, _ in missing_variants])
+    variant_ids_by_lifted_id = {}
+    for variant_id, chrom, pos, base_id in missing_variants:
+        liftover_results = lifted_coords.get((chrom, int(pos)))
+        if liftover_results:
+            variant_ids_by_lifted_id[f'{liftover_results[0]}-{liftover_results[1]}-{base_id}'] = variant_id
+    if variant_ids_by_lifted_id:
+        entry_qs = lifted_entry_cls.objects.filter_locus(raw_variant_items=' '.join(variant_ids_by_lifted_id))
+        lifted_variants_by_id = _format_lookup_variants(entry_qs, lifted_genome_version, data_type, **kwargs)
+        variants_by_id.update({
+            variant_ids_by_lifted_id[lifted_id]: variant for lifted_id, variant in lifted_variants_by_id.items()
+            if lifted_id in variant_ids_by_lifted_id
+        })
+
+    return variants_by_id
+
+
+def _format_lookup_variants(entries, genome_version, data_type, **kwargs):
+    results = _clickhouse_variants_lookup(
+        entries, genome_version, data_type, format_results=_add_results_override_annotations, **kwargs,
+    )
+    return {variant['variantId']: variant for variant in format_clickhouse_results(list(results))}
+
+
+def _with_padded_interval_variants(variant, genome_version, data_type, affected_only, hom_only):
     variants = [variant]
 
     if variant.get('svType') in {'DEL', 'DUP'}:
@@ -993,34 +1328,75 @@ def clickhouse_variant_lookup(user, variant_id, sample_type, genome_version, aff
     return variants
 
 
-def _add_liftover_genotypes(variant, data_type, affected_only, hom_only):
-    lifted_entry_cls = ENTRY_CLASS_MAP.get(variant.get('liftedOverGenomeVersion'), {}).get(data_type)
-    if not (lifted_entry_cls and variant.get('liftedOverChrom') and variant.get('liftedOverPos')):
+def _add_liftover_genotypes(variants, data_type, affected_only, hom_only):
+    lifted_entry_cls = None
+    variants_by_lifted_id = {}
+    for variant in variants:
+        lifted_entry_cls = ENTRY_CLASS_MAP.get(variant.get('liftedOverGenomeVersion'), {}).get(data_type)
+        if lifted_entry_cls and variant.get('liftedOverChrom') and variant.get('liftedOverPos'):
+            lifted_id = f"{variant['liftedOverChrom']}-{variant['liftedOverPos']}-{variant['ref']}-{variant['alt']}"
+            variants_by_lifted_id[lifted_id] = variant
+    if not variants_by_lifted_id:
         return
-    lifted_id = f"{variant['liftedOverChrom']}-{variant['liftedOverPos']}-{variant['ref']}-{variant['alt']}"
-    lifted_entries = lifted_entry_cls.objects.filter_locus(raw_variant_items=lifted_id)
+
+    lifted_entries = lifted_entry_cls.objects.filter_locus(raw_variant_items=' '.join(variants_by_lifted_id))
     lifted_entries = _filter_lookup_entries(lifted_entries, affected_only, hom_only)
     gt_field, gt_expr = lifted_entry_cls.objects.genotype_expression(additional_expressions=_lookup_genotype_expressions())
     lifted_entry_data = lifted_entries.values('key').annotate(
         excludedTagFamilies=ExcludedVariantDict.dict_get_expression('key', dataset_type=data_type),
         **{gt_field: GroupArrayArray(gt_expr)},
     )
-    if lifted_entry_data:
-        variant['familyGenotypes'].update(lifted_entry_data[0]['familyGenotypes'])
-        variant['liftedFamilyGuids'] = sorted(lifted_entry_data[0]['familyGenotypes'].keys())
-        variant['excludedTagFamilies'] += lifted_entry_data[0]['excludedTagFamilies']
+    if not lifted_entry_data:
+        return
+
+    lifted_genome_version = next(iter(variants_by_lifted_id.values()))['liftedOverGenomeVersion']
+    lifted_ids_by_key = {
+        key: variant_id for variant_id, key in
+        get_clickhouse_key_lookup(lifted_genome_version, data_type, list(variants_by_lifted_id.keys())).items()
+    }
+    for entry_data in lifted_entry_data:
+        variant = variants_by_lifted_id.get(lifted_ids_by_key.get(entry_data['key']))
+        if not variant:
+            continue
+        variant['familyGenotypes'].update(entry_data['familyGenotypes'])
+        variant['liftedFamilyGuids'] = sorted(entry_data['familyGenotypes'].keys())
+        variant['excludedTagFamilies'] += entry_data['excludedTagFamilies']
 
 
 def get_clickhouse_genotypes(project_guid, family_guids, genome_version, dataset_type, keys, additional_fields=None):
+    return {
+        e['key']: e for e in _get_clickhouse_genotype_entries(
+            project_guid, family_guids, genome_version, dataset_type, keys, additional_fields=additional_fields,
+        )
+    }
+
+
+def get_clickhouse_family_genotypes(project_guid, family_keys, genome_version, dataset_type):
+    """Returns the genotypes for the given keys in each family, keyed by (family guid, key). Families are fetched in
+    batches rather than individually, so the number of queries does not scale with the number of families"""
+    family_guids = sorted(family_keys.keys())
+    genotypes = {}
+    for i in range(0, len(family_guids), GENOTYPE_FAMILY_BATCH_SIZE):
+        batch_family_guids = family_guids[i:i + GENOTYPE_FAMILY_BATCH_SIZE]
+        keys = set().union(*[family_keys[family_guid] for family_guid in batch_family_guids])
+        for e in _get_clickhouse_genotype_entries(
+            project_guid, batch_family_guids, genome_version, dataset_type, keys, additional_fields=['family_guid'],
+        ):
+            if e['key'] in family_keys[e['family_guid']]:
+                genotypes[(e['family_guid'], e['key'])] = e['genotypes']
+    return genotypes
+
+
+def _get_clickhouse_genotype_entries(project_guid, family_guids, genome_version, dataset_type, keys, additional_fields=None):
     sample_data = _get_sample_data(Family.objects.filter(guid__in=family_guids), dataset_type)
     entries = ENTRY_CLASS_MAP[genome_version][dataset_type].objects.filter(
         project_guid=project_guid, family_guid__in=family_guids, key__in=keys,
     )
     gt_field, gt_expr = entries.genotype_expression(sample_data)
-    return {
-        e['key']: {**e, 'genotypes': _clickhouse_genotypes_json(e['genotypes'])} for e in
+    return [
+        {**e, 'genotypes': _clickhouse_genotypes_json(e['genotypes'])} for e in
         entries.annotate(**{gt_field: gt_expr}).values('key', 'genotypes', *(additional_fields or []))
-    }
+    ]
 
 
 def _clickhouse_genotypes_json(genotypes):
@@ -1055,6 +1431,46 @@ def get_clickhouse_key_lookup(genome_version, dataset_type, variants_ids):
     return lookup
 
 
+def has_search_result_keys(search_id):
+    # Only check for the completion marker, so keys from a partially saved search are never treated as the full results
+    return SearchResultKeys.objects.filter(search_id=search_id, dataset_type=SEARCH_RESULT_KEYS_COMPLETE_MARKER).exists()
+
+
+def save_search_result_keys(search_id, result_keys):
+    """Persists (dataset_type, key, secondary_key) tuples in batches, so the full result set is never held in memory"""
+    created_date = timezone.now()
+    batch = []
+    for dataset_type, key, secondary_key in result_keys:
+        batch.append(SearchResultKeys(
+            search_id=search_id, dataset_type=dataset_type, key=key, secondary_key=secondary_key or 0,
+            created_date=created_date,
+        ))
+        if len(batch) >= BATCH_SIZE:
+            SearchResultKeys.objects.using('clickhouse_write').bulk_create(batch)
+            batch = []
+    # The marker is inserted with the final batch, so it is only written once every key has been saved
+    batch.append(SearchResultKeys(
+        search_id=search_id, dataset_type=SEARCH_RESULT_KEYS_COMPLETE_MARKER, key=0, created_date=created_date,
+    ))
+    SearchResultKeys.objects.using('clickhouse_write').bulk_create(batch)
+
+
+def _get_search_result_keys_exclusions(search_id):
+    # Exclusions are subqueries rather than key lists, so ClickHouse runs them as an anti-join against the stored keys
+    search_result_keys = SearchResultKeys.objects.filter(search_id=search_id).exclude(
+        dataset_type=SEARCH_RESULT_KEYS_COMPLETE_MARKER,
+    )
+    exclude_keys = {}
+    exclude_key_pairs = {}
+    for dataset_type in search_result_keys.values_list('dataset_type', flat=True).distinct():
+        dataset_type_keys = search_result_keys.filter(dataset_type=dataset_type)
+        exclude_keys[dataset_type] = dataset_type_keys.filter(secondary_key=0).values('key')
+        exclude_key_pairs[dataset_type] = dataset_type_keys.exclude(secondary_key=0).annotate(
+            pair_key=Array('key', 'secondary_key'),
+        ).values('pair_key')
+    return exclude_keys, exclude_key_pairs
+
+
 def delete_clickhouse_project(project, dataset_type, sample_type=None):
     if dataset_type == Dataset.DATASET_TYPE_SV_CALLS and sample_type == Dataset.SAMPLE_TYPE_WES:
         dataset_type = 'GCNV'
@@ -1078,26 +1494,3 @@ def delete_clickhouse_project(project, dataset_type, sample_type=None):
             PROJECT_GT_STATS_VIEW_CLASS_MAP[project.genome_version][dataset_type].refresh()
             ENTRY_CLASS_MAP[project.genome_version][dataset_type].gt_stats.rel.related_model.reload()
     return f'Deleted all {dataset_type} search data for project {project.name}'
-
-
-LIFTOVERS = {
-    GENOME_VERSION_GRCh38: None,
-    GENOME_VERSION_GRCh37: None,
-}
-PYLIFTOVER_BUILD_LOOKUP = {
-    GENOME_VERSION_GRCh38: ('hg19', 'hg38'),
-    GENOME_VERSION_GRCh37: ('hg38', 'hg19'),
-}
-
-def _run_liftover(genome_version, chrom, pos):
-    if not LIFTOVERS[genome_version]:
-        try:
-            LIFTOVERS[genome_version] = LiftOver(*PYLIFTOVER_BUILD_LOOKUP[genome_version])
-        except Exception as e:
-            logger.error('ERROR: Unable to set up liftover. {}'.format(e), user=None)
-            return None
-
-    lifted_coord = LIFTOVERS[genome_version].convert_coordinate(
-        'chr{}'.format(chrom.lstrip('chr')), int(pos)
-    )
-    return (lifted_coord[0][0].lstrip('chr'), lifted_coord[0][1]) if lifted_coord and lifted_coord[0] else None
@@ -1,14 +1,16 @@
 import os
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 from django.contrib.postgres.aggregates import ArrayAgg
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 from django.utils import timezone
 import json
 import logging
 import re
 
-from clickhouse_search.search import get_clickhouse_genotypes
+from clickhouse_search.search import get_clickhouse_family_genotypes, reset_cached_sample_metadata
 from reference_data.models import GENOME_VERSION_LOOKUP
 from seqr.models import Family, Dataset, Project, Individual, SavedVariant
 from seqr.utils.communication_utils import safe_post_to_slack, send_project_email
@@ -20,7 +22,7 @@ from seqr.views.utils.json_to_orm_utils import create_model_from_json
 from seqr.views.utils.permissions_utils import is_internal_anvil_project, project_has_anvil
 from seqr.views.utils.variant_utils import reset_cached_search_results
 from settings import SEQR_SLACK_LOADING_NOTIFICATION_CHANNEL, PIPELINE_DATA_DIR, ANVIL_UI_URL, IS_ANVIL_LOADING_DELAY, \
-    SEQR_SLACK_ANVIL_DATA_LOADING_CHANNEL
+    SEQR_SLACK_ANVIL_DATA_LOADING_CHANNEL, PIPELINE_RUN_MAX_WORKERS
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +31,10 @@ RUN_FILE_PATH_TEMPLATE = '{data_dir}/{genome_version}/{dataset_type}/runs/{run_v
 CLICKHOUSE_SUCCESS_FILE_NAME = '_CLICKHOUSE_LOAD_SUCCESS'
 VALIDATION_ERRORS_FILE_NAME = 'validation_errors.json'
 ERRORS_REPORTED_FILE_NAME = '_ERRORS_REPORTED'
+LOAD_CHECKPOINT_FILE_NAME = '_SEARCH_DATA_LOADED'
+LOAD_RESUMED_FILE_NAME = '_LOAD_RESUMED'
+LOAD_RESUME_FAILED_FILE_PREFIX = '_LOAD_RESUME_FAILED_'
+MAX_LOAD_RESUME_ATTEMPTS = 3
 RUN_PATH_FIELDS = ['genome_version', 'dataset_type', 'run_version', 'file_name']
 
 DATASET_TYPE_MAP = {'GCNV': Dataset.DATASET_TYPE_SV_CALLS}
@@ -82,23 +88,108 @@ class Command(BaseCommand):
             run_dir: run_details for run_dir, run_details in runs.items()
             if run_dir in success_run_dirs and run_details['run_version'] not in loaded_runs
         }
-        if not new_runs:
+        resume_runs = {
+            run_dir: run_details for run_dir, run_details in runs.items()
+            if run_dir in success_run_dirs and run_dir not in new_runs and
+            LOAD_CHECKPOINT_FILE_NAME in run_details['files'] and LOAD_RESUMED_FILE_NAME not in run_details['files'] and
+            self._num_failed_resume_attempts(run_details) < MAX_LOAD_RESUME_ATTEMPTS
+        }
+        if not (new_runs or resume_runs):
             logger.info(f'Data already loaded for all {len(success_run_dirs)} runs')
             return
 
-        logger.info(f'Loading new samples from {len(success_run_dirs)} run(s)')
-        for run_dir, run_details in new_runs.items():
+        if new_runs:
+            logger.info(f'Loading new samples from {len(success_run_dirs)} run(s)')
+        if resume_runs:
+            logger.info(f'Resuming loading for {len(resume_runs)} run(s)')
+        load_runs = [
+            (run_dir, run_details, run_dir in resume_runs) for run_dir, run_details in runs.items()
+            if run_dir in new_runs or run_dir in resume_runs
+        ]
+        loaded_dataset_types = {dataset_type for dataset_type in self._load_runs(load_runs) if dataset_type}
+
+        # Reset cached results for all projects with the loaded data types, as seqr AFs will have changed for all
+        # projects when new data is added. Runs which failed before updating any search data do not need a reset
+        if loaded_dataset_types:
+            reset_cached_search_results(project=None, dataset_types=loaded_dataset_types)
+
+    @classmethod
+    def _load_runs(cls, runs):
+        # Runs for the same genome version and dataset type update the same datasets, so are always loaded in order
+        run_groups = defaultdict(list)
+        for run in runs:
+            run_details = run[1]
+            run_groups[(
+                run_details['genome_version'], DATASET_TYPE_MAP.get(run_details['dataset_type'], run_details['dataset_type'])
+            )].append(run)
+        if PIPELINE_RUN_MAX_WORKERS <= 1 or len(run_groups) <= 1:
+            return [cls._load_run(*run) for run in runs]
+
+        with ThreadPoolExecutor(max_workers=min(PIPELINE_RUN_MAX_WORKERS, len(run_groups))) as executor:
+            return [
+                dataset_type for group_dataset_types in executor.map(cls._load_threaded_run_group, run_groups.values())
+                for dataset_type in group_dataset_types
+            ]
+
+    @classmethod
+    def _load_threaded_run_group(cls, runs):
+        try:
+            return [cls._load_run(*run) for run in runs]
+        finally:
+            # Django opens new database connections per thread, so they need to be explicitly closed
+            connections.close_all()
+
+    @classmethod
+    def _load_run(cls, run_dir, run_details, resume):
+        """Loads a single run, and returns its dataset type if any search data was updated. Errors are isolated to the
+        run, and runs which fail after updating their search data are checkpointed so the remaining steps are retried"""
+        run_version = run_details['run_version']
+        if CLICKHOUSE_MIGRATION_SENTINEL in run_version:
+            logging.info(f'Skipping ClickHouse migration {run_details["genome_version"]}/{run_details["dataset_type"]}: {run_version}')
+            return None
+
+        dataset_type = DATASET_TYPE_MAP.get(run_details['dataset_type'], run_details['dataset_type'])
+        metadata_path = os.path.join(run_dir, 'metadata.json')
+        try:
+            if resume:
+                families_by_project = cls._resume_new_samples(metadata_path, **run_details)
+            else:
+                families_by_project = cls._load_new_samples(metadata_path, **run_details)
+            cls._reload_saved_variant_genotypes(families_by_project, run_details['dataset_type'])
+            if resume:
+                write_multiple_files([(LOAD_RESUMED_FILE_NAME, [], [])], run_dir, user=None, file_format=None)
+        except Exception as e:
+            logger.error(f'Error loading {run_version}: {e}')
+            if resume:
+                cls._record_failed_resume(run_dir, run_details)
+                return None
+            if not Dataset.objects.filter(data_source=run_version).exists():
+                return None
             try:
-                if CLICKHOUSE_MIGRATION_SENTINEL in run_details["run_version"]:
-                    logging.info(f'Skipping ClickHouse migration {run_details["genome_version"]}/{run_details["dataset_type"]}: {run_details["run_version"]}')
-                    continue
-                metadata_path = os.path.join(run_dir, 'metadata.json')
-                self._load_new_samples(metadata_path, **run_details)
+                write_multiple_files([(LOAD_CHECKPOINT_FILE_NAME, [], [])], run_dir, user=None, file_format=None)
             except Exception as e:
-                logger.error(f'Error loading {run_details["run_version"]}: {e}')
+                logger.error(f'Error writing loading checkpoint for {run_version}: {e}')
+        # Resumed runs have already had their search data updated and their cached results reset
+        return None if resume else dataset_type
 
-        # Reset cached results for all projects, as seqr AFs will have changed for all projects when new data is added
-        reset_cached_search_results(project=None)
+    @staticmethod
+    def _num_failed_resume_attempts(run_details):
+        return len([file_name for file_name in run_details['files'] if file_name.startswith(LOAD_RESUME_FAILED_FILE_PREFIX)])
+
+    @classmethod
+    def _record_failed_resume(cls, run_dir, run_details):
+        # Each failed attempt is recorded with its own file, so a run that keeps failing is not resumed indefinitely
+        run_version = run_details['run_version']
+        num_attempts = cls._num_failed_resume_attempts(run_details) + 1
+        try:
+            write_multiple_files(
+                [(f'{LOAD_RESUME_FAILED_FILE_PREFIX}{num_attempts}', [], [])], run_dir, user=None, file_format=None,
+            )
+        except Exception as e:
+            logger.error(f'Error recording failed resume for {run_version}: {e}')
+            return
+        if num_attempts >= MAX_LOAD_RESUME_ATTEMPTS:
+            logger.error(f'Unable to resume loading {run_version} after {num_attempts} attempts, it will not be retried')
 
     @classmethod
     def _get_runs(cls, **kwargs):
@@ -191,20 +282,35 @@ class Command(BaseCommand):
         })
 
     @classmethod
-    def _load_new_samples(cls, metadata_path, genome_version, dataset_type, run_version, **kwargs):
-        clickhouse_dataset_type = CLICKHOUSE_DATASET_TYPE_MAP.get(dataset_type, dataset_type)
+    def _resume_new_samples(cls, metadata_path, genome_version, dataset_type, run_version, **kwargs):
         dataset_type = DATASET_TYPE_MAP.get(dataset_type, dataset_type)
-
-        logger.info(f'Loading new samples from {genome_version}/{dataset_type}: {run_version}')
+        logger.info(f'Resuming loading new samples from {genome_version}/{dataset_type}: {run_version}')
 
         metadata = json.loads(next(line for line in file_iter(metadata_path)))
+        family_project_map = cls._get_family_project_map(metadata, genome_version, dataset_type, run_version)
+        families_by_project = defaultdict(list)
+        for family_guid in metadata['family_samples'].keys():
+            families_by_project[family_project_map[family_guid]].append(family_guid)
+        return families_by_project
+
+    @staticmethod
+    def _get_family_project_map(metadata, genome_version, dataset_type, run_version):
         run_family_guids = set(metadata['family_samples'].keys())
         families = Family.objects.filter(guid__in=run_family_guids)
         if len(families) < len(run_family_guids):
             invalid = run_family_guids - set(families.values_list('guid', flat=True))
             raise CommandError(f'Invalid families in run metadata {genome_version}/{dataset_type}: {run_version} - {", ".join(invalid)}')
+        return {f.guid: f.project for f in families.select_related('project')}
 
-        family_project_map = {f.guid: f.project for f in families.select_related('project')}
+    @classmethod
+    def _load_new_samples(cls, metadata_path, genome_version, dataset_type, run_version, **kwargs):
+        dataset_type = DATASET_TYPE_MAP.get(dataset_type, dataset_type)
+
+        logger.info(f'Loading new samples from {genome_version}/{dataset_type}: {run_version}')
+
+        metadata = json.loads(next(line for line in file_iter(metadata_path)))
+        run_family_guids = set(metadata['family_samples'].keys())
+        family_project_map = cls._get_family_project_map(metadata, genome_version, dataset_type, run_version)
         families_by_project = defaultdict(list)
         samples_by_project = defaultdict(list)
         num_samples = 0
@@ -250,6 +356,7 @@ class Command(BaseCommand):
             new_samples_by_project[project.id] = cls._match_and_update_search_datasets(
                 individuals, sample_type, dataset_type, data_source=run_version,
             )
+        reset_cached_sample_metadata([project.guid for project in individuals_by_project.keys()])
 
         split_project_pdos = cls._report_loading_success(
             dataset_type, sample_type, run_version, samples_by_project, new_samples_by_project,
@@ -267,6 +374,11 @@ class Command(BaseCommand):
             except Exception as e:
                 logger.error(f'Error updating individuals sample qc {run_version}: {e}')
 
+        return families_by_project
+
+    @classmethod
+    def _reload_saved_variant_genotypes(cls, families_by_project, dataset_type):
+        clickhouse_dataset_type = CLICKHOUSE_DATASET_TYPE_MAP.get(dataset_type, dataset_type)
         logger.info(f'Reloading saved variants in {len(families_by_project)} projects')
         for project, family_guids in families_by_project.items():
             updated_saved_variants = cls._update_project_saved_variant_genotypes(project, family_guids, clickhouse_dataset_type)
@@ -406,26 +518,28 @@ class Command(BaseCommand):
 
     @staticmethod
     def _update_project_saved_variant_genotypes(project, family_guids, dataset_type):
-        updates = {}
-        for family_guid in family_guids:
-            variant_models_by_key = {
-                v.key: v for v in
-                SavedVariant.objects.filter(dataset_type=dataset_type, family__guid=family_guid, key__isnull=False)
-            }
-            if not variant_models_by_key:
-                continue
-            variants = []
-            genotypes_by_key = get_clickhouse_genotypes(
-                project.guid, [family_guid], project.genome_version, dataset_type, variant_models_by_key.keys(),
-            )
-            for key, genotypes in genotypes_by_key.items():
-                variant = variant_models_by_key[key]
-                variant.genotypes = genotypes['genotypes']
-                variants.append(variant)
-            logger.info(f'Reloading genotypes for {len(variants)} {dataset_type} variants in family {family_guid}')
-            SavedVariant.bulk_update_models(None, variants, ['genotypes'])
-            updates.update({v.id: v for v in variants})
-        return updates
+        variant_models = {
+            (v.family.guid, v.key): v for v in SavedVariant.objects.filter(
+                dataset_type=dataset_type, family__guid__in=family_guids, key__isnull=False,
+            ).select_related('family')
+        }
+        if not variant_models:
+            return {}
+
+        family_keys = defaultdict(set)
+        for family_guid, key in variant_models.keys():
+            family_keys[family_guid].add(key)
+        genotypes_by_family_key = get_clickhouse_family_genotypes(
+            project.guid, family_keys, project.genome_version, dataset_type,
+        )
+        variants = []
+        for family_key, genotypes in genotypes_by_family_key.items():
+            variant = variant_models[family_key]
+            variant.genotypes = genotypes
+            variants.append(variant)
+        logger.info(f'Reloading genotypes for {len(variants)} {dataset_type} variants in {len(family_keys)} families')
+        SavedVariant.bulk_update_models(None, variants, ['genotypes'])
+        return {v.id: v for v in variants}
 
     @classmethod
     def _match_and_update_search_datasets(cls, individuals, sample_type, dataset_type, data_source):
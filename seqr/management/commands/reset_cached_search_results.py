@@ -11,12 +11,11 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('--project', help='optional project to reload variants for')
-        parser.add_argument('--reset-index-metadata', action='store_true', help='reset the index metadata')
 
     def handle(self, *args, **options):
         project_name = options['project']
         project = Project.objects.get(name=project_name) if project_name else None
-        reset_cached_search_results(project=project, reset_index_metadata=options.get('reset_index_metadata'))
+        reset_cached_search_results(project=project)
         logger.info(u'Reset cached search results for {}'.format(project_name or 'all projects'))
 
 
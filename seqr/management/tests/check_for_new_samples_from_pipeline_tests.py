@@ -358,10 +358,10 @@ class CheckNewSamplesTest(object):
             'updateType': 'bulk_update'}}
          ),
         ('Reloading saved variants in 2 projects', None),
-        ('Reloading genotypes for 1 SNV_INDEL variants in family F000012_12', None),
+        ('Reloading genotypes for 1 SNV_INDEL variants in 1 families', None),
         ('update 1 SavedVariants', {'dbUpdate': mock.ANY}),
         ('Updated 1 variants in 2 families for project Test Reprocessed Project', None),
-        ('Reloading genotypes for 1 SNV_INDEL variants in family F000014_14', None),
+        ('Reloading genotypes for 1 SNV_INDEL variants in 1 families', None),
         ('update 1 SavedVariants', {'dbUpdate': mock.ANY}),
         ('Updated 1 variants in 1 families for project Non-Analyst Project', None),
     ]
@@ -375,9 +375,13 @@ class CheckNewSamplesTest(object):
         mock_open_write_file = patcher.start()
         mock_open_write_file.side_effect = lambda file_name, *args: self.mock_written_files[file_name]
         self.addCleanup(patcher.stop)
-        patcher = mock.patch('seqr.views.utils.variant_utils.redis.StrictRedis')
+        patcher = mock.patch('seqr.utils.redis_utils.redis.StrictRedis')
         self.mock_redis = patcher.start()
-        self.mock_redis.return_value.keys.side_effect = lambda pattern: [pattern]
+        self.mock_redis.return_value.sscan_iter.side_effect = lambda key, **kwargs: [f'search_results__{key}']
+        self.mock_redis.return_value.unlink.side_effect = lambda *keys: len(keys)
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('seqr.utils.redis_utils.uuid.uuid4')
+        patcher.start().return_value.hex = 'abc123'
         self.addCleanup(patcher.stop)
         patcher = mock.patch('seqr.management.commands.check_for_new_samples_from_pipeline.PIPELINE_DATA_DIR')
         mock_data_dir = patcher.start()
@@ -448,16 +452,40 @@ class CheckNewSamplesTest(object):
                     f'Error loading {version}: {error_logs[version]}',
                     {'severity': 'ERROR', '@type': 'type.googleapis.com/google.devtools.clouderrorreporting.v1beta1.ReportedErrorEvent'},
                 ))
-        logs.append(('Reset 2 cached results', None))
+        # Cached results are only reset for runs which updated search data
+        reset_dataset_types = sorted({
+            data_type.split('/')[1] for data_type, version in runs
+            if version not in (error_logs or {}) and 'hail_search_to_clickhouse_migration' not in version
+        })
+        if reset_dataset_types:
+            logs.append((f'Reset {len(reset_dataset_types)} cached results', None))
         logs += [] if single_call else [(log, None) for log in self.VALIDATION_LOGS]
         logs.append(('DONE', None))
         self.assert_json_logs(user=None, expected=logs)
 
-        self.mock_redis.return_value.delete.assert_called_with('search_results__*', 'variant_lookup_results__*')
+        if not reset_dataset_types:
+            self.mock_redis.return_value.rename.assert_not_called()
+            self.mock_redis.return_value.incr.assert_not_called()
+        else:
+            self._assert_expected_reset_cache_calls(reset_dataset_types)
 
         num_calls = self._assert_expected_airtable_calls(bool(run_loading_logs), single_call)
         self.assertEqual(len(responses.calls), num_calls)
 
+    def _assert_expected_reset_cache_calls(self, reset_dataset_types):
+        self.mock_redis.return_value.rename.assert_has_calls([
+            mock.call(f'cache_tag__dataset_type__{dataset_type}', f'cache_tag__dataset_type__{dataset_type}__deleting__abc123')
+            for dataset_type in reset_dataset_types
+        ])
+        self.mock_redis.return_value.unlink.assert_any_call(
+            f'search_results__cache_tag__dataset_type__{reset_dataset_types[-1]}__deleting__abc123',
+        )
+        self.mock_redis.return_value.incr.assert_has_calls([
+            mock.call(f'cache_namespace_version__search_data__{dataset_type}') for dataset_type in reset_dataset_types
+        ])
+        self.mock_redis.return_value.incr.assert_any_call('cache_namespace_version__variant_details')
+        self.mock_redis.return_value.incr.assert_called_with('cache_namespace_version__variant_lookup_results')
+
     def _test_success_call(self, anvil_email_calls, next_dataset_id=155, fetched_tracking=True):
         Project.objects.filter(id__in=[1, 3]).update(genome_version=38)
 
@@ -733,7 +761,8 @@ The following 1 families failed sex check:
         self.mock_email.assert_not_called()
         self.mock_send_slack.assert_not_called()
         self.assertFalse(Dataset.objects.filter(last_modified_date__gt=dataset_last_modified).exists())
-        self.mock_redis.return_value.delete.assert_not_called()
+        self.mock_redis.return_value.unlink.assert_not_called()
+        self.mock_redis.return_value.incr.assert_not_called()
 
         # Test reloading shared annotations is skipped if too many saved variants
         snv_indel_datasets.delete()
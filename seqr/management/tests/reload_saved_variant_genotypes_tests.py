@@ -14,15 +14,15 @@ class ReloadSavedVariantGenotypesTest(AnvilAuthenticationTestCase):
 
         call_command('reload_saved_variant_genotypes', 'R0004_non_analyst_project')
         self.assert_json_logs(user=None, expected=[
-            ('Reloading genotypes for 0 MITO variants in family F000014_14', None),
-            ('Reloading genotypes for 1 SNV_INDEL variants in family F000014_14', None),
+            ('Reloading genotypes for 0 MITO variants in 1 families', None),
+            ('Reloading genotypes for 1 SNV_INDEL variants in 1 families', None),
             ('update 1 SavedVariants', {'dbUpdate': {
                 'dbEntity': 'SavedVariant',
                 'entityIds': ['SV0000006_1248367227_r0004_non'],
                 'updateFields': ['genotypes'],
                 'updateType': 'bulk_update',
             }}),
-            ('Reloading genotypes for 0 SV_WGS variants in family F000014_14', None),
+            ('Reloading genotypes for 0 SV_WGS variants in 1 families', None),
             ('Done', None),
         ])
         saved_variant = SavedVariant.objects.get(guid='SV0000006_1248367227_r0004_non')
@@ -38,7 +38,7 @@ class ReloadSavedVariantGenotypesTest(AnvilAuthenticationTestCase):
         self.reset_logs()
         call_command('reload_saved_variant_genotypes', 'R0001_1kg', '--family-guid=F000002_2')
         self.assert_json_logs(user=None, expected=[
-            ('Reloading genotypes for 1 SNV_INDEL variants in family F000002_2', None),
+            ('Reloading genotypes for 1 SNV_INDEL variants in 1 families', None),
             ('update 1 SavedVariants', {'dbUpdate': {
                 'dbEntity': 'SavedVariant',
                 'entityIds': ['SV0000002_1248367227_r0390_100'],
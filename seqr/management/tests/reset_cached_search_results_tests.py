@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import mock
+import redis
 
 from django.core.management import call_command
 from django.test import TestCase
@@ -19,38 +20,57 @@ class ResetCachedSearchResultsTest(TestCase):
         result.families.set(Family.objects.filter(pk=1))
         cls.result_guid = result.guid
 
-    @mock.patch('seqr.views.utils.variant_utils.redis.StrictRedis')
+    @mock.patch('seqr.utils.redis_utils.uuid.uuid4')
+    @mock.patch('seqr.utils.redis_utils.redis.StrictRedis')
     @mock.patch('seqr.views.utils.variant_utils.logger')
     @mock.patch('seqr.management.commands.reset_cached_search_results.logger')
-    def test_command(self, mock_command_logger, mock_utils_logger, mock_redis):
-        mock_redis.return_value.keys.side_effect = lambda pattern: [pattern] if pattern != 'variant_lookup_results__*' else []
+    def test_command(self, mock_command_logger, mock_utils_logger, mock_redis, mock_uuid):
+        mock_uuid.return_value.hex = 'abc123'
+        mock_redis.return_value.sscan_iter.side_effect = lambda key, **kwargs: [
+            'search_results__{}__xpos'.format(self.result_guid), 'search_results__{}__xpos__total'.format(self.result_guid),
+        ] if key == 'cache_tag__project__R0001_1kg__deleting__abc123' else []
+        mock_redis.return_value.unlink.side_effect = lambda *keys: len(keys)
 
         # Test command with a --project argument
         call_command('reset_cached_search_results', '--project={}'.format(PROJECT_NAME))
-        mock_redis.return_value.delete.assert_called_with('search_results__{}*'.format(self.result_guid))
-        mock_utils_logger.info.assert_called_with('Reset 1 cached results')
+        mock_redis.return_value.rename.assert_called_with(
+            'cache_tag__project__R0001_1kg', 'cache_tag__project__R0001_1kg__deleting__abc123')
+        mock_redis.return_value.unlink.assert_has_calls([
+            mock.call('search_results__{}__xpos'.format(self.result_guid), 'search_results__{}__xpos__total'.format(self.result_guid)),
+            mock.call('cache_tag__project__R0001_1kg__deleting__abc123'),
+        ])
+        mock_redis.return_value.incr.assert_called_once_with('cache_namespace_version__variant_lookup_results')
+        mock_redis.return_value.delete.assert_called_once_with(mock.ANY)
+        self.assertTrue(mock_redis.return_value.delete.call_args.args[0].endswith('R0001_1kg'))
+        mock_utils_logger.info.assert_called_with('Reset 2 cached results')
         mock_command_logger.info.assert_called_with('Reset cached search results for {}'.format(PROJECT_NAME))
 
         # Test for empty project
         mock_redis.reset_mock()
         call_command('reset_cached_search_results', '--project={}'.format(EMPTY_PROJECT_NAME))
-        mock_redis.return_value.delete.assert_not_called()
+        mock_redis.return_value.unlink.assert_called_once_with('cache_tag__project__R0002_empty__deleting__abc123')
         mock_utils_logger.info.assert_called_with('No cached results to reset')
         mock_command_logger.info.assert_called_with('Reset cached search results for {}'.format(EMPTY_PROJECT_NAME))
 
-        # Test command without any arguments
+        # Test for project with no tagged results
         mock_redis.reset_mock()
-        call_command('reset_cached_search_results')
-        mock_redis.return_value.delete.assert_called_with('search_results__*')
-        mock_utils_logger.info.assert_called_with('Reset 1 cached results')
-        mock_command_logger.info.assert_called_with('Reset cached search results for all projects')
+        mock_redis.return_value.rename.side_effect = redis.exceptions.ResponseError('no such key')
+        call_command('reset_cached_search_results', '--project={}'.format(EMPTY_PROJECT_NAME))
+        mock_redis.return_value.sscan_iter.assert_not_called()
+        mock_redis.return_value.unlink.assert_not_called()
+        mock_utils_logger.info.assert_called_with('No cached results to reset')
 
-        # Test command for reset metadata
+        # Test command without any arguments
         mock_redis.reset_mock()
-        mock_redis.return_value.keys.side_effect = lambda pattern: [pattern]
-        call_command('reset_cached_search_results', '--reset-index-metadata')
-        mock_redis.return_value.delete.assert_called_with('search_results__*', 'variant_lookup_results__*', 'index_metadata__*')
-        mock_utils_logger.info.assert_called_with('Reset 3 cached results')
+        call_command('reset_cached_search_results')
+        mock_redis.return_value.unlink.assert_not_called()
+        mock_redis.return_value.incr.assert_has_calls([
+            mock.call('cache_namespace_version__search_results'),
+            mock.call('cache_namespace_version__variant_details'),
+            mock.call('cache_namespace_version__sample_metadata'),
+            mock.call('cache_namespace_version__variant_lookup_results'),
+        ])
+        mock_utils_logger.info.assert_called_with('Reset all cached results')
         mock_command_logger.info.assert_called_with('Reset cached search results for all projects')
 
         # Test with connection error
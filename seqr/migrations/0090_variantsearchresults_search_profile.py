@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seqr', '0089_remove_savedvariant_saved_variant_json'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='variantsearchresults',
+            name='search_profile',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -1118,6 +1118,8 @@ class VariantSearchResults(ModelWithGUID):
     variant_search = models.ForeignKey('VariantSearch', on_delete=models.CASCADE)
     families = models.ManyToManyField('Family')
     search_hash = models.CharField(max_length=50, db_index=True, unique=True)
+    # Timing and query stats for the most recent time the search was run
+    search_profile = models.JSONField(null=True, blank=True)
 
     def __unicode__(self):
         return self.search_hash
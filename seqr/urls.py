@@ -99,6 +99,7 @@ from seqr.views.apis.variant_search_api import \
     create_saved_search_handler,\
     update_saved_search_handler, \
     variant_lookup_handler, \
+    variant_lookup_batch_handler, \
     vlm_lookup_handler, \
     search_results_redirect, \
     delete_saved_search_handler
@@ -254,6 +255,7 @@ api_endpoints = {
     'search/(?P<search_hash>[^/]+)/download': export_variants_handler,
     'search/(?P<search_hash>[^/]+)/gene_breakdown': get_variant_gene_breakdown,
     'variant_lookup': variant_lookup_handler,
+    'variant_lookup/batch': variant_lookup_batch_handler,
     'vlm_lookup': vlm_lookup_handler,
     'search_context': search_context_handler,
     'saved_search/all': get_saved_search_handler,
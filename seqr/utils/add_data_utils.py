@@ -4,6 +4,7 @@ from django.db.models import F
 import json
 import requests
 
+from clickhouse_search.search import reset_cached_sample_metadata
 from reference_data.models import GeneInfo, GENOME_VERSION_LOOKUP
 from seqr.models import Dataset, Individual, Project
 from seqr.utils.communication_utils import send_project_notification, safe_post_to_slack
@@ -74,6 +75,7 @@ def trigger_delete_families_search(project, family_guids, user=None):
         dataset.active_individuals.remove(*active_individuals)
     info = []
     if num_updated:
+        reset_cached_sample_metadata([project.guid])
         family_summary = ", ".join(sorted(updated_families))
         message = f'Disabled search for {num_updated} samples in the following {len(updated_families)} families: {family_summary}'
         info.append(message)
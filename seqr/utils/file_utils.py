@@ -1,5 +1,6 @@
 import glob
 import gzip
+import io
 import os
 import subprocess # nosec
 
@@ -7,6 +8,8 @@ from seqr.utils.logging_utils import SeqrLogger
 
 logger = SeqrLogger(__name__)
 
+FILE_RANGE_BLOCK_SIZE = 1024 * 1024
+
 
 def run_command(command, user=None, pipe_errors=False):
     logger.info('==> {}'.format(command), user)
@@ -61,15 +64,7 @@ def file_iter(file_path, byte_range=None, raw_content=False, user=None, **kwargs
         for line in _google_bucket_file_iter(file_path, byte_range=byte_range, raw_content=raw_content, user=user, **kwargs):
             yield line
     elif byte_range:
-        command = 'dd skip={offset} count={size} bs=1 if={file_path} status="none"'.format(
-            offset=byte_range[0],
-            size=byte_range[1]-byte_range[0] + 1,
-            file_path=file_path,
-        )
-        if file_path.endswith("gz"):
-            command += " | gunzip -c - "
-        process = run_command(command, user=user)
-        for line in process.stdout:
+        for line in _local_file_range_iter(file_path, byte_range, raw_content=raw_content):
             yield line
     else:
         mode = 'rb' if raw_content else 'r'
@@ -82,6 +77,83 @@ def file_iter(file_path, byte_range=None, raw_content=False, user=None, **kwargs
                 yield line
 
 
+class LocalFileRange(io.RawIOBase):
+    """Read-only file object for the inclusive byte range [start, end] of a local file
+
+    Reads are aligned to FILE_RANGE_BLOCK_SIZE boundaries, and the underlying file descriptor is kept positioned within
+    the range so WSGI servers can send the range directly from disk with sendfile
+    """
+
+    def __init__(self, file_path, start, end):
+        super().__init__()
+        self.name = file_path
+        self._start = start
+        self._end = end + 1
+        self._position = start
+        self._file = None
+        self._file = open(file_path, 'rb', buffering=0)
+        self._file.seek(start)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def tell(self):
+        return self._position - self._start
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: self._start, io.SEEK_CUR: self._position, io.SEEK_END: self._end}[whence]
+        self._position = min(max(base + offset, self._start), self._end)
+        self._file.seek(self._position)
+        return self.tell()
+
+    def readinto(self, buffer):
+        size = min(
+            len(buffer), self._end - self._position, FILE_RANGE_BLOCK_SIZE - (self._position % FILE_RANGE_BLOCK_SIZE),
+        )
+        if size <= 0:
+            return 0
+        num_read = self._file.readinto(memoryview(buffer)[:size])
+        self._position += num_read
+        return num_read
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        super().close()
+
+
+def local_file_range_iter(file_path, byte_range):
+    with LocalFileRange(file_path, *byte_range) as f:
+        for chunk in iter(lambda: f.read(FILE_RANGE_BLOCK_SIZE), b''):
+            yield chunk
+
+
+def _local_file_range_iter(file_path, byte_range, raw_content=False):
+    if raw_content:
+        for chunk in local_file_range_iter(file_path, byte_range):
+            yield chunk
+        return
+
+    with LocalFileRange(file_path, *byte_range) as f:
+        if file_path.endswith('gz'):
+            with gzip.open(f, 'rb') as gz_f:
+                try:
+                    for line in gz_f:
+                        yield line
+                except EOFError:
+                    # A byte range usually ends partway through a compressed block, so only complete content is returned
+                    pass
+        else:
+            for line in io.BufferedReader(f, FILE_RANGE_BLOCK_SIZE):
+                yield line
+
+
 def _google_bucket_file_iter(gs_path, byte_range=None, raw_content=False, user=None, **kwargs):
     range_arg = ' -r {}-{}'.format(byte_range[0], byte_range[1]) if byte_range else ''
     process = _run_gsutil_command(
@@ -1,7 +1,10 @@
+import gzip
 import mock
+import os
+import tempfile
 
 from unittest import TestCase
-from seqr.utils.file_utils import mv_file_to_gs
+from seqr.utils.file_utils import mv_file_to_gs, file_iter, LocalFileRange
 
 
 class FileUtilsTest(TestCase):
@@ -30,3 +33,39 @@ class FileUtilsTest(TestCase):
         mock_subproc.Popen.assert_called_with('gsutil mv /temp_path gs://bucket/target_path', stdout=mock_subproc.PIPE, stderr=mock_subproc.STDOUT, shell=True)  # nosec
         mock_logger.info.assert_called_with('==> gsutil mv /temp_path gs://bucket/target_path', None)
         process.wait.assert_called_with()
+
+    @mock.patch('seqr.utils.file_utils.FILE_RANGE_BLOCK_SIZE', 4)
+    @mock.patch('seqr.utils.file_utils.subprocess')
+    def test_local_file_byte_range(self, mock_subproc):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'test.txt')
+            with open(file_path, 'wb') as f:
+                f.write(b'line 1\nline 2\nline 3\n')
+
+            self.assertListEqual(list(file_iter(file_path, byte_range=(3, 9), raw_content=True)), [b'e', b' 1\nl', b'in'])
+            self.assertListEqual(list(file_iter(file_path, byte_range=(3, 9))), [b'e 1\n', b'lin'])
+            self.assertEqual(b''.join(file_iter(file_path, byte_range=(14, 100), raw_content=True)), b'line 3\n')
+
+            with LocalFileRange(file_path, 7, 12) as f:
+                self.assertEqual(f.seek(0, os.SEEK_END), 6)
+                self.assertEqual(f.seek(2), 2)
+                self.assertEqual(os.lseek(f.fileno(), 0, os.SEEK_CUR), 9)
+                self.assertEqual(f.read(), b'ne 2')
+
+            # Byte ranges of multi-block gzipped files are decompressed up to the last complete block
+            gz_file_path = os.path.join(temp_dir, 'test.vcf.gz')
+            with open(gz_file_path, 'wb') as f:
+                f.write(gzip.compress(b'##line 1\n##line 2\n'))
+                f.write(gzip.compress(b'#CHROM\tPOS\n'))
+                last_block_start = f.tell()
+                f.write(gzip.compress(b'1\t100\n'))
+            byte_range = (0, last_block_start + 5)
+            self.assertListEqual(
+                list(file_iter(gz_file_path, byte_range=byte_range)), [b'##line 1\n', b'##line 2\n', b'#CHROM\tPOS\n'],
+            )
+            with open(gz_file_path, 'rb') as f:
+                self.assertEqual(
+                    b''.join(file_iter(gz_file_path, byte_range=byte_range, raw_content=True)), f.read(last_block_start + 6),
+                )
+
+        mock_subproc.Popen.assert_not_called()
@@ -0,0 +1,127 @@
+import requests
+from requests.adapters import HTTPAdapter
+import threading
+import time
+
+from seqr.utils.file_utils import run_command, get_google_project
+from seqr.utils.redis_utils import safe_tiered_cache_get_json, safe_tiered_cache_set_json, LocalLruCache
+from settings import GS_STORAGE_URL, GS_STREAMING_POOL_SIZE
+
+GS_STORAGE_ACCESS_CACHE_KEY = 'gs_storage_access_cache_entry'
+TIMEOUT = 300
+ACCESS_TOKEN_REFRESH_SECONDS = 300
+RESOLVED_PATH_CACHE_SECONDS = 3600
+# Missing files may be uploaded at any time, so a missing .bam.bai index is only cached briefly
+MISSING_PATH_CACHE_SECONDS = 60
+RESOLVED_PATH_CACHE_MAX_SIZE = 10000
+
+ACCESS_TOKEN = {}
+_access_token_lock = threading.Lock()
+
+RESOLVED_GS_PATHS = LocalLruCache(RESOLVED_PATH_CACHE_MAX_SIZE)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    # Connections to the storage API are kept open and shared across requests, rather than opened for each range request
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=GS_STREAMING_POOL_SIZE)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+        return _session
+
+
+def _get_token_expiry(token):
+    response = _get_session().post(
+        'https://www.googleapis.com/oauth2/v1/tokeninfo',
+        headers={'Content-Type': 'application/x-www-form-urlencoded'},
+        data='access_token={}'.format(token), timeout=30,
+    )
+    if response.status_code == 200:
+        return response.json()['expires_in']
+    return 0
+
+
+def _is_fresh_token(token):
+    return bool(token) and token.get('refresh_at', 0) > time.time()
+
+
+def get_gs_access_token(user=None):
+    """Returns an access token for the storage API
+
+    Tokens are cached in-process and shared with other workers through redis, and are replaced shortly before they
+    expire so in-flight requests never use an expired token. Tokens which are already close to expiry are cached for
+    their remaining lifetime
+    """
+    with _access_token_lock:
+        if _is_fresh_token(ACCESS_TOKEN):
+            return ACCESS_TOKEN['token']
+
+        cached_token = safe_tiered_cache_get_json(GS_STORAGE_ACCESS_CACHE_KEY)
+        if isinstance(cached_token, dict) and _is_fresh_token(cached_token):
+            ACCESS_TOKEN.update(cached_token)
+            return ACCESS_TOKEN['token']
+
+        process = run_command('gcloud auth print-access-token', user=user)
+        if process.wait() != 0:
+            return None
+        access_token = next(process.stdout).decode('utf-8').strip()
+        expires_in = _get_token_expiry(access_token)
+        if expires_in > 0:
+            cache_seconds = expires_in - ACCESS_TOKEN_REFRESH_SECONDS if expires_in > ACCESS_TOKEN_REFRESH_SECONDS \
+                else expires_in
+            now = time.time()
+            token = {'token': access_token, 'expires_at': now + expires_in, 'refresh_at': now + cache_seconds}
+            ACCESS_TOKEN.update(token)
+            safe_tiered_cache_set_json(GS_STORAGE_ACCESS_CACHE_KEY, token, expire=cache_seconds)
+        return access_token
+
+
+def _get_gs_headers(gs_path, range_header=None, user=None):
+    headers = {'Authorization': 'Bearer {}'.format(get_gs_access_token(user))}
+    if range_header:
+        headers['Range'] = range_header
+    google_project = get_google_project(gs_path)
+    if google_project:
+        headers['x-goog-user-project'] = google_project
+    return headers
+
+
+def _get_gs_url(gs_path):
+    return f"{GS_STORAGE_URL}/{gs_path.replace('gs://', '', 1)}"
+
+
+def stream_gs_file(gs_path, range_header=None, user=None):
+    """Requests the given file, or byte range of the file, from the storage API
+
+    The returned response must be closed once its content is consumed to release its connection back to the pool
+    """
+    return _get_session().get(
+        _get_gs_url(gs_path), headers=_get_gs_headers(gs_path, range_header=range_header, user=user),
+        stream=True, timeout=TIMEOUT,
+    )
+
+
+def resolve_gs_index_path(gs_path, user=None):
+    """BAM indices may be stored as either .bam.bai or .bai files, so returns the path to whichever one exists"""
+    if not gs_path.endswith('.bam.bai'):
+        return gs_path
+
+    resolved_path = RESOLVED_GS_PATHS.get(gs_path)
+    if resolved_path:
+        return resolved_path
+
+    response = _get_session().head(_get_gs_url(gs_path), headers=_get_gs_headers(gs_path, user=user), timeout=TIMEOUT)
+    resolved_path = gs_path if response.status_code == 200 else gs_path.replace('.bam.bai', '.bai')
+    # Only cache definitive responses, so transient errors are retried on the next request
+    if response.status_code in {200, 404}:
+        RESOLVED_GS_PATHS.set(
+            gs_path, resolved_path,
+            RESOLVED_PATH_CACHE_SECONDS if response.status_code == 200 else MISSING_PATH_CACHE_SECONDS,
+        )
+    return resolved_path
@@ -0,0 +1,205 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import mock
+import re
+import threading
+import time
+from unittest import TestCase
+
+from seqr.utils.gcs_utils import get_gs_access_token, resolve_gs_index_path, stream_gs_file, ACCESS_TOKEN, \
+    RESOLVED_GS_PATHS, GS_STORAGE_ACCESS_CACHE_KEY
+from seqr.utils.redis_utils import LocalLruCache
+
+OBJECTS = {
+    '/project_A/sample_1.bai': b'0123456789abcdef',
+    '/fc-secure-project_B/sample_2.bam.bai': b'fedcba9876543210',
+}
+
+
+class FakeObjectStoreHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send_object(self, include_body):
+        self.server.requests.append((self.command, self.path, dict(self.headers), self.client_address))
+        content = OBJECTS.get(self.path)
+        if content is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        status = 200
+        range_match = re.fullmatch(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if range_match:
+            first_byte, last_byte = int(range_match.group(1)), int(range_match.group(2))
+            status = 206
+            self.send_response(status)
+            self.send_header('Content-Range', f'bytes {first_byte}-{last_byte}/{len(content)}')
+            content = content[first_byte:last_byte + 1]
+        else:
+            self.send_response(status)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        if include_body:
+            self.wfile.write(content)
+
+    def do_GET(self):
+        self._send_object(include_body=True)
+
+    def do_HEAD(self):
+        self._send_object(include_body=False)
+
+    def log_message(self, *args):
+        pass
+
+
+@mock.patch('seqr.utils.gcs_utils.safe_tiered_cache_set_json')
+@mock.patch('seqr.utils.gcs_utils.safe_tiered_cache_get_json')
+@mock.patch('seqr.utils.gcs_utils._get_token_expiry')
+@mock.patch('seqr.utils.gcs_utils.run_command')
+class GcsUtilsTest(TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeObjectStoreHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        patcher = mock.patch('seqr.utils.gcs_utils.GS_STORAGE_URL', f'http://127.0.0.1:{self.server.server_port}')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        ACCESS_TOKEN.clear()
+        RESOLVED_GS_PATHS.clear()
+        self.addCleanup(ACCESS_TOKEN.clear)
+        self.addCleanup(RESOLVED_GS_PATHS.clear)
+
+    def test_stream_gs_file(self, mock_run_command, mock_get_token_expiry, mock_get_redis, mock_set_redis):
+        mock_run_command.return_value.wait.return_value = 0
+        mock_run_command.return_value.stdout = iter([b'token1\n'])
+        mock_get_token_expiry.return_value = 3600
+        mock_get_redis.return_value = None
+
+        self.assertEqual(resolve_gs_index_path('gs://project_A/sample_1.bam.bai'), 'gs://project_A/sample_1.bai')
+        self.assertEqual(
+            resolve_gs_index_path('gs://fc-secure-project_B/sample_2.bam.bai'), 'gs://fc-secure-project_B/sample_2.bam.bai',
+        )
+        self.assertEqual(resolve_gs_index_path('gs://project_A/sample_1.bed.gz'), 'gs://project_A/sample_1.bed.gz')
+        # Resolved paths are cached
+        self.assertEqual(resolve_gs_index_path('gs://project_A/sample_1.bam.bai'), 'gs://project_A/sample_1.bai')
+
+        response = stream_gs_file('gs://project_A/sample_1.bai', range_header='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers['Content-Range'], 'bytes 2-5/16')
+        self.assertEqual(b''.join(response.iter_content(chunk_size=2)), b'2345')
+        response.close()
+
+        response = stream_gs_file('gs://fc-secure-project_B/sample_2.bam.bai')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'fedcba9876543210')
+        response.close()
+
+        self.assertListEqual([(method, path) for method, path, _, _ in self.server.requests], [
+            ('HEAD', '/project_A/sample_1.bam.bai'),
+            ('HEAD', '/fc-secure-project_B/sample_2.bam.bai'),
+            ('GET', '/project_A/sample_1.bai'),
+            ('GET', '/fc-secure-project_B/sample_2.bam.bai'),
+        ])
+        for _, path, headers, _ in self.server.requests:
+            self.assertEqual(headers['Authorization'], 'Bearer token1')
+            self.assertEqual(headers.get('x-goog-user-project'), 'anvil-datastorage' if 'fc-secure' in path else None)
+        self.assertEqual(self.server.requests[2][2]['Range'], 'bytes=2-5')
+        self.assertNotIn('Range', self.server.requests[3][2])
+        # All requests reuse the same pooled connection
+        self.assertEqual(len({client_address for _, _, _, client_address in self.server.requests}), 1)
+
+        mock_run_command.assert_called_once_with('gcloud auth print-access-token', user=None)
+        mock_get_token_expiry.assert_called_once_with('token1')
+        mock_get_redis.assert_called_once_with(GS_STORAGE_ACCESS_CACHE_KEY)
+        mock_set_redis.assert_called_once_with(
+            GS_STORAGE_ACCESS_CACHE_KEY, {'token': 'token1', 'expires_at': mock.ANY, 'refresh_at': mock.ANY}, expire=3300,
+        )
+
+    def test_get_gs_access_token(self, mock_run_command, mock_get_token_expiry, mock_get_redis, mock_set_redis):
+        mock_run_command.return_value.wait.return_value = 0
+        mock_run_command.return_value.stdout = iter([b'token1\n', b'token2\n', b'token3\n'])
+        mock_get_token_expiry.return_value = 3600
+        mock_get_redis.return_value = {
+            'token': 'redis_token', 'expires_at': time.time() + 1300, 'refresh_at': time.time() + 1000,
+        }
+
+        self.assertEqual(get_gs_access_token(), 'redis_token')
+        self.assertEqual(get_gs_access_token(), 'redis_token')
+        mock_get_redis.assert_called_once_with(GS_STORAGE_ACCESS_CACHE_KEY)
+        mock_run_command.assert_not_called()
+
+        # Tokens are refreshed before they expire
+        ACCESS_TOKEN['refresh_at'] = time.time() - 1
+        mock_get_redis.return_value = {
+            'token': 'expiring_redis_token', 'expires_at': time.time() + 100, 'refresh_at': time.time() - 200,
+        }
+        self.assertEqual(get_gs_access_token(), 'token1')
+        mock_run_command.assert_called_once_with('gcloud auth print-access-token', user=None)
+        mock_set_redis.assert_called_once_with(
+            GS_STORAGE_ACCESS_CACHE_KEY, {'token': 'token1', 'expires_at': mock.ANY, 'refresh_at': mock.ANY}, expire=3300,
+        )
+
+        # Tokens close to expiry are cached for their remaining lifetime
+        ACCESS_TOKEN.clear()
+        mock_set_redis.reset_mock()
+        mock_get_redis.return_value = None
+        mock_get_token_expiry.return_value = 120
+        self.assertEqual(get_gs_access_token(), 'token2')
+        self.assertEqual(get_gs_access_token(), 'token2')
+        mock_set_redis.assert_called_once_with(
+            GS_STORAGE_ACCESS_CACHE_KEY, {'token': 'token2', 'expires_at': mock.ANY, 'refresh_at': mock.ANY}, expire=120,
+        )
+        self.assertEqual(ACCESS_TOKEN['expires_at'], ACCESS_TOKEN['refresh_at'])
+        self.assertEqual(mock_run_command.call_count, 2)
+
+        # Tokens which can not be checked for expiry are used but not cached
+        ACCESS_TOKEN.clear()
+        mock_set_redis.reset_mock()
+        mock_get_token_expiry.return_value = 0
+        self.assertEqual(get_gs_access_token(), 'token3')
+        mock_set_redis.assert_not_called()
+        self.assertDictEqual(ACCESS_TOKEN, {})
+
+        mock_run_command.return_value.wait.return_value = 1
+        self.assertIsNone(get_gs_access_token())
+
+    @mock.patch('seqr.utils.redis_utils.time.monotonic')
+    def test_resolve_gs_index_path_cache(self, mock_time, mock_run_command, mock_get_token_expiry, mock_get_redis, mock_set_redis):
+        mock_time.return_value = 1000
+        mock_run_command.return_value.wait.return_value = 0
+        mock_run_command.return_value.stdout = iter([b'token1\n'])
+        mock_get_token_expiry.return_value = 3600
+        mock_get_redis.return_value = None
+
+        self.assertEqual(resolve_gs_index_path('gs://project_A/sample_1.bam.bai'), 'gs://project_A/sample_1.bai')
+        self.assertEqual(
+            resolve_gs_index_path('gs://fc-secure-project_B/sample_2.bam.bai'), 'gs://fc-secure-project_B/sample_2.bam.bai',
+        )
+        self.assertEqual(len(self.server.requests), 2)
+
+        # Missing index files are only cached briefly
+        mock_time.return_value = 1061
+        resolve_gs_index_path('gs://project_A/sample_1.bam.bai')
+        resolve_gs_index_path('gs://fc-secure-project_B/sample_2.bam.bai')
+        self.assertListEqual([path for _, path, _, _ in self.server.requests], [
+            '/project_A/sample_1.bam.bai', '/fc-secure-project_B/sample_2.bam.bai', '/project_A/sample_1.bam.bai',
+        ])
+
+        mock_time.return_value = 4601
+        resolve_gs_index_path('gs://fc-secure-project_B/sample_2.bam.bai')
+        self.assertEqual(len(self.server.requests), 4)
+
+        # The number of cached paths is bounded
+        with mock.patch('seqr.utils.gcs_utils.RESOLVED_GS_PATHS', LocalLruCache(max_size=1)):
+            resolve_gs_index_path('gs://project_A/sample_1.bam.bai')
+            resolve_gs_index_path('gs://fc-secure-project_B/sample_2.bam.bai')
+            resolve_gs_index_path('gs://fc-secure-project_B/sample_2.bam.bai')
+            resolve_gs_index_path('gs://project_A/sample_1.bam.bai')
+        self.assertListEqual([path for _, path, _, _ in self.server.requests[4:]], [
+            '/project_A/sample_1.bam.bai', '/fc-secure-project_B/sample_2.bam.bai', '/project_A/sample_1.bam.bai',
+        ])
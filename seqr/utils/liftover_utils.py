@@ -0,0 +1,54 @@
+from functools import lru_cache
+import os
+from pyliftover.liftover import LiftOver
+import threading
+
+from reference_data.models import GENOME_VERSION_GRCh38, GENOME_VERSION_GRCh37
+from seqr.utils.logging_utils import SeqrLogger
+from settings import LIFTOVER_CHAIN_FILE_DIR
+
+logger = SeqrLogger(__name__)
+
+PYLIFTOVER_BUILD_LOOKUP = {
+    GENOME_VERSION_GRCh38: ('hg19', 'hg38'),
+    GENOME_VERSION_GRCh37: ('hg38', 'hg19'),
+}
+LIFTOVER_CACHE_SIZE = 100000
+
+LIFTOVERS = {}
+_liftovers_lock = threading.Lock()
+
+
+def _get_liftover(genome_version):
+    # Loading a chain file is much slower than any individual conversion, so each is only loaded once per process
+    with _liftovers_lock:
+        if genome_version not in LIFTOVERS:
+            from_build, to_build = PYLIFTOVER_BUILD_LOOKUP[genome_version]
+            chain_file = os.path.join(
+                LIFTOVER_CHAIN_FILE_DIR, f'{from_build}To{to_build.title()}.over.chain.gz',
+            ) if LIFTOVER_CHAIN_FILE_DIR else None
+            LIFTOVERS[genome_version] = LiftOver(chain_file) if chain_file and os.path.isfile(chain_file) else \
+                LiftOver(from_build, to_build)
+        return LIFTOVERS[genome_version]
+
+
+@lru_cache(maxsize=LIFTOVER_CACHE_SIZE)
+def _liftover_coordinate(genome_version, chrom, pos):
+    lifted_coord = _get_liftover(genome_version).convert_coordinate(f'chr{chrom}', pos)
+    return (lifted_coord[0][0].lstrip('chr'), lifted_coord[0][1]) if lifted_coord and lifted_coord[0] else None
+
+
+def liftover_coordinates(genome_version, coordinates):
+    """Lifts over (chrom, pos) coordinates to the given genome version
+
+    Returns a dictionary mapping each coordinate which was successfully lifted to its lifted (chrom, pos)
+    """
+    lifted = {}
+    try:
+        for chrom, pos in coordinates:
+            if (chrom, pos) not in lifted:
+                lifted[(chrom, pos)] = _liftover_coordinate(genome_version, chrom.lstrip('chr'), int(pos))
+    except Exception as e:
+        logger.error('ERROR: Unable to set up liftover. {}'.format(e), user=None)
+        return {}
+    return {coord: lifted_coord for coord, lifted_coord in lifted.items() if lifted_coord}
@@ -0,0 +1,53 @@
+import mock
+from unittest import TestCase
+
+from seqr.utils.liftover_utils import liftover_coordinates, LIFTOVERS, _liftover_coordinate
+
+
+@mock.patch('seqr.utils.liftover_utils.logger')
+@mock.patch('seqr.utils.liftover_utils.LiftOver')
+class LiftoverUtilsTest(TestCase):
+
+    def setUp(self):
+        LIFTOVERS.clear()
+        _liftover_coordinate.cache_clear()
+        self.addCleanup(LIFTOVERS.clear)
+        self.addCleanup(_liftover_coordinate.cache_clear)
+
+    def test_liftover_coordinates(self, mock_liftover, mock_logger):
+        mock_convert_coordinate = mock_liftover.return_value.convert_coordinate
+        mock_convert_coordinate.side_effect = lambda chrom, pos: [] if pos < 100 else [(chrom, pos + 10000, '+', 1)]
+
+        self.assertDictEqual(liftover_coordinates('38', [('1', 439), ('chr7', 143260172), ('1', 50), ('1', 439)]), {
+            ('1', 439): ('1', 10439), ('chr7', 143260172): ('7', 143270172),
+        })
+        mock_liftover.assert_called_once_with('hg19', 'hg38')
+        self.assertListEqual(mock_convert_coordinate.call_args_list, [
+            mock.call('chr1', 439), mock.call('chr7', 143260172), mock.call('chr1', 50),
+        ])
+
+        # Chain files are only loaded once, and previously lifted coordinates are not converted again
+        mock_convert_coordinate.reset_mock()
+        self.assertDictEqual(liftover_coordinates('38', [('1', 439), ('X', 200)]), {
+            ('1', 439): ('1', 10439), ('X', 200): ('X', 10200),
+        })
+        mock_liftover.assert_called_once_with('hg19', 'hg38')
+        mock_convert_coordinate.assert_called_once_with('chrX', 200)
+
+        self.assertDictEqual(liftover_coordinates('37', [('1', 10439)]), {('1', 10439): ('1', 20439)})
+        mock_liftover.assert_called_with('hg38', 'hg19')
+        self.assertEqual(mock_liftover.call_count, 2)
+        mock_logger.error.assert_not_called()
+
+        # Test local chain files
+        LIFTOVERS.clear()
+        with mock.patch('seqr.utils.liftover_utils.LIFTOVER_CHAIN_FILE_DIR', '/chain_files'), \
+                mock.patch('seqr.utils.liftover_utils.os.path.isfile', lambda path: True):
+            liftover_coordinates('37', [('2', 10439)])
+        mock_liftover.assert_called_with('/chain_files/hg38ToHg19.over.chain.gz')
+
+        # Test errors loading chain files
+        LIFTOVERS.clear()
+        mock_liftover.side_effect = Exception('Unable to download chain file')
+        self.assertDictEqual(liftover_coordinates('37', [('3', 10439)]), {})
+        mock_logger.error.assert_called_with('ERROR: Unable to set up liftover. Unable to download chain file', user=None)
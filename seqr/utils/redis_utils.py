@@ -1,24 +1,60 @@
+from collections import OrderedDict
+from copy import deepcopy
+from datetime import timedelta
+import gzip
 import json
 import logging
 import redis
+import threading
+import time
+import uuid
 
 from seqr.views.utils.json_utils import DjangoJSONEncoderWithSets
-from settings import REDIS_SERVICE_HOSTNAME, REDIS_SERVICE_PORT
+from settings import REDIS_SERVICE_HOSTNAME, REDIS_SERVICE_PORT, REDIS_COMPRESSION_MIN_BYTES, \
+    REDIS_LOCAL_CACHE_EXPIRE_SECONDS, REDIS_LOCAL_CACHE_MAX_SIZE
 
 logger = logging.getLogger(__name__)
 
+JSON_LIST_TOTAL_SUFFIX = '__total'
+CACHE_TAG_PREFIX = 'cache_tag'
+CACHE_NAMESPACE_VERSION_PREFIX = 'cache_namespace_version'
+GZIP_MAGIC_BYTES = b'\x1f\x8b'
 
-def _redis_get(redis_client, cache_key):
-    return redis_client.get(cache_key)
+_connection_pool = None
 
 
-def safe_redis_get_json(cache_key, redis_get=_redis_get):
+def _get_redis_client():
+    # Connections are shared across all requests in the process, rather than opened for every cache call
+    global _connection_pool
+    if _connection_pool is None:
+        _connection_pool = redis.ConnectionPool(
+            host=REDIS_SERVICE_HOSTNAME, port=REDIS_SERVICE_PORT, socket_connect_timeout=3,
+        )
+    return redis.StrictRedis(connection_pool=_connection_pool)
+
+
+def _encode_json(value):
+    encoded = json.dumps(value, cls=DjangoJSONEncoderWithSets)
+    if REDIS_COMPRESSION_MIN_BYTES and len(encoded) >= REDIS_COMPRESSION_MIN_BYTES:
+        return gzip.compress(encoded.encode())
+    return encoded
+
+
+def _decode_json(value):
+    if isinstance(value, bytes) and value.startswith(GZIP_MAGIC_BYTES):
+        value = gzip.decompress(value)
+    return json.loads(value)
+
+
+def safe_redis_get_json(cache_key):
+    if cache_key is None:
+        return None
     try:
-        redis_client = redis.StrictRedis(host=REDIS_SERVICE_HOSTNAME, port=REDIS_SERVICE_PORT, socket_connect_timeout=3)
-        value = redis_get(redis_client, cache_key)
+        redis_client = _get_redis_client()
+        value = redis_client.get(cache_key)
         if value:
             logger.info('Loaded {} from redis'.format(cache_key))
-            return json.loads(value)
+            return _decode_json(value)
     except ValueError as e:
         logger.warning('Unable to fetch "{}" from redis:\t{}'.format(cache_key, str(e)))
     except Exception as e:
@@ -26,22 +62,305 @@ def safe_redis_get_json(cache_key, redis_get=_redis_get):
     return None
 
 
-def _redis_get_wildcard(redis_client, cache_key):
-    keys = redis_client.keys(pattern=cache_key)
-    if keys:
-        return redis_client.get(keys[0])  # Return the first matching key's value
-    return None
+def safe_redis_set_json(cache_key, value, expire=None, tags=None):
+    if cache_key is None:
+        return
+    try:
+        redis_client = _get_redis_client()
+        redis_client.set(cache_key, _encode_json(value), ex=expire)
+        if tags:
+            _add_cache_tags(redis_client, [cache_key], tags, expire)
+    except Exception as e:
+        logger.error('Unable to write to redis host {}: {}'.format(REDIS_SERVICE_HOSTNAME, str(e)))
+
+
+def safe_redis_get_json_multi(cache_keys):
+    """Returns a dictionary of the cached values for all the given keys in a single round trip"""
+    cache_keys = [cache_key for cache_key in cache_keys if cache_key is not None]
+    if not cache_keys:
+        return {}
+    try:
+        redis_client = _get_redis_client()
+        values = redis_client.mget(cache_keys)
+        loaded = {}
+        for cache_key, value in zip(cache_keys, values):
+            if value:
+                try:
+                    loaded[cache_key] = _decode_json(value)
+                except ValueError as e:
+                    logger.warning('Unable to fetch "{}" from redis:\t{}'.format(cache_key, str(e)))
+        if loaded:
+            logger.info('Loaded {} from redis'.format(', '.join(loaded.keys())))
+        return loaded
+    except Exception as e:
+        logger.error('Unable to connect to redis host {}: {}'.format(REDIS_SERVICE_HOSTNAME, str(e)))
+    return {}
+
+
+def safe_redis_set_json_multi(values_by_key, expire=None):
+    """Caches all the given values in a single round trip"""
+    values_by_key = {cache_key: value for cache_key, value in values_by_key.items() if cache_key is not None}
+    if not values_by_key:
+        return
+    try:
+        redis_client = _get_redis_client()
+        pipeline = redis_client.pipeline()
+        for cache_key, value in values_by_key.items():
+            pipeline.set(cache_key, _encode_json(value), ex=expire)
+        pipeline.execute()
+    except Exception as e:
+        logger.error('Unable to write to redis host {}: {}'.format(REDIS_SERVICE_HOSTNAME, str(e)))
+
+
+def _json_list_total_key(cache_key):
+    return f'{cache_key}{JSON_LIST_TOTAL_SUFFIX}'
+
 
+def safe_redis_get_json_list(cache_key, start=0, end=-1):
+    """Returns the (inclusive) start to end range of a cached list and the total list length, or (None, None)"""
+    if cache_key is None:
+        return None, None
+    try:
+        redis_client = _get_redis_client()
+        total = redis_client.get(_json_list_total_key(cache_key))
+        if total is not None:
+            total = int(total)
+            values = redis_client.lrange(cache_key, start, end) if total else []
+            logger.info('Loaded {} from redis'.format(cache_key))
+            return [_decode_json(value) for value in values], total
+    except ValueError as e:
+        logger.warning('Unable to fetch "{}" from redis:\t{}'.format(cache_key, str(e)))
+    except Exception as e:
+        logger.error('Unable to connect to redis host {}: {}'.format(REDIS_SERVICE_HOSTNAME, str(e)))
+    return None, None
 
-def safe_redis_get_wildcard_json(cache_key):
-    return safe_redis_get_json(cache_key, redis_get=_redis_get_wildcard)
 
+def safe_redis_iter_json_list(cache_key, total, start=0, chunk_size=1000):
+    for chunk_start in range(start, total, chunk_size):
+        values, _ = safe_redis_get_json_list(cache_key, start=chunk_start, end=chunk_start + chunk_size - 1)
+        if values is None:
+            raise ValueError(f'Unable to fetch "{cache_key}" from redis')
+        yield values
 
-def safe_redis_set_json(cache_key, value, expire=None):
+
+def safe_redis_get_json_list_items(cache_key, indices):
+    if cache_key is None:
+        return None
     try:
-        redis_client = redis.StrictRedis(host=REDIS_SERVICE_HOSTNAME, port=REDIS_SERVICE_PORT, socket_connect_timeout=3)
-        redis_client.set(cache_key, json.dumps(value, cls=DjangoJSONEncoderWithSets))
+        redis_client = _get_redis_client()
+        pipeline = redis_client.pipeline()
+        for index in indices:
+            pipeline.lindex(cache_key, index)
+        values = pipeline.execute()
+        if all(value is not None for value in values):
+            logger.info('Loaded {} from redis'.format(cache_key))
+            return [_decode_json(value) for value in values]
+    except ValueError as e:
+        logger.warning('Unable to fetch "{}" from redis:\t{}'.format(cache_key, str(e)))
+    except Exception as e:
+        logger.error('Unable to connect to redis host {}: {}'.format(REDIS_SERVICE_HOSTNAME, str(e)))
+    return None
+
+
+def safe_redis_set_json_list(cache_key, values, expire=None, tags=None):
+    if cache_key is None:
+        return
+    total_key = _json_list_total_key(cache_key)
+    try:
+        redis_client = _get_redis_client()
+        pipeline = redis_client.pipeline()
+        pipeline.delete(cache_key)
+        if values:
+            pipeline.rpush(cache_key, *[_encode_json(value) for value in values])
+            if expire:
+                pipeline.expire(cache_key, expire)
+        pipeline.set(total_key, len(values), ex=expire)
+        if tags:
+            _add_cache_tags(pipeline, [cache_key, total_key], tags, expire)
+        pipeline.execute()
+    except Exception as e:
+        logger.error('Unable to write to redis host {}: {}'.format(REDIS_SERVICE_HOSTNAME, str(e)))
+
+
+def _cache_tag_key(tag):
+    return f'{CACHE_TAG_PREFIX}__{tag}'
+
+
+def _add_cache_tags(redis_client, cache_keys, tags, expire):
+    for tag in tags:
+        tag_key = _cache_tag_key(tag)
+        redis_client.sadd(tag_key, *cache_keys)
         if expire:
-            redis_client.expire(cache_key, expire)
+            # Tagged keys are only ever deleted, so the tag only needs to outlive its most recently added key
+            redis_client.expire(tag_key, expire)
+
+
+def redis_delete_tagged_keys(tags, batch_size=1000):
+    """Deletes all keys cached with any of the given tags without blocking redis, and returns the number deleted"""
+    redis_client = _get_redis_client()
+    num_deleted = 0
+    for tag in tags:
+        # Rename the tag so keys tagged while the deletion is in progress are not dropped from the tag. The renamed key
+        # is unique so concurrent resets of the same tag never delete from, or overwrite, each other's in progress set
+        deleting_tag_key = f'{_cache_tag_key(tag)}__deleting__{uuid.uuid4().hex}'
+        try:
+            redis_client.rename(_cache_tag_key(tag), deleting_tag_key)
+        except redis.exceptions.ResponseError:
+            # No keys have been cached with this tag
+            continue
+        keys = []
+        for key in redis_client.sscan_iter(deleting_tag_key, count=batch_size):
+            keys.append(key)
+            if len(keys) >= batch_size:
+                num_deleted += redis_client.unlink(*keys)
+                keys = []
+        if keys:
+            num_deleted += redis_client.unlink(*keys)
+        redis_client.unlink(deleting_tag_key)
+    return num_deleted
+
+
+def _namespace_version_key(namespace):
+    return f'{CACHE_NAMESPACE_VERSION_PREFIX}__{namespace}'
+
+
+def safe_redis_namespace_key(namespace, key):
+    """
+    Returns the key for the current version of the given namespace, so all keys in a namespace can be reset at once.
+    Returns None if the version can not be fetched, which all cache helpers treat as a cache miss
+    """
+    return safe_redis_namespace_keys(namespace, [key])[0]
+
+
+def safe_redis_namespace_keys(namespace, keys):
+    """Returns the keys for the current version of the given namespace, fetching the version only once"""
+    try:
+        redis_client = _get_redis_client()
+        version = redis_client.get(_namespace_version_key(namespace))
+    except Exception as e:
+        logger.error('Unable to connect to redis host {}: {}'.format(REDIS_SERVICE_HOSTNAME, str(e)))
+        # Without the current version the key could resolve to values cached before the namespace was reset
+        return [None] * len(keys)
+    # Keys in a namespace that has never been reset are unversioned
+    prefix = f'{namespace}__v{int(version)}__' if version else f'{namespace}__'
+    return [f'{prefix}{key}' for key in keys]
+
+
+def safe_redis_namespace_versions(namespaces):
+    """Returns the current version of each of the given namespaces in a single round trip"""
+    namespaces = list(namespaces)
+    if not namespaces:
+        return {}
+    versions = [None] * len(namespaces)
+    try:
+        redis_client = _get_redis_client()
+        versions = redis_client.mget([_namespace_version_key(namespace) for namespace in namespaces])
+    except Exception as e:
+        logger.error('Unable to connect to redis host {}: {}'.format(REDIS_SERVICE_HOSTNAME, str(e)))
+    return {namespace: int(version) if version else 0 for namespace, version in zip(namespaces, versions)}
+
+
+def redis_reset_namespace(namespace):
+    redis_client = _get_redis_client()
+    redis_client.incr(_namespace_version_key(namespace))
+
+
+class LocalLruCache(object):
+    """A size-bounded, thread-safe, in-process cache where each entry expires after its own TTL"""
+
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cache_key):
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[cache_key]
+                return None
+            self._entries.move_to_end(cache_key)
+            return value
+
+    def set(self, cache_key, value, expire_seconds):
+        with self._lock:
+            self._entries[cache_key] = (time.monotonic() + expire_seconds, value)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, cache_keys):
+        with self._lock:
+            for cache_key in cache_keys:
+                self._entries.pop(cache_key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local_cache = LocalLruCache(REDIS_LOCAL_CACHE_MAX_SIZE)
+
+
+def _local_expire_seconds(expire):
+    if isinstance(expire, timedelta):
+        expire = expire.total_seconds()
+    # Other workers can not be notified of invalidations, so local entries are always short-lived
+    return min(expire, REDIS_LOCAL_CACHE_EXPIRE_SECONDS) if expire else REDIS_LOCAL_CACHE_EXPIRE_SECONDS
+
+
+def _safe_redis_get_json_with_expire(cache_key):
+    try:
+        redis_client = _get_redis_client()
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.get(cache_key)
+        pipeline.pttl(cache_key)
+        value, expire_ms = pipeline.execute()
+        if value:
+            logger.info('Loaded {} from redis'.format(cache_key))
+            return _decode_json(value), (expire_ms / 1000 if expire_ms > 0 else None)
+    except ValueError as e:
+        logger.warning('Unable to fetch "{}" from redis:\t{}'.format(cache_key, str(e)))
+    except Exception as e:
+        logger.error('Unable to connect to redis host {}: {}'.format(REDIS_SERVICE_HOSTNAME, str(e)))
+    return None, None
+
+
+def safe_tiered_cache_get_json(cache_key):
+    """Returns the cached value from this worker's in-process cache if available, and otherwise from redis"""
+    if cache_key is None:
+        return None
+    if not REDIS_LOCAL_CACHE_EXPIRE_SECONDS:
+        return safe_redis_get_json(cache_key)
+
+    value = _local_cache.get(cache_key)
+    if value is None:
+        value, expire = _safe_redis_get_json_with_expire(cache_key)
+        if value is None:
+            return None
+        _local_cache.set(cache_key, value, _local_expire_seconds(expire))
+    # Cached values are shared across requests, so callers must not be able to modify them
+    return deepcopy(value)
+
+
+def safe_tiered_cache_set_json(cache_key, value, expire=None):
+    if cache_key is None:
+        return
+    safe_redis_set_json(cache_key, value, expire=expire)
+    if REDIS_LOCAL_CACHE_EXPIRE_SECONDS:
+        _local_cache.set(cache_key, deepcopy(value), _local_expire_seconds(expire))
+
+
+def safe_tiered_cache_delete(cache_keys):
+    cache_keys = [cache_key for cache_key in cache_keys if cache_key is not None]
+    if not cache_keys:
+        return
+    _local_cache.delete(cache_keys)
+    try:
+        redis_client = _get_redis_client()
+        redis_client.delete(*cache_keys)
     except Exception as e:
         logger.error('Unable to write to redis host {}: {}'.format(REDIS_SERVICE_HOSTNAME, str(e)))
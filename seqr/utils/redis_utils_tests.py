@@ -1,7 +1,13 @@
+import gzip
 import json
 import mock
+import redis
 from unittest import TestCase
-from seqr.utils.redis_utils import safe_redis_set_json, safe_redis_get_json
+from seqr.utils.redis_utils import safe_redis_set_json, safe_redis_get_json, safe_redis_get_json_multi, \
+    safe_redis_set_json_multi, safe_redis_set_json_list, \
+    safe_redis_get_json_list, safe_redis_iter_json_list, safe_redis_get_json_list_items, safe_redis_namespace_key, \
+    safe_redis_namespace_keys, redis_reset_namespace, redis_delete_tagged_keys, safe_redis_namespace_versions, safe_tiered_cache_get_json, safe_tiered_cache_set_json, \
+    safe_tiered_cache_delete, LocalLruCache
 
 
 @mock.patch('seqr.utils.redis_utils.logger')
@@ -41,13 +47,12 @@ class RedisUtilsTest(TestCase):
 
     def test_safe_redis_set_json(self, mock_redis, mock_logger): # pylint: disable=no-self-use
         safe_redis_set_json('test_key', {'a': 1})
-        mock_redis.return_value.set.assert_called_with('test_key', '{"a": 1}')
-        mock_redis.return_value.expire.assert_not_called()
+        mock_redis.return_value.set.assert_called_with('test_key', '{"a": 1}', ex=None)
         mock_logger.error.assert_not_called()
 
         safe_redis_set_json('test_key', {'a': 1}, expire=100)
-        mock_redis.return_value.set.assert_called_with('test_key', '{"a": 1}')
-        mock_redis.return_value.expire.assert_called_with('test_key', 100)
+        mock_redis.return_value.set.assert_called_with('test_key', '{"a": 1}', ex=100)
+        mock_redis.return_value.expire.assert_not_called()
         mock_logger.error.assert_not_called()
 
         # test with redis connection error
@@ -55,3 +60,268 @@ class RedisUtilsTest(TestCase):
         mock_redis.side_effect = Exception('invalid redis')
         safe_redis_set_json('test_key', {'a': 1})
         mock_logger.error.assert_called_with('Unable to write to redis host localhost: invalid redis')
+
+    def test_safe_redis_set_json_list(self, mock_redis, mock_logger): # pylint: disable=no-self-use
+        mock_pipeline = mock_redis.return_value.pipeline.return_value
+        safe_redis_set_json_list('test_key', [{'a': 1}, [{'b': 2}, {'c': 3}]], expire=100)
+        mock_pipeline.delete.assert_called_with('test_key')
+        mock_pipeline.rpush.assert_called_with('test_key', '{"a": 1}', '[{"b": 2}, {"c": 3}]')
+        mock_pipeline.set.assert_called_with('test_key__total', 2, ex=100)
+        mock_pipeline.expire.assert_called_once_with('test_key', 100)
+        mock_pipeline.execute.assert_called_once()
+        mock_logger.error.assert_not_called()
+
+        mock_pipeline.reset_mock()
+        safe_redis_set_json_list('test_key', [])
+        mock_pipeline.delete.assert_called_with('test_key')
+        mock_pipeline.rpush.assert_not_called()
+        mock_pipeline.set.assert_called_with('test_key__total', 0, ex=None)
+        mock_pipeline.expire.assert_not_called()
+        mock_pipeline.execute.assert_called_once()
+
+        # test with redis connection error
+        mock_redis.side_effect = Exception('invalid redis')
+        safe_redis_set_json_list('test_key', [{'a': 1}])
+        mock_logger.error.assert_called_with('Unable to write to redis host localhost: invalid redis')
+
+    def test_safe_redis_get_json_list(self, mock_redis, mock_logger):
+        mock_cache = {
+            'test_key': [json.dumps({'a': i}) for i in range(5)], 'test_key__total': b'5',
+            'empty_key': [], 'empty_key__total': b'0',
+        }
+        mock_redis.return_value.get.side_effect = mock_cache.get
+        mock_redis.return_value.lrange.side_effect = lambda key, start, end: mock_cache[key][start:(end + 1) or None]
+        mock_pipeline = mock_redis.return_value.pipeline.return_value
+        mock_pipeline.lindex.side_effect = lambda key, index: pipeline_results.append(
+            mock_cache[key][index] if index < len(mock_cache.get(key, [])) else None)
+        pipeline_results = []
+        mock_pipeline.execute.side_effect = lambda: [pipeline_results.pop(0) for _ in list(pipeline_results)]
+
+        self.assertEqual(safe_redis_get_json_list('test_key'), ([{'a': i} for i in range(5)], 5))
+        self.assertEqual(safe_redis_get_json_list('test_key', start=1, end=2), ([{'a': 1}, {'a': 2}], 5))
+        mock_redis.return_value.lrange.assert_called_with('test_key', 1, 2)
+        mock_logger.info.assert_called_with('Loaded test_key from redis')
+
+        mock_redis.return_value.lrange.reset_mock()
+        self.assertEqual(safe_redis_get_json_list('empty_key'), ([], 0))
+        mock_redis.return_value.lrange.assert_not_called()
+
+        mock_logger.reset_mock()
+        self.assertEqual(safe_redis_get_json_list('missing_key'), (None, None))
+        mock_logger.info.assert_not_called()
+
+        self.assertListEqual(
+            list(safe_redis_iter_json_list('test_key', 5, start=1, chunk_size=2)),
+            [[{'a': 1}, {'a': 2}], [{'a': 3}, {'a': 4}]],
+        )
+        with self.assertRaises(ValueError) as cm:
+            list(safe_redis_iter_json_list('missing_key', 5))
+        self.assertEqual(str(cm.exception), 'Unable to fetch "missing_key" from redis')
+
+        self.assertListEqual(safe_redis_get_json_list_items('test_key', [3, 0]), [{'a': 3}, {'a': 0}])
+        self.assertListEqual(safe_redis_get_json_list_items('test_key', []), [])
+        self.assertIsNone(safe_redis_get_json_list_items('test_key', [3, 8]))
+        self.assertIsNone(safe_redis_get_json_list_items('missing_key', [0]))
+        mock_logger.error.assert_not_called()
+
+        # test with redis connection error
+        mock_redis.side_effect = Exception('invalid redis')
+        self.assertEqual(safe_redis_get_json_list('test_key'), (None, None))
+        self.assertIsNone(safe_redis_get_json_list_items('test_key', [0]))
+        mock_logger.error.assert_called_with('Unable to connect to redis host localhost: invalid redis')
+
+    def test_cache_tags(self, mock_redis, mock_logger):
+        safe_redis_set_json('test_key', {'a': 1}, expire=100, tags=['project__R0001'])
+        mock_redis.return_value.sadd.assert_called_with('cache_tag__project__R0001', 'test_key')
+        mock_redis.return_value.expire.assert_called_with('cache_tag__project__R0001', 100)
+
+        mock_pipeline = mock_redis.return_value.pipeline.return_value
+        safe_redis_set_json_list('test_key', [{'a': 1}], tags=['project__R0001', 'dataset_type__SV'])
+        mock_pipeline.sadd.assert_has_calls([
+            mock.call('cache_tag__project__R0001', 'test_key', 'test_key__total'),
+            mock.call('cache_tag__dataset_type__SV', 'test_key', 'test_key__total'),
+        ])
+        mock_logger.error.assert_not_called()
+
+        tagged_keys = {
+            'cache_tag__project__R0001__deleting__a1': ['key1', 'key2', 'key3'],
+            'cache_tag__dataset_type__SV__deleting__b2': ['key4'],
+        }
+        mock_redis.return_value.sscan_iter.side_effect = lambda key, **kwargs: tagged_keys[key]
+        mock_redis.return_value.unlink.side_effect = lambda *keys: len(keys)
+        def _mock_rename(key, new_key):
+            if new_key not in tagged_keys:
+                raise redis.exceptions.ResponseError('no such key')
+        mock_redis.return_value.rename.side_effect = _mock_rename
+        with mock.patch('seqr.utils.redis_utils.uuid.uuid4') as mock_uuid:
+            mock_uuid.side_effect = [mock.Mock(hex='a1'), mock.Mock(hex='b2'), mock.Mock(hex='c3')]
+            self.assertEqual(redis_delete_tagged_keys(['project__R0001', 'dataset_type__SV', 'dataset_type__MITO'], batch_size=2), 4)
+        mock_redis.return_value.rename.assert_has_calls([
+            mock.call('cache_tag__project__R0001', 'cache_tag__project__R0001__deleting__a1'),
+            mock.call('cache_tag__dataset_type__SV', 'cache_tag__dataset_type__SV__deleting__b2'),
+            mock.call('cache_tag__dataset_type__MITO', 'cache_tag__dataset_type__MITO__deleting__c3'),
+        ])
+        mock_redis.return_value.unlink.assert_has_calls([
+            mock.call('key1', 'key2'), mock.call('key3'), mock.call('cache_tag__project__R0001__deleting__a1'),
+            mock.call('key4'), mock.call('cache_tag__dataset_type__SV__deleting__b2'),
+        ])
+        self.assertEqual(mock_redis.return_value.unlink.call_count, 5)
+
+    def test_cache_namespaces(self, mock_redis, mock_logger):
+        mock_cache = {}
+        mock_redis.return_value.get.side_effect = mock_cache.get
+        mock_redis.return_value.mget.side_effect = lambda keys: [mock_cache.get(key) for key in keys]
+        mock_redis.return_value.incr.side_effect = lambda key: mock_cache.update({key: str(int(mock_cache.get(key, 0)) + 1).encode()})
+
+        self.assertEqual(safe_redis_namespace_key('search_results', 'abc__xpos'), 'search_results__abc__xpos')
+        redis_reset_namespace('search_results')
+        mock_redis.return_value.incr.assert_called_with('cache_namespace_version__search_results')
+        self.assertEqual(safe_redis_namespace_key('search_results', 'abc__xpos'), 'search_results__v1__abc__xpos')
+        redis_reset_namespace('search_results')
+        self.assertEqual(safe_redis_namespace_key('search_results', 'abc__xpos'), 'search_results__v2__abc__xpos')
+        self.assertEqual(safe_redis_namespace_key('variant_lookup_results', '1-10439-C-A'), 'variant_lookup_results__1-10439-C-A')
+        self.assertListEqual(
+            safe_redis_namespace_keys('search_results', ['abc__xpos', 'def__xpos']),
+            ['search_results__v2__abc__xpos', 'search_results__v2__def__xpos'],
+        )
+        self.assertDictEqual(
+            safe_redis_namespace_versions(['search_results', 'variant_lookup_results']),
+            {'search_results': 2, 'variant_lookup_results': 0},
+        )
+        mock_redis.return_value.mget.assert_called_once_with(
+            ['cache_namespace_version__search_results', 'cache_namespace_version__variant_lookup_results'])
+        mock_logger.error.assert_not_called()
+
+        # test with redis connection error
+        mock_redis.side_effect = Exception('invalid redis')
+        self.assertIsNone(safe_redis_namespace_key('search_results', 'abc__xpos'))
+        mock_logger.error.assert_called_with('Unable to connect to redis host localhost: invalid redis')
+        self.assertListEqual(safe_redis_namespace_keys('search_results', ['abc__xpos', 'def__xpos']), [None, None])
+        self.assertDictEqual(safe_redis_namespace_versions(['search_results']), {'search_results': 0})
+
+        # keys with an unknown namespace version are treated as cache misses and never written
+        mock_redis.side_effect = None
+        mock_redis.reset_mock()
+        self.assertIsNone(safe_redis_get_json(None))
+        self.assertTupleEqual(safe_redis_get_json_list(None), (None, None))
+        self.assertIsNone(safe_redis_get_json_list_items(None, [0]))
+        self.assertDictEqual(safe_redis_get_json_multi([None]), {})
+        self.assertIsNone(safe_tiered_cache_get_json(None))
+        safe_redis_set_json(None, {'a': 1})
+        safe_redis_set_json_list(None, [{'a': 1}])
+        safe_redis_set_json_multi({None: {'a': 1}})
+        safe_tiered_cache_set_json(None, {'a': 1})
+        safe_tiered_cache_delete([None])
+        mock_redis.assert_not_called()
+
+    def test_safe_redis_json_multi(self, mock_redis, mock_logger):
+        mock_cache = {'key1': b'{"a": 1}', 'key2': b'invalid', 'key3': b'[1, 2]'}
+        mock_redis.return_value.mget.side_effect = lambda keys: [mock_cache.get(key) for key in keys]
+        self.assertDictEqual(safe_redis_get_json_multi(['key1', 'key2', 'key3', 'key4']), {'key1': {'a': 1}, 'key3': [1, 2]})
+        mock_redis.return_value.mget.assert_called_once_with(['key1', 'key2', 'key3', 'key4'])
+        mock_logger.info.assert_called_with('Loaded key1, key3 from redis')
+        self.assertEqual(mock_logger.warning.call_args.args[0].split('\t')[0], 'Unable to fetch "key2" from redis:')
+
+        self.assertDictEqual(safe_redis_get_json_multi([]), {})
+        mock_redis.return_value.mget.assert_called_once()
+
+        mock_pipeline = mock_redis.return_value.pipeline.return_value
+        safe_redis_set_json_multi({'key1': {'a': 1}, 'key2': [1, 2]}, expire=100)
+        mock_pipeline.set.assert_has_calls([mock.call('key1', '{"a": 1}', ex=100), mock.call('key2', '[1, 2]', ex=100)])
+        mock_pipeline.execute.assert_called_once()
+        mock_logger.error.assert_not_called()
+
+        # test with redis connection error
+        mock_redis.side_effect = Exception('invalid redis')
+        self.assertDictEqual(safe_redis_get_json_multi(['key1']), {})
+        mock_logger.error.assert_called_with('Unable to connect to redis host localhost: invalid redis')
+        safe_redis_set_json_multi({'key1': {'a': 1}})
+        mock_logger.error.assert_called_with('Unable to write to redis host localhost: invalid redis')
+
+    @mock.patch('seqr.utils.redis_utils.REDIS_COMPRESSION_MIN_BYTES', 20)
+    def test_compression(self, mock_redis, mock_logger):
+        mock_cache = {}
+        mock_redis.return_value.set.side_effect = lambda key, value, **kwargs: mock_cache.update({key: value})
+        mock_redis.return_value.get.side_effect = mock_cache.get
+
+        safe_redis_set_json('small_key', {'a': 1})
+        self.assertEqual(mock_cache['small_key'], '{"a": 1}')
+        large_value = {'a': ['long value'] * 10}
+        safe_redis_set_json('large_key', large_value)
+        self.assertTrue(mock_cache['large_key'].startswith(b'\x1f\x8b'))
+        self.assertEqual(gzip.decompress(mock_cache['large_key']).decode(), json.dumps(large_value))
+
+        self.assertDictEqual(safe_redis_get_json('small_key'), {'a': 1})
+        self.assertDictEqual(safe_redis_get_json('large_key'), large_value)
+        mock_logger.warning.assert_not_called()
+        mock_logger.error.assert_not_called()
+
+    @mock.patch('seqr.utils.redis_utils.time.monotonic')
+    @mock.patch('seqr.utils.redis_utils._local_cache', LocalLruCache(max_size=2))
+    @mock.patch('seqr.utils.redis_utils.REDIS_LOCAL_CACHE_EXPIRE_SECONDS', 30)
+    def test_tiered_cache(self, mock_time, mock_redis, mock_logger):
+        mock_time.return_value = 1000
+        mock_pipeline = mock_redis.return_value.pipeline.return_value
+        mock_pipeline.execute.return_value = [json.dumps(['P1', 'P2']), 100000]
+
+        # values are loaded from redis once and then served from memory
+        self.assertListEqual(safe_tiered_cache_get_json('projects__user'), ['P1', 'P2'])
+        mock_pipeline.get.assert_called_with('projects__user')
+        mock_pipeline.pttl.assert_called_with('projects__user')
+        mock_logger.info.assert_called_with('Loaded projects__user from redis')
+        mock_pipeline.reset_mock()
+        cached = safe_tiered_cache_get_json('projects__user')
+        self.assertListEqual(cached, ['P1', 'P2'])
+        mock_pipeline.execute.assert_not_called()
+
+        # returned values can not modify the cache
+        cached.append('P3')
+        self.assertListEqual(safe_tiered_cache_get_json('projects__user'), ['P1', 'P2'])
+
+        # local entries expire with the shorter of the redis and the local expiry
+        mock_time.return_value = 1031
+        safe_tiered_cache_get_json('projects__user')
+        mock_pipeline.execute.assert_called_once()
+        mock_pipeline.reset_mock()
+        mock_pipeline.execute.return_value = [json.dumps('token'), 5000]
+        self.assertEqual(safe_tiered_cache_get_json('token_key'), 'token')
+        mock_time.return_value = 1037
+        mock_pipeline.execute.return_value = [None, -2]
+        self.assertIsNone(safe_tiered_cache_get_json('token_key'))
+
+        # writes go to both tiers
+        mock_pipeline.reset_mock()
+        safe_tiered_cache_set_json('feature_key', '2024-01-01', expire=60)
+        mock_redis.return_value.set.assert_called_with('feature_key', '"2024-01-01"', ex=60)
+        self.assertEqual(safe_tiered_cache_get_json('feature_key'), '2024-01-01')
+        mock_pipeline.execute.assert_not_called()
+
+        # least recently used entries are evicted once the cache is full
+        safe_tiered_cache_set_json('other_key', 1)
+        safe_tiered_cache_set_json('another_key', 2)
+        self.assertEqual(safe_tiered_cache_get_json('another_key'), 2)
+        self.assertIsNone(safe_tiered_cache_get_json('feature_key'))
+        mock_pipeline.execute.assert_called_once()
+
+        # invalidation clears both tiers
+        safe_tiered_cache_delete(['other_key', 'another_key'])
+        mock_redis.return_value.delete.assert_called_with('other_key', 'another_key')
+        mock_pipeline.reset_mock()
+        self.assertIsNone(safe_tiered_cache_get_json('another_key'))
+        mock_pipeline.execute.assert_called_once()
+        mock_logger.error.assert_not_called()
+
+        # test with redis connection error
+        mock_redis.side_effect = Exception('invalid redis')
+        self.assertIsNone(safe_tiered_cache_get_json('missing_key'))
+        mock_logger.error.assert_called_with('Unable to connect to redis host localhost: invalid redis')
+        safe_tiered_cache_delete(['other_key'])
+        mock_logger.error.assert_called_with('Unable to write to redis host localhost: invalid redis')
+
+    def test_tiered_cache_disabled(self, mock_redis, mock_logger):
+        mock_redis.return_value.get.side_effect = lambda key: json.dumps(['P1'])
+        self.assertListEqual(safe_tiered_cache_get_json('projects__user'), ['P1'])
+        self.assertListEqual(safe_tiered_cache_get_json('projects__user'), ['P1'])
+        self.assertEqual(mock_redis.return_value.get.call_count, 2)
+        mock_redis.return_value.pipeline.assert_not_called()
+        mock_logger.error.assert_not_called()
@@ -24,7 +24,8 @@ from seqr.utils.add_data_utils import get_missing_family_samples, get_loaded_ind
 from seqr.utils.vcf_utils import validate_vcf_and_get_samples, get_vcf_list
 from seqr.utils.logging_utils import SeqrLogger
 from seqr.utils.middleware import ErrorsWarningsException
-from seqr.views.utils.permissions_utils import is_anvil_authenticated, check_workspace_perm, login_and_policies_required
+from seqr.views.utils.permissions_utils import is_anvil_authenticated, check_workspace_perm, login_and_policies_required, \
+    reset_cached_project_guids_user_can_view
 from settings import BASE_URL, GOOGLE_LOGIN_REQUIRED_URL, POLICY_REQUIRED_URL, API_POLICY_REQUIRED_URL,\
     SEQR_SLACK_ANVIL_DATA_LOADING_CHANNEL
 logger = SeqrLogger(__name__)
@@ -177,6 +178,7 @@ def create_project_from_workspace(request, namespace, name):
     }
 
     project = create_model_from_json(Project, project_args, user=request.user)
+    reset_cached_project_guids_user_can_view([request.user])
 
     _trigger_add_workspace_data(project, pedigree_records, request.user, request_json['fullDataPath'], request_json['sampleType'])
 
@@ -4,7 +4,7 @@ from seqr.views.apis.awesomebar_api import awesomebar_autocomplete_handler
 from seqr.views.utils.test_utils import AuthenticationTestCase, AnvilAuthenticationTestCase
 
 
-@mock.patch('seqr.views.utils.permissions_utils.safe_redis_get_json', lambda *args: None)
+@mock.patch('seqr.views.utils.permissions_utils.safe_tiered_cache_get_json', lambda *args: None)
 class AwesomebarAPITest(object):
 
     @mock.patch('seqr.views.apis.awesomebar_api.MAX_STRING_LENGTH', 20)
@@ -23,10 +23,10 @@ EXPECTED_DASHBOARD_PROJECT = {
 }
 
 
-@mock.patch('seqr.views.utils.permissions_utils.safe_redis_get_json')
+@mock.patch('seqr.views.utils.permissions_utils.safe_tiered_cache_get_json')
 class DashboardPageTest(object):
 
-    @mock.patch('seqr.views.utils.permissions_utils.safe_redis_set_json')
+    @mock.patch('seqr.views.utils.permissions_utils.safe_tiered_cache_set_json')
     def test_dashboard_page_data(self, mock_set_redis, mock_get_redis):
         mock_get_redis.return_value = None
         url = reverse(dashboard_page_data)
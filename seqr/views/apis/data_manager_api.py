@@ -9,7 +9,7 @@ from django.db.models import Max, F, Q
 from django.http.response import HttpResponse
 from requests.exceptions import ConnectionError as RequestConnectionError
 
-from clickhouse_search.search import delete_clickhouse_project
+from clickhouse_search.search import delete_clickhouse_project, reset_cached_sample_metadata
 from seqr.utils.communication_utils import send_project_notification
 from seqr.utils.add_data_utils import trigger_data_loading, get_missing_family_samples, get_loaded_individual_ids, trigger_delete_families_search
 from seqr.utils.logging_utils import SeqrLogger
@@ -419,6 +419,7 @@ def trigger_delete_project(request):
         updated += len(active_individuals)
         dataset.inactive_individuals.add(*active_individuals)
         dataset.active_individuals.clear()
+    reset_cached_sample_metadata([project.guid])
     info = [f'Deactivated search for {updated} individuals']
     for sample_type in sample_types:
         info.append(delete_clickhouse_project(project, dataset_type=dataset_type, sample_type=sample_type))
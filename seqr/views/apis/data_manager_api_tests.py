@@ -534,6 +534,7 @@ class DataManagerAPITest(AirtableTest):
     def test_update_rna_outlier(self, *args, **kwargs):
         self._test_update_rna_seq('E', *args, **kwargs)
 
+    @mock.patch('seqr.views.utils.dataset_utils.RNA_CHUNK_NUM_ROWS', 2)
     def test_update_rna_tpm(self, *args, **kwargs):
         self._test_update_rna_seq('T', *args, **kwargs)
 
@@ -1426,9 +1427,10 @@ class LocalDataManagerAPITest(AuthenticationTestCase, DataManagerAPITest):
         ])
 
     def _assert_expected_read_vcf_header_subprocess_calls(self, body):
-        self.mock_subprocess.assert_has_calls([
-            mock.call(f'dd skip=0 count=65537 bs=1 if={self.TRIGGER_CALLSET_DIR}{body["filePath"]} status="none" | gunzip -c - ', stdout=-1, stderr=-2, shell=True) # nosec
-        ])
+        file_path = f'{self.TRIGGER_CALLSET_DIR}{body["filePath"]}'
+        self.mock_unzipped_open.assert_any_call(file_path, 'rb', buffering=0)
+        self.mock_open.assert_called_with(mock.ANY, 'rb')
+        self.assertEqual(self.mock_open.call_args.args[0].name, file_path)
 
     def _assert_write_pedigree_error(self, response):
         self.assertEqual(response.status_code, 500)
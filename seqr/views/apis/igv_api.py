@@ -1,14 +1,16 @@
 from collections import defaultdict
 import json
+import os
 import re
-import requests
+import secrets
 
 from django.core.exceptions import PermissionDenied
-from django.http import StreamingHttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 
 from seqr.models import Individual, IgvSample
-from seqr.utils.file_utils import file_iter, does_file_exist, is_google_bucket_file_path, run_command, get_google_project
-from seqr.utils.redis_utils import safe_redis_get_json, safe_redis_set_json
+from seqr.utils.file_utils import does_file_exist, is_google_bucket_file_path, local_file_range_iter, LocalFileRange, \
+    FILE_RANGE_BLOCK_SIZE
+from seqr.utils.gcs_utils import resolve_gs_index_path, stream_gs_file
 from seqr.views.utils.file_utils import save_uploaded_file, load_uploaded_file
 from seqr.views.utils.json_to_orm_utils import get_or_create_model_from_json
 from seqr.views.utils.json_utils import create_json_response
@@ -17,9 +19,9 @@ from seqr.views.utils.permissions_utils import get_project_and_check_permissions
     login_and_policies_required, pm_or_data_manager_required, get_project_guids_user_can_view, user_is_data_manager, \
     user_is_pm
 
-GS_STORAGE_ACCESS_CACHE_KEY = 'gs_storage_access_cache_entry'
-GS_STORAGE_URL = 'https://storage.googleapis.com'
-TIMEOUT = 300
+# Requests for many small ranges are costly to serve and are a known denial of service vector, so the full file is
+# returned instead
+MAX_BYTE_RANGES = 20
 
 
 def _process_alignment_records(rows, num_id_cols=1, **kwargs):
@@ -187,75 +189,117 @@ def fetch_igv_track(request, project_guid, igv_track_path):
 
     get_project_and_check_permissions(project_guid, request.user)
 
+    if is_google_bucket_file_path(igv_track_path):
+        return _stream_gs(request, resolve_gs_index_path(igv_track_path, user=request.user))
+
     if igv_track_path.endswith('.bam.bai') and not does_file_exist(igv_track_path, user=request.user):
         igv_track_path = igv_track_path.replace('.bam.bai', '.bai')
 
-    if is_google_bucket_file_path(igv_track_path):
-        return _stream_gs(request, igv_track_path)
-
     return _stream_file(request, igv_track_path)
 
 
 def _stream_gs(request, gs_path):
-    headers = _get_gs_rest_api_headers(request.META.get('HTTP_RANGE'), gs_path, user=request.user)
-
-    response = requests.get(
-        f"{GS_STORAGE_URL}/{gs_path.replace('gs://', '', 1)}",
-        headers=headers,
-        stream=True, timeout=TIMEOUT)
-
-    return StreamingHttpResponse(response.iter_content(chunk_size=65536), status=response.status_code,
+    response = stream_gs_file(gs_path, range_header=request.META.get('HTTP_RANGE'), user=request.user)
+    resp = StreamingHttpResponse(_gs_content_iter(response), status=response.status_code,
                                  content_type='application/octet-stream')
+    if response.headers.get('Content-Range'):
+        resp['Content-Range'] = response.headers['Content-Range']
+    return resp
 
 
-def _get_gs_rest_api_headers(range_header, gs_path, user=None):
-    headers = {'Authorization': 'Bearer {}'.format(_get_access_token(user))}
-    if range_header:
-        headers['Range'] = range_header
-    google_project = get_google_project(gs_path)
-    if google_project:
-        headers['x-goog-user-project'] = get_google_project(gs_path)
-
-    return headers
+def _gs_content_iter(response):
+    try:
+        for chunk in response.iter_content(chunk_size=65536):
+            yield chunk
+    finally:
+        response.close()
 
 
-def _get_token_expiry(token):
-    response = requests.post('https://www.googleapis.com/oauth2/v1/tokeninfo',
-                             headers={'Content-Type': 'application/x-www-form-urlencoded'},
-                             data='access_token={}'.format(token), timeout=30)
-    if response.status_code == 200:
-        result = json.loads(response.text)
-        return result['expires_in']
+def _stream_file(request, path):
+    content_type = 'application/octet-stream'
+    file_size = os.path.getsize(path)
+    byte_ranges = _parse_byte_ranges(request.META.get('HTTP_RANGE'), file_size)
+    if byte_ranges == []:
+        resp = HttpResponse(status=416)
+        resp['Content-Range'] = f'bytes */{file_size}'
+    elif not byte_ranges:
+        resp = _local_file_response(path, (0, file_size - 1), content_type=content_type)
+    elif len(byte_ranges) == 1:
+        first_byte, last_byte = byte_ranges[0]
+        resp = _local_file_response(path, byte_ranges[0], status=206, content_type=content_type)
+        resp['Content-Range'] = f'bytes {first_byte}-{last_byte}/{file_size}'
     else:
-        return 0
+        resp = _stream_multiple_file_ranges(path, byte_ranges, file_size, content_type)
+    resp['Accept-Ranges'] = 'bytes'
+    return resp
 
 
-def _get_access_token(user):
-    access_token = safe_redis_get_json(GS_STORAGE_ACCESS_CACHE_KEY)
-    if not access_token:
-        process = run_command('gcloud auth print-access-token', user=user)
-        if process.wait() == 0:
-            access_token = next(process.stdout).decode('utf-8').strip()
-            expires_in = _get_token_expiry(access_token)
-            safe_redis_set_json(GS_STORAGE_ACCESS_CACHE_KEY, access_token, expire=expires_in-5)
-    return access_token
+def _parse_byte_ranges(range_header, file_size):
+    """Parses an HTTP Range header into a list of inclusive (first_byte, last_byte) ranges within the file
+
+    Overlapping and adjacent ranges are merged. Returns None if the header is missing or malformed or requests too many
+    ranges, in which case the full file is returned, and an empty list if none of the requested ranges can be satisfied
+    """
+    range_match = re.fullmatch(r'\s*bytes\s*=\s*(\d*\s*-\s*\d*(?:\s*,\s*\d*\s*-\s*\d*)*)\s*', range_header or '', re.I)
+    if not range_match:
+        return None
+
+    byte_ranges = []
+    for byte_range in range_match.group(1).split(','):
+        first_byte, last_byte = [value.strip() for value in byte_range.split('-')]
+        if not first_byte:
+            if not last_byte:
+                return None
+            # Suffix ranges request the last N bytes of the file
+            first_byte = max(file_size - int(last_byte), 0)
+            last_byte = file_size - 1
+        else:
+            first_byte = int(first_byte)
+            if last_byte and int(last_byte) < first_byte:
+                return None
+            last_byte = min(int(last_byte), file_size - 1) if last_byte else file_size - 1
+        if first_byte < file_size:
+            byte_ranges.append((first_byte, last_byte))
+
+    merged_ranges = []
+    for first_byte, last_byte in sorted(byte_ranges):
+        if merged_ranges and first_byte <= merged_ranges[-1][1] + 1:
+            merged_ranges[-1] = (merged_ranges[-1][0], max(merged_ranges[-1][1], last_byte))
+        else:
+            merged_ranges.append((first_byte, last_byte))
+    if len(merged_ranges) > MAX_BYTE_RANGES:
+        return None
+    return merged_ranges
+
+
+def _local_file_response(path, byte_range, **kwargs):
+    # Hands the open file to the WSGI server, which can send it directly from disk rather than streaming it through python
+    resp = FileResponse(LocalFileRange(path, *byte_range), **kwargs)
+    resp.block_size = FILE_RANGE_BLOCK_SIZE
+    return resp
 
 
-def _stream_file(request, path):
-    # based on https://gist.github.com/dcwatson/cb5d8157a8fa5a4a046e
-    content_type = 'application/octet-stream'
-    range_header = request.META.get('HTTP_RANGE', None)
-    if range_header:
-        range_match = re.compile(r'bytes\s*=\s*(\d+)\s*-\s*(\d*)', re.I).match(range_header)
-        first_byte, last_byte = range_match.groups()
-        first_byte = int(first_byte) if first_byte else 0
-        last_byte = int(last_byte)
-        length = last_byte - first_byte + 1
-        resp = StreamingHttpResponse(
-            file_iter(path, byte_range=(first_byte, last_byte), raw_content=True, user=request.user), status=206, content_type=content_type)
-        resp['Content-Length'] = str(length)
-        resp['Content-Range'] = 'bytes %s-%s' % (first_byte, last_byte)
-    else:
-        resp = StreamingHttpResponse(file_iter(path, raw_content=True, user=request.user), content_type=content_type)
-    resp['Accept-Ranges'] = 'bytes'
+def _stream_multiple_file_ranges(path, byte_ranges, file_size, content_type):
+    boundary = secrets.token_hex(16)
+    part_headers = [
+        f'--{boundary}\r\nContent-Type: {content_type}\r\nContent-Range: bytes {first_byte}-{last_byte}/{file_size}\r\n\r\n'.encode()
+        for first_byte, last_byte in byte_ranges
+    ]
+    closing_boundary = f'--{boundary}--\r\n'.encode()
+
+    def _multipart_iter():
+        for part_header, byte_range in zip(part_headers, byte_ranges):
+            yield part_header
+            for chunk in local_file_range_iter(path, byte_range):
+                yield chunk
+            yield b'\r\n'
+        yield closing_boundary
+
+    resp = StreamingHttpResponse(
+        _multipart_iter(), status=206, content_type=f'multipart/byteranges; boundary={boundary}',
+    )
+    resp['Content-Length'] = str(sum(
+        len(part_header) + last_byte - first_byte + 3
+        for part_header, (first_byte, last_byte) in zip(part_headers, byte_ranges)
+    ) + len(closing_boundary))
     return resp
@@ -1,13 +1,15 @@
+from io import BytesIO
 import json
 import mock
 import responses
 import subprocess # nosec
+import time
 
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls.base import reverse
 from seqr.views.apis.igv_api import fetch_igv_track, receive_igv_table_handler, update_individual_igv_sample, \
     receive_bulk_igv_table_handler
-from seqr.views.apis.igv_api import GS_STORAGE_ACCESS_CACHE_KEY
+from seqr.utils.gcs_utils import GS_STORAGE_ACCESS_CACHE_KEY, ACCESS_TOKEN, RESOLVED_GS_PATHS
 from seqr.views.utils.test_utils import AnvilAuthenticationTestCase
 
 STREAMING_READS_CONTENT = [b'CRAM\x03\x83', b'\\\t\xfb\xa3\xf7%\x01', b'[\xfc\xc9\t\xae']
@@ -20,21 +22,20 @@ class IgvAPITest(AnvilAuthenticationTestCase):
     fixtures = ['users', 'social_auth', '1kg_project']
 
     @responses.activate
-    @mock.patch('seqr.utils.file_utils.logger')
-    @mock.patch('seqr.views.apis.igv_api.safe_redis_get_json')
-    @mock.patch('seqr.views.apis.igv_api.safe_redis_set_json')
-    def test_proxy_google_to_igv(self, mock_set_redis, mock_get_redis, mock_file_logger, mock_subprocess):
-        mock_ls_subprocess = mock.MagicMock()
-        mock_access_token_subprocess = mock.MagicMock()
-        mock_subprocess.side_effect = [mock_ls_subprocess, mock_access_token_subprocess]
-        mock_ls_subprocess.stdout = iter([b'CommandException: One or more URLs matched no objects.'])
-        mock_ls_subprocess.wait.return_value = 1
-        mock_access_token_subprocess.stdout = iter([b'token1\n', b'token2\n'])
-        mock_access_token_subprocess.wait.return_value = 0
+    @mock.patch('seqr.utils.gcs_utils.safe_tiered_cache_get_json')
+    @mock.patch('seqr.utils.gcs_utils.safe_tiered_cache_set_json')
+    def test_proxy_google_to_igv(self, mock_set_redis, mock_get_redis, mock_subprocess):
+        ACCESS_TOKEN.clear()
+        RESOLVED_GS_PATHS.clear()
+        self.addCleanup(ACCESS_TOKEN.clear)
+        self.addCleanup(RESOLVED_GS_PATHS.clear)
+        mock_subprocess.return_value.stdout = iter([b'token1\n', b'token2\n'])
+        mock_subprocess.return_value.wait.return_value = 0
         mock_get_redis.return_value = None
 
+        responses.add(responses.HEAD, 'https://storage.googleapis.com/fc-secure-project_A/sample_1.bam.bai', status=404)
         responses.add(responses.GET, 'https://storage.googleapis.com/fc-secure-project_A/sample_1.bai',
-                      stream=True,
+                      stream=True, headers={'Content-Range': 'bytes 100-200/1000'},
                       body=b'\n'.join(STREAMING_READS_CONTENT), status=206)
         responses.add(responses.POST, 'https://www.googleapis.com/oauth2/v1/tokeninfo',
                       body=b'{"expires_in": 3599}', status=200)
@@ -44,59 +45,123 @@ class IgvAPITest(AnvilAuthenticationTestCase):
         response = self.client.get(url, HTTP_RANGE='bytes=100-200')
         self.assertEqual(response.status_code, 206)
         self.assertEqual(next(response.streaming_content), b'\n'.join(STREAMING_READS_CONTENT))
-        self.assertEqual(responses.calls[1].request.headers.get('Range'), 'bytes=100-200')
-        self.assertEqual(responses.calls[1].request.headers.get('Authorization'), 'Bearer token1')
-        self.assertEqual(responses.calls[1].request.headers.get('x-goog-user-project'), 'anvil-datastorage')
-        mock_get_redis.assert_called_with(GS_STORAGE_ACCESS_CACHE_KEY)
-        mock_set_redis.assert_called_with(GS_STORAGE_ACCESS_CACHE_KEY, 'token1', expire=3594)
-        mock_subprocess.assert_has_calls([
-            mock.call('gsutil -u anvil-datastorage ls gs://fc-secure-project_A/sample_1.bam.bai', stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True),  # nosec
-            mock.call('gcloud auth print-access-token', stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True),  # nosec
-        ])
-        mock_ls_subprocess.wait.assert_called_once()
-        mock_access_token_subprocess.wait.assert_called_once()
-        mock_file_logger.warning.assert_any_call(
-            'CommandException: One or more URLs matched no objects.', self.collaborator_user)
-
+        self.assertEqual(response.get('Content-Range'), 'bytes 100-200/1000')
+        self.assertEqual(len(responses.calls), 3)
+        self.assertEqual(responses.calls[0].request.body, 'access_token=token1')
+        for call in responses.calls[1:]:
+            self.assertEqual(call.request.headers.get('Authorization'), 'Bearer token1')
+            self.assertEqual(call.request.headers.get('x-goog-user-project'), 'anvil-datastorage')
+        self.assertIsNone(responses.calls[1].request.headers.get('Range'))
+        self.assertEqual(responses.calls[2].request.headers.get('Range'), 'bytes=100-200')
+        mock_get_redis.assert_called_once_with(GS_STORAGE_ACCESS_CACHE_KEY)
+        mock_set_redis.assert_called_once_with(
+            GS_STORAGE_ACCESS_CACHE_KEY, {'token': 'token1', 'expires_at': mock.ANY, 'refresh_at': mock.ANY},
+            expire=3299)
+        mock_subprocess.assert_called_once_with(
+            'gcloud auth print-access-token', stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)  # nosec
+
+        # test access token and index path are cached in-process
         mock_get_redis.reset_mock()
-        mock_get_redis.return_value = 'token3'
         mock_set_redis.reset_mock()
         mock_subprocess.reset_mock()
+        response = self.client.get(url, HTTP_RANGE='bytes=100-200')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(len(responses.calls), 4)
+        self.assertEqual(responses.calls[3].request.url, 'https://storage.googleapis.com/fc-secure-project_A/sample_1.bai')
+        self.assertEqual(responses.calls[3].request.headers.get('Authorization'), 'Bearer token1')
+        mock_get_redis.assert_not_called()
+        mock_set_redis.assert_not_called()
+        mock_subprocess.assert_not_called()
+
+        # test tokens close to expiry are refreshed from redis
+        ACCESS_TOKEN['refresh_at'] = time.time() - 1
+        mock_get_redis.return_value = {'token': 'token3', 'expires_at': time.time() + 3300, 'refresh_at': time.time() + 3000}
         responses.add(responses.GET, 'https://storage.googleapis.com/project_A/sample_1.bed.gz',
                       stream=True,
                       body=b'\n'.join(STREAMING_READS_CONTENT), status=200)
         url = reverse(fetch_igv_track, args=[PROJECT_GUID, 'gs://project_A/sample_1.bed.gz'])
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
-        self.assertIsNone(responses.calls[2].request.headers.get('Range'))
-        self.assertEqual(responses.calls[2].request.headers.get('Authorization'), 'Bearer token3')
-        self.assertIsNone(responses.calls[2].request.headers.get('x-goog-user-project'))
-        mock_get_redis.assert_called_with(GS_STORAGE_ACCESS_CACHE_KEY)
+        self.assertEqual(len(responses.calls), 5)
+        self.assertIsNone(responses.calls[4].request.headers.get('Range'))
+        self.assertEqual(responses.calls[4].request.headers.get('Authorization'), 'Bearer token3')
+        self.assertIsNone(responses.calls[4].request.headers.get('x-goog-user-project'))
+        self.assertIsNone(response.get('Content-Range'))
+        mock_get_redis.assert_called_once_with(GS_STORAGE_ACCESS_CACHE_KEY)
         mock_set_redis.assert_not_called()
         mock_subprocess.assert_not_called()
 
+    @mock.patch('seqr.views.apis.igv_api.os.path.getsize')
     @mock.patch('seqr.utils.file_utils.os.path.isfile')
     @mock.patch('seqr.utils.file_utils.open')
-    def test_proxy_local_to_igv(self, mock_open, mock_isfile, mock_subprocess):
-        mock_isfile.side_effect = [False, True, False, True]
-        mock_subprocess.return_value.stdout = STREAMING_READS_CONTENT
-        mock_open.return_value.__enter__.return_value.__iter__.return_value = STREAMING_READS_CONTENT
+    def test_proxy_local_to_igv(self, mock_open, mock_isfile, mock_getsize, mock_subprocess):
+        file_content = b''.join(STREAMING_READS_CONTENT)
+        mock_isfile.return_value = False
+        mock_getsize.return_value = len(file_content)
+        mock_open.side_effect = lambda *args, **kwargs: BytesIO(file_content)
 
         url = reverse(fetch_igv_track, args=[PROJECT_GUID, '/project_A/sample_1.bam.bai'])
         self.check_collaborator_login(url)
-        response = self.client.get(url, HTTP_RANGE='bytes=100-250')
+        response = self.client.get(url, HTTP_RANGE='bytes=2-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), file_content[2:10])
+        self.assertEqual(response.get('Content-Length'), '8')
+        self.assertEqual(response.get('Content-Range'), 'bytes 2-9/18')
+        self.assertEqual(response.get('Accept-Ranges'), 'bytes')
+        mock_open.assert_called_with('/project_A/sample_1.bai', 'rb', buffering=0)
+        mock_getsize.assert_called_with('/project_A/sample_1.bai')
+        mock_subprocess.assert_not_called()
+
+        # test open ended and suffix byte ranges
+        response = self.client.get(url, HTTP_RANGE='bytes=10-')
         self.assertEqual(response.status_code, 206)
-        self.assertListEqual([val for val in response.streaming_content], STREAMING_READS_CONTENT)
-        mock_subprocess.assert_called_with(
-            'dd skip=100 count=151 bs=1 if=/project_A/sample_1.bai status="none"',
-            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)  # nosec
-        mock_open.assert_not_called()
+        self.assertEqual(b''.join(response.streaming_content), file_content[10:])
+        self.assertEqual(response.get('Content-Range'), 'bytes 10-17/18')
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), file_content[-4:])
+        self.assertEqual(response.get('Content-Range'), 'bytes 14-17/18')
+
+        # test multiple byte ranges
+        response = self.client.get(url, HTTP_RANGE='bytes=0-1, 12-100')
+        self.assertEqual(response.status_code, 206)
+        content_type, boundary = response.get('Content-Type').split('; boundary=')
+        self.assertEqual(content_type, 'multipart/byteranges')
+        expected_content = b''.join([
+            f'--{boundary}\r\nContent-Type: application/octet-stream\r\nContent-Range: bytes 0-1/18\r\n\r\n'.encode(),
+            file_content[:2],
+            f'\r\n--{boundary}\r\nContent-Type: application/octet-stream\r\nContent-Range: bytes 12-17/18\r\n\r\n'.encode(),
+            file_content[12:],
+            f'\r\n--{boundary}--\r\n'.encode(),
+        ])
+        self.assertEqual(b''.join(response.streaming_content), expected_content)
+        self.assertEqual(response.get('Content-Length'), str(len(expected_content)))
+
+        # test overlapping and adjacent byte ranges are merged
+        response = self.client.get(url, HTTP_RANGE='bytes=4-6, 0-2, 3-3, 5-8')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), file_content[:9])
+        self.assertEqual(response.get('Content-Range'), 'bytes 0-8/18')
+
+        # test requests for too many byte ranges return the full file
+        with mock.patch('seqr.views.apis.igv_api.MAX_BYTE_RANGES', 2):
+            response = self.client.get(url, HTTP_RANGE='bytes=0-0, 2-2, 4-4')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), file_content)
+        self.assertIsNone(response.get('Content-Range'))
+
+        # test unsatisfiable byte range
+        response = self.client.get(url, HTTP_RANGE='bytes=100-200')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response.get('Content-Range'), 'bytes */18')
 
         # test no byte range
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
-        self.assertListEqual([val for val in response.streaming_content], STREAMING_READS_CONTENT)
-        mock_open.assert_called_with('/project_A/sample_1.bai', 'rb')
+        self.assertEqual(b''.join(response.streaming_content), file_content)
+        self.assertEqual(response.get('Content-Length'), '18')
+        mock_subprocess.assert_not_called()
 
     def test_receive_alignment_table_handler(self, mock_subprocess):
         mock_subprocess.return_value.wait.return_value = 0
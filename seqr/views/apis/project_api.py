@@ -25,7 +25,8 @@ from seqr.views.utils.orm_to_json_utils import _get_json_for_project, get_json_f
 from seqr.views.utils.permissions_utils import get_project_and_check_permissions, check_project_permissions, \
     check_user_created_object_permissions, pm_required, user_is_pm, login_and_policies_required, \
     has_workspace_perm, has_case_review_permissions, is_internal_anvil_project, get_project_and_check_pm_permissions, \
-    check_project_pm_permission, user_is_data_manager, external_anvil_project_can_edit
+    check_project_pm_permission, user_is_data_manager, external_anvil_project_can_edit, \
+    reset_cached_project_guids_user_can_view
 from seqr.views.utils.project_context_utils import families_discovery_tags, \
     add_project_tag_type_counts, get_project_analysis_groups, get_project_locus_lists
 from seqr.views.utils.terra_api_utils import is_anvil_authenticated, anvil_enabled
@@ -60,6 +61,7 @@ def create_project_handler(request):
         project_args['is_mme_enabled'] = False
 
     project = create_model_from_json(Project, project_args, user=request.user)
+    reset_cached_project_guids_user_can_view([request.user])
     IndividualMetadataDict.reload(request.user)
 
     return create_json_response({
@@ -380,7 +382,9 @@ def _delete_project(project_guid, user):
 
     Family.bulk_delete(user, project=project)
 
+    collaborators = list(project.can_view_group.user_set.all())
     project.delete_model(user, user_can_delete=True)
+    reset_cached_project_guids_user_can_view(collaborators + [user])
 
     AffectedDict.reload(user)
     SexDict.reload(user)
@@ -663,12 +663,13 @@ RNA_TABLE_HEADER = [
 class ReportAPITest(AirtableTest):
 
     def _get_zip_files(self, mock_zip, filenames):
-        mock_write_zip = mock_zip.return_value.__enter__.return_value.writestr
+        mock_open_zip = mock_zip.return_value.__enter__.return_value.open
+        self.assertListEqual(mock_open_zip.call_args_list, [mock.call(file, 'w') for file in filenames])
+        mock_write_zip = mock_open_zip.return_value.__enter__.return_value.write
         self.assertEqual(mock_write_zip.call_count, len(filenames))
-        mock_write_zip.assert_has_calls([mock.call(file, mock.ANY) for file in filenames])
 
         return (
-            [row.split('\t') for row in mock_write_zip.call_args_list[i][0][1].split('\n') if row]
+            [row.split('\t') for row in mock_write_zip.call_args_list[i][0][0].decode().split('\n') if row]
             for i in range(len(filenames))
         )
 
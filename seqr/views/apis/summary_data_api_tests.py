@@ -309,7 +309,7 @@ AIRTABLE_COLLABORATOR_RECORDS = {
 }
 
 
-@mock.patch('seqr.views.utils.permissions_utils.safe_redis_get_json', lambda *args: None)
+@mock.patch('seqr.views.utils.permissions_utils.safe_tiered_cache_get_json', lambda *args: None)
 class SummaryDataAPITest(AirtableTest):
 
     @mock.patch('matchmaker.matchmaker_utils.datetime')
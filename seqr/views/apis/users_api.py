@@ -15,7 +15,8 @@ from seqr.views.utils.json_utils import create_json_response
 from seqr.views.utils.orm_to_json_utils import get_json_for_user, get_json_for_project_collaborator_list, \
     get_project_collaborators_by_username, get_json_for_project_collaborator_groups, PROJECT_ACCESS_GROUP_NAMES
 from seqr.views.utils.permissions_utils import get_project_guids_user_can_view, get_project_and_check_permissions, \
-    login_and_policies_required, login_active_required, active_user_has_policies_and_passes_test
+    login_and_policies_required, login_active_required, active_user_has_policies_and_passes_test, \
+    reset_cached_project_guids_user_can_view
 from seqr.views.utils.terra_api_utils import oauth_enabled, anvil_enabled
 from settings import BASE_URL, SEQR_TOS_VERSION, SEQR_PRIVACY_VERSION
 
@@ -175,6 +176,7 @@ def _update_existing_user(user, project, request_json):
         project.can_edit_group.user_set.add(user)
     else:
         project.can_edit_group.user_set.remove(user)
+    reset_cached_project_guids_user_can_view([user])
 
     if any(k in UPDATE_USER_FIELDS for k in request_json.keys()):
         _update_user_from_json(user, request_json)
@@ -199,6 +201,7 @@ def delete_project_collaborator(request, project_guid, username):
 
     project.can_view_group.user_set.remove(user)
     project.can_edit_group.user_set.remove(user)
+    reset_cached_project_guids_user_can_view([user])
 
     return create_json_response({
         'projectsByGuid': {project_guid: {'collaborators': get_json_for_project_collaborator_list(request.user, project)}}
@@ -216,6 +219,7 @@ def update_project_collaborator_group(request, project_guid, name):
         assign_perm(user_or_group=group, perm=CAN_EDIT, obj=project)
     else:
         remove_perm(user_or_group=group, perm=CAN_EDIT, obj=project)
+    reset_cached_project_guids_user_can_view(group.user_set.all())
 
     return create_json_response({
         'projectsByGuid': {project.guid: {'collaboratorGroups': get_json_for_project_collaborator_groups(project)}}
@@ -229,6 +233,7 @@ def delete_project_collaborator_group(request, project_guid, name):
 
     remove_perm(user_or_group=group, perm=CAN_VIEW, obj=project)
     remove_perm(user_or_group=group, perm=CAN_EDIT, obj=project)
+    reset_cached_project_guids_user_can_view(group.user_set.all())
 
     return create_json_response({
         'projectsByGuid': {project_guid: {'collaboratorGroups': get_json_for_project_collaborator_groups(project)}}
@@ -1,7 +1,6 @@
 import json
 import jmespath
 from collections import defaultdict
-from copy import deepcopy
 from datetime import timedelta
 from django.utils import timezone
 from django.contrib.postgres.aggregates import ArrayAgg
@@ -12,18 +11,25 @@ from django.db.models.functions import JSONObject
 from django.shortcuts import redirect
 from math import ceil
 import re
+import tempfile
+import time
 
 from clickhouse_search.constants import XPOS_SORT_KEY, PATHOGENICTY_SORT_KEY, PATHOGENICTY_HGMD_SORT_KEY
-from clickhouse_search.search import get_clickhouse_variants, format_clickhouse_results, format_clickhouse_export_results, \
-    get_sorted_search_results, clickhouse_variant_lookup, InvalidSearchException
+from clickhouse_search.profiling import SearchProfile
+from clickhouse_search.search import get_clickhouse_variants, get_clickhouse_variants_page, format_clickhouse_results, \
+    format_clickhouse_export_results, get_search_results_sort_index, get_search_results_sort_order, \
+    clickhouse_variant_lookup, clickhouse_variants_lookup, has_search_result_keys, save_search_result_keys, InvalidSearchException, TooManyResultsException, \
+    TOO_MANY_RESULTS_ERROR, SERVER_SORTS
 from reference_data.models import HumanPhenotypeOntology, GENOME_VERSION_GRCh38, GENOME_VERSION_LOOKUP
 from seqr.models import Project, Family, SavedVariant, VariantSearch, VariantSearchResults, ProjectCategory, Dataset
 from seqr.views.utils.export_utils import export_table
 from seqr.utils.gene_utils import get_genes_for_variant_display
 from seqr.utils.logging_utils import SeqrLogger
-from seqr.utils.redis_utils import safe_redis_get_json, safe_redis_get_wildcard_json, safe_redis_set_json
+from seqr.utils.redis_utils import safe_redis_get_json, safe_redis_set_json, safe_redis_get_json_list, \
+    safe_redis_set_json_list, safe_redis_iter_json_list, safe_redis_get_json_list_items, safe_redis_namespace_key, \
+    safe_redis_namespace_keys, safe_redis_get_json_multi, safe_redis_set_json_multi
 from seqr.utils.xpos_utils import parse_variant_id
-from seqr.views.utils.json_utils import create_json_response, _to_snake_case
+from seqr.views.utils.json_utils import create_json_response, _to_snake_case, DjangoJSONEncoderWithSets
 from seqr.views.utils.json_to_orm_utils import update_model_from_json, get_or_create_model_from_json, \
     create_model_from_json
 from seqr.views.utils.orm_to_json_utils import get_json_for_saved_variants_with_tags, get_json_for_saved_search,\
@@ -31,11 +37,16 @@ from seqr.views.utils.orm_to_json_utils import get_json_for_saved_variants_with_
 from seqr.views.utils.permissions_utils import check_project_permissions, get_project_guids_user_can_view, \
     login_and_policies_required, check_user_created_object_permissions, check_projects_view_permission, user_is_analyst
 from seqr.views.utils.project_context_utils import get_projects_child_entities
-from seqr.views.utils.variant_utils import get_variants_response, variant_dataset_type
+from seqr.views.utils.variant_utils import get_variants_response, variant_dataset_type, get_search_results_cache_tags, \
+    get_search_results_cache_id, SEARCH_RESULTS_CACHE_NAMESPACE, VARIANT_LOOKUP_CACHE_NAMESPACE
 from seqr.views.utils.vlm_utils import vlm_lookup
 
 logger = SeqrLogger(__name__)
 
+SEARCH_RESULTS_CHUNK_SIZE = 1000
+SEARCH_RESULTS_CACHE_EXPIRE = timedelta(weeks=2)
+EXCLUDE_PREVIOUS_SEARCH_HASH_FIELD = 'exclude_previous_search_hash'
+
 
 @login_and_policies_required
 def query_variants_handler(request, search_hash):
@@ -53,15 +64,14 @@ def query_variants_handler(request, search_hash):
 
     _check_results_permission(results_model, request.user)
 
-    all_variants = _get_variants_with_cache(
-        _get_search_cache_key, _query_variants, results_model, request.user, sort=sort,
+    variants, total_results = _get_search_results_page(
+        results_model, request.user, sort=sort, start=(page-1)*per_page, end=page*per_page - 1,
     )
-    variants = all_variants[(page-1)*per_page:page*per_page]
 
     response = _process_variants(variants or [], results_model.families.all(), request,
                                  genome_version=results_model.variant_search.search.get('no_access_project_genome_version'))
     response['search'] = _get_search_context(results_model)
-    response['search']['totalResults'] = len(all_variants)
+    response['search']['totalResults'] = total_results
 
     return create_json_response(response)
 
@@ -71,22 +81,190 @@ def _get_variants_with_cache(get_cache_key, get_variants, *args, **kwargs):
     variants = safe_redis_get_json(cache_key)
     if variants is None:
         variants = get_variants(*args, **kwargs)
-        safe_redis_set_json(cache_key, variants, expire=timedelta(weeks=2))
+        safe_redis_set_json(cache_key, variants, expire=SEARCH_RESULTS_CACHE_EXPIRE)
     return variants
 
 
-def _get_search_cache_key(results_model, user, sort=XPOS_SORT_KEY):
-    return 'search_results__{}__{}'.format(results_model.guid, sort)
+def _get_search_cache_key(cache_id, sort=XPOS_SORT_KEY):
+    return safe_redis_namespace_key(SEARCH_RESULTS_CACHE_NAMESPACE, '{}__{}'.format(cache_id, sort))
+
+
+def _get_search_sort_index_cache_key(cache_id):
+    return safe_redis_namespace_key(SEARCH_RESULTS_CACHE_NAMESPACE, '{}__sort_index'.format(cache_id))
+
+
+def _get_search_too_many_results_cache_key(cache_id):
+    return safe_redis_namespace_key(SEARCH_RESULTS_CACHE_NAMESPACE, '{}__too_many_results'.format(cache_id))
+
+
+def _get_search_total_cache_key(cache_id):
+    return safe_redis_namespace_key(SEARCH_RESULTS_CACHE_NAMESPACE, '{}__total'.format(cache_id))
+
+
+def _get_results_model_cache_id(results_model):
+    # Results are cached by search content, so identical searches share cached results across results models
+    return get_search_results_cache_id(results_model.families.all(), results_model.variant_search.search)
+
+
+def _get_search_results_page(results_model, user, sort=XPOS_SORT_KEY, start=0, end=-1):
+    cache_id = _get_results_model_cache_id(results_model)
+    # Searches which run a single query are sorted and paged in clickhouse. All other searches cache their full results
+    # in xpos order, and all other sorts cache an ordering of the xpos sorted results
+    results_cache_key = _get_search_cache_key(cache_id)
+    if sort == XPOS_SORT_KEY:
+        variants, total = safe_redis_get_json_list(results_cache_key, start=start, end=end)
+        if total is not None:
+            return variants, total
 
+    if sort in SERVER_SORTS:
+        variants, total = _get_server_sorted_results_page(results_model, user, cache_id, sort, start, end)
+        if total is not None:
+            return variants, total
+        if sort == XPOS_SORT_KEY:
+            if variants is None:
+                variants, _ = _query_and_cache_variants(results_model, user, cache_id)
+            return variants[start:(end + 1) or None], len(variants)
 
-def _query_variants(results_model, user, sort=XPOS_SORT_KEY):
-    families = results_model.families.all()
-    wildcard_cache_key = _get_search_cache_key(results_model, user, sort='*')
-    unsorted_variants = safe_redis_get_wildcard_json(wildcard_cache_key)
-    if unsorted_variants:
-        return get_sorted_search_results(unsorted_variants, sort, families)
+    sort_order, total = safe_redis_get_json_list(_get_search_cache_key(cache_id, sort=sort), start=start, end=end)
+    if total is None:
+        sort_order = _cache_search_results_sort_order(results_model, user, sort, cache_id)
+        total = len(sort_order)
+        sort_order = sort_order[start:(end + 1) or None]
 
-    return get_clickhouse_variants(families, user, sort=sort, **results_model.variant_search.search)
+    variants = safe_redis_get_json_list_items(results_cache_key, [i for i, _ in sort_order])
+    if variants is None:
+        all_variants = list(_iter_search_results(results_model, user, cache_id=cache_id))
+        variants = [all_variants[i] for i, _ in sort_order]
+    return [variant[::-1] if reverse_pair else variant for variant, (_, reverse_pair) in zip(variants, sort_order)], total
+
+
+def _get_server_sorted_results_page(results_model, user, cache_id, sort, start, end):
+    # Returns the requested page and the total, or no total if the search can not be sorted in clickhouse. In that case
+    # the full xpos sorted results are returned if they were loaded, and an empty total is cached so they are not
+    # loaded again. The total is otherwise only counted for the first page requested
+    total_cache_key = _get_search_total_cache_key(cache_id)
+    cached_total = safe_redis_get_json(total_cache_key)
+    if cached_total is None:
+        _, cached_results_total = safe_redis_get_json_list(_get_search_cache_key(cache_id), end=0)
+        if cached_results_total is not None:
+            return None, None
+    elif cached_total.get('total') is None:
+        return None, None
+
+    total = (cached_total or {}).get('total')
+    page_cache_key = _get_search_cache_key(cache_id, sort='{}__{}_{}'.format(sort, start, end))
+    if total is not None:
+        variants = safe_redis_get_json(page_cache_key)
+        if variants is not None:
+            return variants, total
+
+    cache_tags = _get_results_model_cache_tags(results_model)
+    try:
+        variants, total = _query_and_cache_variants(results_model, user, cache_id, results_page=(sort, start, end, total))
+    except TooManyResultsException:
+        safe_redis_set_json(total_cache_key, {}, expire=SEARCH_RESULTS_CACHE_EXPIRE, tags=cache_tags)
+        raise
+    if cached_total is None:
+        safe_redis_set_json(
+            total_cache_key, {} if total is None else {'total': total}, expire=SEARCH_RESULTS_CACHE_EXPIRE, tags=cache_tags,
+        )
+    if total is not None:
+        safe_redis_set_json(page_cache_key, variants, expire=SEARCH_RESULTS_CACHE_EXPIRE, tags=cache_tags)
+    return variants, total
+
+
+def _cache_search_results_sort_order(results_model, user, sort, cache_id):
+    sort_index_cache_key = _get_search_sort_index_cache_key(cache_id)
+    sort_index = safe_redis_get_json(sort_index_cache_key)
+    if sort_index is None:
+        sort_index = get_search_results_sort_index(list(_iter_search_results(results_model, user, cache_id=cache_id)))
+        safe_redis_set_json(
+            sort_index_cache_key, sort_index, expire=SEARCH_RESULTS_CACHE_EXPIRE,
+            tags=_get_results_model_cache_tags(results_model),
+        )
+
+    sort_order = get_search_results_sort_order(sort_index, sort, results_model.families.all())
+    safe_redis_set_json_list(
+        _get_search_cache_key(cache_id, sort=sort), sort_order, expire=SEARCH_RESULTS_CACHE_EXPIRE,
+        tags=_get_results_model_cache_tags(results_model),
+    )
+    return sort_order
+
+
+def _iter_search_results(results_model, user, cache_id=None):
+    cache_id = cache_id or _get_results_model_cache_id(results_model)
+    cache_key = _get_search_cache_key(cache_id)
+    variants, total = safe_redis_get_json_list(cache_key, end=SEARCH_RESULTS_CHUNK_SIZE - 1)
+    if total is None:
+        variants, _ = _query_and_cache_variants(results_model, user, cache_id)
+        yield from variants
+        return
+
+    yield from variants
+    for chunk in safe_redis_iter_json_list(cache_key, total, start=len(variants), chunk_size=SEARCH_RESULTS_CHUNK_SIZE):
+        yield from chunk
+
+
+def _get_results_model_search(results_model, user):
+    search = {**results_model.variant_search.search}
+    previous_search_hash = search.pop(EXCLUDE_PREVIOUS_SEARCH_HASH_FIELD, None)
+    if previous_search_hash:
+        search['exclude_search_id'] = _persist_search_result_keys(previous_search_hash, user)
+    return search
+
+
+def _query_and_cache_variants(results_model, user, cache_id, results_page=None):
+    """
+    Runs the search and caches the full xpos sorted results. If a (sort, start, end, total) results page is given and
+    the search can be sorted and paged in clickhouse, only that page is loaded and it is returned with the total,
+    otherwise all the results are returned with no total
+    """
+    # Searches with too many results are marked, so they are not fully re-run for every subsequent page or sort
+    too_many_results_cache_key = _get_search_too_many_results_cache_key(cache_id)
+    if not results_page and safe_redis_get_json(too_many_results_cache_key) is not None:
+        raise TooManyResultsException(TOO_MANY_RESULTS_ERROR)
+
+    search = _get_results_model_search(results_model, user)
+    search_profile = SearchProfile()
+    total = None
+    try:
+        if results_page:
+            sort, start, end, total = results_page
+            variants, total = get_clickhouse_variants_page(
+                results_model.families.all(), user, start=start, end=end, sort=sort, total=total,
+                search_profile=search_profile, **search,
+            )
+        else:
+            variants = get_clickhouse_variants(
+                results_model.families.all(), user, sort=XPOS_SORT_KEY, search_profile=search_profile, **search,
+            )
+    except TooManyResultsException:
+        safe_redis_set_json(
+            too_many_results_cache_key, {}, expire=SEARCH_RESULTS_CACHE_EXPIRE,
+            tags=_get_results_model_cache_tags(results_model),
+        )
+        raise
+    if total is None:
+        with search_profile.phase('cache_results'):
+            safe_redis_set_json_list(
+                _get_search_cache_key(cache_id), variants, expire=SEARCH_RESULTS_CACHE_EXPIRE,
+                tags=_get_results_model_cache_tags(results_model),
+            )
+    _save_search_profile(results_model, search_profile, user)
+    return variants, total
+
+
+def _save_search_profile(results_model, search_profile, user):
+    profile_json = search_profile.to_json()
+    logger.info(
+        f'Search {results_model.guid} completed in {profile_json["totalWallTimeMs"]}ms', user, detail=profile_json,
+    )
+    # Update directly so recording the profile does not change the model's last modified metadata
+    VariantSearchResults.objects.filter(id=results_model.id).update(search_profile=profile_json)
+
+
+def _get_results_model_cache_tags(results_model):
+    return get_search_results_cache_tags(results_model.families.all(), results_model.variant_search.search)
 
 
 def _all_project_family_search_genome(search_context):
@@ -133,7 +311,9 @@ def _get_or_create_results_model(search_hash, search_context, user):
 
         search_dict = search_context.get('search', {})
         if search_context.get('previousSearchHash') and (search_dict.get('exclude') or {}).get('previousSearch'):
-            search_dict.update(_get_exclude_keys(search_context['previousSearchHash'], user))
+            # Only a reference to the previous search is stored, its keys are excluded in ClickHouse at query time
+            _persist_search_result_keys(search_context['previousSearchHash'], user)
+            search_dict[EXCLUDE_PREVIOUS_SEARCH_HASH_FIELD] = search_context['previousSearchHash']
         if include_no_access_projects:
             search_dict['no_access_project_genome_version'] = all_project_genome_version
         search_model = VariantSearch.objects.filter(search=search_dict).filter(
@@ -152,21 +332,25 @@ def _get_or_create_results_model(search_hash, search_context, user):
     return results_model
 
 
-def _get_exclude_keys(search_hash, user):
+def _persist_search_result_keys(search_hash, user):
     previous_results_model = VariantSearchResults.objects.get(search_hash=search_hash)
-    results = _get_variants_with_cache(_get_search_cache_key, _query_variants, previous_results_model, user)
-    exclude_keys = defaultdict(list)
-    exclude_key_pairs = defaultdict(list)
-    for variant in results:
+    cache_id = _get_results_model_cache_id(previous_results_model)
+    if not has_search_result_keys(cache_id):
+        save_search_result_keys(
+            cache_id, _iter_search_result_keys(_iter_search_results(previous_results_model, user, cache_id=cache_id)),
+        )
+    return cache_id
+
+
+def _iter_search_result_keys(variants):
+    for variant in variants:
         if isinstance(variant, list):
             dt1= variant_dataset_type(variant[0])
             dt2 = variant_dataset_type(variant[1])
             dataset_type = dt1 if dt1 == dt2 else ','.join(sorted([dt1, dt2]))
-            exclude_key_pairs[dataset_type].append(sorted([variant[0]['key'], variant[1]['key']]))
+            yield (dataset_type, *sorted([variant[0]['key'], variant[1]['key']]))
         else:
-            dataset_type = variant_dataset_type(variant)
-            exclude_keys[dataset_type].append(variant['key'])
-    return {'exclude_keys': dict(exclude_keys), 'exclude_key_pairs': dict(exclude_key_pairs)}
+            yield variant_dataset_type(variant), variant['key'], None
 
 
 @login_and_policies_required
@@ -188,7 +372,12 @@ def _process_variants(variants, families, request, add_all_context=False, add_lo
     if not variants:
         return {'searchedVariantIds': [], 'variantsById': {}}
 
+    format_start = time.perf_counter()
     variants = format_clickhouse_results(variants)
+    logger.info(
+        f'Formatted {len(variants)} variants', request.user,
+        detail={'phase': 'format_results', 'wallTimeMs': round((time.perf_counter() - format_start) * 1000, 1)},
+    )
     flat_variants = _flatten_variants(variants)
     variants_by_id = {v['variantId']: v for v in flat_variants}
     saved_variants = _get_saved_variant_models(flat_variants)
@@ -269,7 +458,8 @@ VARIANT_SAMPLE_DATA = [
     {'header': 'ab'},
 ]
 
-MAX_EXPORT_VARIANTS = 1000
+EXPORT_CHUNK_SIZE = 1000
+MAX_EXPORT_VARIANTS = 50000
 MAX_FAMILIES_PER_ROW = 1000
 
 
@@ -278,10 +468,10 @@ def get_variant_gene_breakdown(request, search_hash):
     results_model = VariantSearchResults.objects.get(search_hash=search_hash)
     projects = _check_results_permission(results_model, request.user)
 
-    results = _get_variants_with_cache(_get_search_cache_key, _query_variants, results_model, request.user)
-    flat_variants = [
-        v for variants in results for v in (variants if isinstance(variants, list) else [variants])
-    ]
+    flat_variants = (
+        v for variants in _iter_search_results(results_model, request.user)
+        for v in (variants if isinstance(variants, list) else [variants])
+    )
     gene_counts = defaultdict(lambda: {'total': 0, 'families': defaultdict(int)})
     for var in flat_variants:
         gene_ids = var['transcripts'].keys() if 'transcripts' in var else {t['geneId'] for t in var['sortedTranscriptConsequences']}
@@ -303,15 +493,89 @@ def export_variants_handler(request, search_hash):
     _check_results_permission(
         results_model, request.user, project_perm_check=lambda project: (not project.is_demo) or project.all_user_demo)
 
-    families = results_model.families.all()
-    family_ids_by_guid = {family.guid: family.family_id for family in families}
+    family_ids_by_guid = dict(results_model.families.values_list('guid', 'family_id'))
+
+    # The header depends on the number of families and samples in every row, so all the results are checked before
+    # streaming any rows. The cached results are read only once, into a temporary file, so the header and rows are
+    # built from the same snapshot and any error reading the results is raised before the response starts streaming
+    results_file = tempfile.TemporaryFile(mode='w+')
+    try:
+        total_results, max_families_per_variant, max_samples_per_variant = _write_export_results_snapshot(
+            results_file, _iter_search_results(results_model, request.user),
+        )
+        if total_results > MAX_EXPORT_VARIANTS:
+            raise InvalidSearchException(
+                f'Unable to export more than {MAX_EXPORT_VARIANTS} variants ({total_results} requested)')
+    except Exception:
+        results_file.close()
+        raise
+    results_file.seek(0)
+
+    header = [config['header'] for config in VARIANT_EXPORT_DATA]
+    for i in range(max_families_per_variant):
+        header += ['{}_{}'.format(config['header'], i+1) for config in VARIANT_FAMILY_EXPORT_DATA]
+    for i in range(max_samples_per_variant):
+        header += ['{}_{}'.format(config['header'], i+1) for config in VARIANT_SAMPLE_DATA]
+
+    rows = _iter_export_rows(results_file, family_ids_by_guid, max_families_per_variant, max_samples_per_variant)
+    file_format = request.GET.get('file_format', 'tsv')
+
+    return export_table('search_results_{}'.format(search_hash), header, rows, file_format, titlecase_header=False)
+
+
+def _iter_export_variants(results):
+    for result in results:
+        for variant in (result if isinstance(result, list) else [result]):
+            yield from _split_export_variant(variant)
+
+
+def _split_export_variant(variant):
+    if len(variant.get('familyGuids', [])) <= MAX_FAMILIES_PER_ROW:
+        return [variant]
+
+    num_split = ceil(len(variant.get('familyGuids', [])) / MAX_FAMILIES_PER_ROW)
+    gens_per_row = ceil(len(variant['genotypes']) / num_split)
+    gen_keys = sorted(variant['genotypes'].keys())
+    split_variants = []
+    for i in range(num_split):
+        split_gen = set(gen_keys[i*gens_per_row:(i+1)*gens_per_row])
+        split_variants.append({
+            **variant,
+            'familyGuids': variant['familyGuids'][i*MAX_FAMILIES_PER_ROW:(i+1)*MAX_FAMILIES_PER_ROW],
+            'genotypes': {k: v for k, v in variant['genotypes'].items() if k in split_gen},
+        })
+    return split_variants
+
+
+def _write_export_results_snapshot(results_file, results):
+    total_results = 0
+    max_families_per_variant = 0
+    max_samples_per_variant = 0
+    for result in results:
+        total_results += 1
+        results_file.write(json.dumps(result, cls=DjangoJSONEncoderWithSets) + '\n')
+        for variant in _iter_export_variants([result]):
+            max_families_per_variant = max(max_families_per_variant, len(variant.get('familyGuids', [1])))
+            max_samples_per_variant = max(max_samples_per_variant, len(variant.get('genotypes', {})))
+    return total_results, max_families_per_variant, max_samples_per_variant
+
+
+def _iter_export_rows(results_file, family_ids_by_guid, max_families_per_variant, max_samples_per_variant):
+    try:
+        chunk = []
+        for line in results_file:
+            chunk.append(json.loads(line))
+            if len(chunk) == EXPORT_CHUNK_SIZE:
+                yield from _get_export_rows(chunk, family_ids_by_guid, max_families_per_variant, max_samples_per_variant)
+                chunk = []
+        if chunk:
+            yield from _get_export_rows(chunk, family_ids_by_guid, max_families_per_variant, max_samples_per_variant)
+    finally:
+        results_file.close()
 
-    variants = _get_variants_with_cache(_get_search_cache_key, _query_variants, results_model, request.user)
-    total_variants = len(variants)
-    if total_variants > MAX_EXPORT_VARIANTS:
-        raise InvalidSearchException(f'Unable to export more than {MAX_EXPORT_VARIANTS} variants ({total_variants} requested)')
 
-    variants = format_clickhouse_export_results(variants)
+def _get_export_rows(results, family_ids_by_guid, max_families_per_variant, max_samples_per_variant):
+    variants = format_clickhouse_export_results(results)
 
     saved_variants = _get_saved_variant_models(variants)
     json_saved_variants = get_json_for_saved_variants_with_tags(saved_variants)
@@ -322,30 +586,8 @@ def export_variants_handler(request, search_hash):
             family_guid: saved_variant['variantGuid'] for family_guid in saved_variant['familyGuids']
         }
 
-    if any(len(variant.get('familyGuids', [])) > MAX_FAMILIES_PER_ROW for variant in variants):
-        split_variants = []
-        for variant in variants:
-            if len(variant.get('familyGuids', [])) <= MAX_FAMILIES_PER_ROW:
-                split_variants.append(variant)
-                continue
-
-            num_split = ceil(len(variant.get('familyGuids', [])) / MAX_FAMILIES_PER_ROW)
-            gens_per_row = ceil(len(variant['genotypes']) / num_split)
-            gen_keys = sorted(variant['genotypes'].keys())
-            for i in range(num_split):
-                split_var = deepcopy(variant)
-                split_var['familyGuids'] = variant['familyGuids'][i*MAX_FAMILIES_PER_ROW:(i+1)*MAX_FAMILIES_PER_ROW]
-                split_gen = set(gen_keys[i*gens_per_row:(i+1)*gens_per_row])
-                split_var['genotypes'] = {k: v for k, v in variant['genotypes'].items() if k in split_gen}
-                split_variants.append(split_var)
-
-        variants = split_variants
-
-    max_families_per_variant = max([len(variant.get('familyGuids', [1])) for variant in variants] or [0])
-    max_samples_per_variant = max([len(variant.get('genotypes', {})) for variant in variants] or [0])
-
     rows = []
-    for variant in variants:
+    for variant in _iter_export_variants(variants):
         row = [_get_field_value(variant, config) for config in VARIANT_EXPORT_DATA]
 
         family_saved_variants = saved_variants_by_variant_family.get(variant['variantId'], {})
@@ -369,15 +611,7 @@ def export_variants_handler(request, search_hash):
         row += ['' for i in range(len(VARIANT_SAMPLE_DATA) * (max_samples_per_variant - len(genotypes)))]
         rows.append(row)
 
-    header = [config['header'] for config in VARIANT_EXPORT_DATA]
-    for i in range(max_families_per_variant):
-        header += ['{}_{}'.format(config['header'], i+1) for config in VARIANT_FAMILY_EXPORT_DATA]
-    for i in range(max_samples_per_variant):
-        header += ['{}_{}'.format(config['header'], i+1) for config in VARIANT_SAMPLE_DATA]
-
-    file_format = request.GET.get('file_format', 'tsv')
-
-    return export_table('search_results_{}'.format(search_hash), header, rows, file_format, titlecase_header=False)
+    return rows
 
 
 def _get_field_value(value, config):
@@ -584,6 +818,59 @@ def variant_lookup_handler(request):
         request.user, variant_id, sample_type=request.GET.get('sampleType'), genome_version=genome_version, **bool_kwargs,
     )
 
+    return create_json_response(_get_lookup_response(request, variants, genome_version))
+
+
+MAX_LOOKUP_VARIANTS = 1000
+
+
+@login_and_policies_required
+def variant_lookup_batch_handler(request):
+    request_json = json.loads(request.body or '{}')
+    variant_ids = list(dict.fromkeys(request_json.get('variantIds') or []))
+    if not variant_ids:
+        error = 'No variants specified'
+        return create_json_response({'error': error}, status=400, reason=error)
+    if len(variant_ids) > MAX_LOOKUP_VARIANTS:
+        error = f'Unable to look up more than {MAX_LOOKUP_VARIANTS} variants ({len(variant_ids)} requested)'
+        return create_json_response({'error': error}, status=400, reason=error)
+
+    genome_version = request_json.get('genomeVersion') or GENOME_VERSION_GRCh38
+    lookup_kwargs = {
+        'sample_type': request_json.get('sampleType'),
+        'genome_version': genome_version,
+        **{_to_snake_case(field): bool(request_json.get(field)) for field in ['affectedOnly', 'homOnly']},
+    }
+
+    cache_keys = dict(zip(variant_ids, safe_redis_namespace_keys(
+        VARIANT_LOOKUP_CACHE_NAMESPACE, [_get_lookup_cache_key_suffix(variant_id, **lookup_kwargs) for variant_id in variant_ids],
+    )))
+    cached_variants = safe_redis_get_json_multi(cache_keys.values())
+    variants_by_id = {
+        variant_id: cached_variants[cache_key] for variant_id, cache_key in cache_keys.items() if cache_key in cached_variants
+    }
+
+    lookup_errors = {}
+    uncached_variant_ids = [variant_id for variant_id in variant_ids if variant_id not in variants_by_id]
+    if uncached_variant_ids:
+        looked_up_variants, lookup_errors = clickhouse_variants_lookup(request.user, uncached_variant_ids, **lookup_kwargs)
+        safe_redis_set_json_multi(
+            {cache_keys[variant_id]: variants for variant_id, variants in looked_up_variants.items()},
+            expire=SEARCH_RESULTS_CACHE_EXPIRE,
+        )
+        variants_by_id.update(looked_up_variants)
+
+    # Padded interval matches for neighbouring SVs may be returned for more than one requested variant
+    variants = list({
+        variant['variantId']: variant for variant_id in variant_ids for variant in variants_by_id.get(variant_id, [])
+    }.values())
+    response = _get_lookup_response(request, variants, genome_version) if variants else {'variantsById': {}}
+    response['lookupErrors'] = lookup_errors
+
+    return create_json_response(response)
+
+
+def _get_lookup_response(request, variants, genome_version):
     family_guids = set()
     for variant in variants:
         family_guids.update(variant['familyGenotypes'].keys())
@@ -611,11 +898,15 @@ def variant_lookup_handler(request):
     for variant in variants:
         _update_lookup_variant(variant, response, individual_guid_map, request.user)
 
-    return create_json_response(response)
+    return response
+
+
+def _get_lookup_cache_key(user, variant_id, **kwargs):
+    return safe_redis_namespace_key(VARIANT_LOOKUP_CACHE_NAMESPACE, _get_lookup_cache_key_suffix(variant_id, **kwargs))
 
 
-def _get_lookup_cache_key(user, variant_id, sample_type, genome_version, affected_only, hom_only):
-    cache_fields = ['variant_lookup_results', variant_id, genome_version]
+def _get_lookup_cache_key_suffix(variant_id, sample_type, genome_version, affected_only, hom_only):
+    cache_fields = [variant_id, genome_version]
     if affected_only:
         cache_fields.append('affected')
     if hom_only:
@@ -142,7 +142,7 @@ VLM_MATCH_RESPONSE_2 = {
 }
 
 
-@mock.patch('seqr.views.utils.permissions_utils.safe_redis_get_json', lambda *args: None)
+@mock.patch('seqr.views.utils.permissions_utils.safe_tiered_cache_get_json', lambda *args: None)
 class VariantSearchAPITest(AuthenticationTestCase):
     fixtures = ['users', 'social_auth', '1kg_project', 'reference_data', 'variant_searches', 'clickhouse_saved_variants']
 
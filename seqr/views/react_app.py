@@ -17,7 +17,7 @@ from settings import (
     VLM_CLIENT_ID,
 )
 from seqr.models import WarningMessage
-from seqr.utils.redis_utils import safe_redis_get_json, safe_redis_set_json
+from seqr.utils.redis_utils import safe_tiered_cache_get_json, safe_tiered_cache_set_json
 from seqr.views.apis.feature_updates_api import fetch_feature_updates
 from seqr.views.utils.orm_to_json_utils import get_json_for_user, get_json_for_current_user
 from seqr.views.utils.permissions_utils import login_active_required
@@ -101,7 +101,7 @@ def render_app_html(request, additional_json=None, include_user=True, status=200
 FEATURE_CACHE_KEY = 'feature_updates_latest_date'
 
 def _get_latest_feature_update_date():
-    update_date = safe_redis_get_json(FEATURE_CACHE_KEY)
+    update_date = safe_tiered_cache_get_json(FEATURE_CACHE_KEY)
     if not update_date:
         try:
             entries = fetch_feature_updates()
@@ -109,5 +109,5 @@ def _get_latest_feature_update_date():
             logger.error(f'Unable to fetch feature update date: {e}')
             return None
         update_date = entries[0].published
-        safe_redis_set_json(FEATURE_CACHE_KEY, update_date, expire=60*60*3)
+        safe_tiered_cache_set_json(FEATURE_CACHE_KEY, update_date, expire=60*60*3)
     return update_date
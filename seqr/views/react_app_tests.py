@@ -115,8 +115,7 @@ class AppPageTest(object):
         response = self.client.get(url)
         self._check_page_html(response, 'test_user_no_policies', user_email='test_user_no_policy@test.com', ga_token_id=MOCK_GA_TOKEN, vlm_enabled=True, last_feature_update='2023-11-08T15:11:31+00:00')
 
-        mock_redis.return_value.set.assert_called_with('feature_updates_latest_date', '"2023-11-08T15:11:31+00:00"')
-        mock_redis.return_value.expire.assert_called_with('feature_updates_latest_date', 10800)
+        mock_redis.return_value.set.assert_called_with('feature_updates_latest_date', '"2023-11-08T15:11:31+00:00"', ex=10800)
 
     @responses.activate
     def test_local_react_page(self, mock_redis):
@@ -1,8 +1,10 @@
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from django.contrib.postgres.aggregates import ArrayAgg
 from django.db.models import F, Q
 import gzip
+from itertools import islice
 import json
 import os
 from tqdm import tqdm
@@ -17,9 +19,12 @@ from seqr.views.utils.file_utils import parse_file, get_temp_file_path, persist_
 from seqr.views.utils.json_utils import _to_snake_case, _to_camel_case
 from seqr.views.utils.permissions_utils import is_internal_anvil_project, project_has_anvil
 from reference_data.models import GeneInfo
+from settings import RNA_SEQ_LOADING_MAX_WORKERS
 
 logger = SeqrLogger(__name__)
 
+RNA_CHUNK_NUM_ROWS = 100000
+
 
 def _create_rna_samples(sample_data, sample_guid_ids_to_load, user, **kwargs):
     new_samples = [
@@ -165,26 +170,34 @@ def _load_rna_seq_file(
     header = next(parsed_f)
     file_sample_id, column_map = _validate_rna_header(header, allowed_column_map, optional_columns, sample_id_header_col_config)
 
+    header_indices = {col: i for i, col in enumerate(header)}
+    column_indices = [(mapped_key, header_indices[col]) for mapped_key, col in column_map.items()]
+
     loaded_samples = set()
     unmatched_samples = set()
     samples_to_create = {}
     sample_guid_ids_to_load = {}
     missing_required_fields = defaultdict(set)
     gene_ids = set()
-    for line in tqdm(parsed_f, unit=' rows'):
-        row = dict(zip(header, line))
-        row_dict = {mapped_key: row[col] for mapped_key, col in column_map.items()}
-
-        sample_id = file_sample_id or row_dict.pop(SAMPLE_ID_COL)
-        if not (allow_missing_gene or row_dict.get(GENE_ID_COL)):
-            missing_required_fields[GENE_ID_COL].add(sample_id)
-            continue
-
-        _parse_rna_row(
-            sample_id, row_dict, potential_samples, loaded_samples, gene_ids, sample_guid_ids_to_load,
-            samples_to_create, unmatched_samples, individual_data_by_id, sample_files, file_dir,
-            has_errors=missing_required_fields or (unmatched_samples and not ignore_extra_samples),
-        )
+    rows = iter(tqdm(parsed_f, unit=' rows'))
+    with ThreadPoolExecutor(max_workers=RNA_SEQ_LOADING_MAX_WORKERS) as executor:
+        # Rows are parsed in fixed size chunks so memory usage does not scale with the size of the file
+        for chunk in iter(lambda: list(islice(rows, RNA_CHUNK_NUM_ROWS)), []):
+            sample_rows = defaultdict(list)
+            for line in chunk:
+                row_dict = {mapped_key: line[i] for mapped_key, i in column_indices}
+
+                sample_id = file_sample_id or row_dict.pop(SAMPLE_ID_COL)
+                if not (allow_missing_gene or row_dict.get(GENE_ID_COL)):
+                    missing_required_fields[GENE_ID_COL].add(sample_id)
+                    continue
+
+                _parse_rna_row(
+                    sample_id, row_dict, potential_samples, loaded_samples, gene_ids, sample_guid_ids_to_load,
+                    samples_to_create, unmatched_samples, individual_data_by_id, sample_rows,
+                    has_errors=missing_required_fields or (unmatched_samples and not ignore_extra_samples),
+                )
+            _write_sample_files(executor, sample_rows, sample_files, file_dir)
 
     potential_inactivate_samples_by_key = _get_rna_sample_data_by_key(
         individual_id__in=samples_to_create.keys(), data_type=data_type, is_active=True,
@@ -211,7 +224,7 @@ def _load_rna_seq_file(
 
 
 def _parse_rna_row(sample_id, row_dict, potential_samples, loaded_samples, gene_ids, sample_guid_ids_to_load, samples_to_create,
-                   unmatched_samples, individual_data_by_id, sample_files, file_dir, has_errors):
+                   unmatched_samples, individual_data_by_id, sample_rows, has_errors):
 
     row_gene_ids = ['' if gene_id == 'NA' else gene_id for gene_id in row_dict[GENE_ID_COL].split(';')]
     if any(row_gene_ids):
@@ -241,10 +254,19 @@ def _parse_rna_row(sample_id, row_dict, potential_samples, loaded_samples, gene_
     individual_id = individual['individual_id']
     for gene_id in row_gene_ids:
         row_dict = {**row_dict, GENE_ID_COL: gene_id}
+        sample_rows[individual_id].append(f'{json.dumps(row_dict)}\n')
+
+
+def _write_sample_files(executor, sample_rows, sample_files, file_dir):
+    for individual_id in sample_rows:
         if individual_id not in sample_files:
             file_name = _get_sample_file_path(file_dir, individual_id)
             sample_files[individual_id] = gzip.open(file_name, 'at')
-        sample_files[individual_id].write(f'{json.dumps(row_dict)}\n')
+
+    # Each sample file is only written to by a single worker, and all writes complete before the next chunk is parsed
+    list(executor.map(
+        lambda individual_id: sample_files[individual_id].write(''.join(sample_rows[individual_id])), sample_rows,
+    ))
 
 
 def _get_sample_file_path(file_dir, sample_guid):
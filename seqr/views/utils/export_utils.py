@@ -1,10 +1,11 @@
 import gzip
+from itertools import chain, islice
 import openpyxl as xl
 import os
-from tempfile import NamedTemporaryFile, TemporaryDirectory
+from tempfile import TemporaryDirectory, TemporaryFile
 import zipfile
 
-from django.http.response import HttpResponse
+from django.http.response import FileResponse, StreamingHttpResponse
 
 from seqr.utils.file_utils import mv_file_to_gs, is_google_bucket_file_path
 from seqr.views.utils.json_utils import _to_title_case
@@ -14,33 +15,30 @@ DELIMITERS = {
     'tsv': '\t',
     'txt': '\t',
 }
+FILE_CHUNK_NUM_LINES = 10000
 
 
 def export_table(filename_prefix, header, rows, file_format='tsv', titlecase_header=True):
-    """Generates an HTTP response for a table with the given header and rows, exported into the given file_format.
+    """Generates a streaming HTTP response for a table with the given header and rows, exported into the given file_format.
+
+    Rows are consumed one at a time, so the full table is never held in memory. TSV rows are only generated as the
+    response is sent, and XLSX rows are written to a write-only worksheet in a temporary file.
 
     Args:
         filename_prefix (string): Filename without the extension.
         header (list): List of column names
-        rows (list): List of rows, where each row is a list of column values
-        file_format (string): "tsv", "xls", or "json"
+        rows (iterable): Iterable of rows, where each row is a list of column values
+        file_format (string): "tsv" or "xls"
 
     Returns:
-        Django HttpResponse object with the table data as an attachment.
+        Django StreamingHttpResponse object with the table data as an attachment.
     
     """
-
-    for i, row in enumerate(rows):
-        if len(header) != len(row):
-            raise ValueError('len(header) != len(row): %s != %s\n%s\n%s' % (
-                len(header), len(row), ','.join(header), ','.join(row)))
-        rows[i] = ['' if value is None else value for value in row]
+    rows = (_format_row(header, row) for row in rows)
 
     if file_format == "tsv":
-        response = HttpResponse(content_type='text/tsv')
+        response = StreamingHttpResponse(_iter_tsv_lines(header, rows), content_type='text/tsv')
         response['Content-Disposition'] = 'attachment; filename="{}.tsv"'.format(filename_prefix).encode('ascii', 'ignore')
-        response.writelines(['\t'.join(header)+'\n'])
-        response.writelines(('\t'.join(map(str, row))+'\n' for row in rows))
         return response
     elif file_format == "xls":
         wb = xl.Workbook(write_only=True)
@@ -50,46 +48,75 @@ def export_table(filename_prefix, header, rows, file_format='tsv', titlecase_hea
         ws.append(header)
         for row in rows:
             ws.append(row)
-        with NamedTemporaryFile() as temporary_file:
-            wb.save(temporary_file.name)
-            temporary_file.seek(0)
-            response = HttpResponse(temporary_file.read(), content_type="application/ms-excel")
-            response['Content-Disposition'] = 'attachment; filename="{}.xlsx"'.format(filename_prefix).encode('ascii', 'ignore')
-            return response
+        temporary_file = TemporaryFile()
+        wb.save(temporary_file)
+        return _temporary_file_response(temporary_file, 'application/ms-excel', f'{filename_prefix}.xlsx')
     else:
         raise ValueError("Invalid file_format: %s" % file_format)
 
 
+def _temporary_file_response(temporary_file, content_type, filename):
+    temporary_file.seek(0)
+    # The temporary file is closed, and therefore deleted, by the response once it has been sent
+    response = FileResponse(temporary_file, content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename).encode('ascii', 'ignore')
+    return response
+
+
+def _format_row(header, row):
+    if len(header) != len(row):
+        raise ValueError('len(header) != len(row): %s != %s\n%s\n%s' % (
+            len(header), len(row), ','.join(header), ','.join(row)))
+    return ['' if value is None else value for value in row]
+
+
+def _iter_tsv_lines(header, rows):
+    yield '\t'.join(header)+'\n'
+    for row in rows:
+        yield '\t'.join(map(str, row))+'\n'
+
+
 def _format_files_content(files, file_format='csv', add_header_prefix=False, blank_value='', file_suffixes=None):
+    """Returns the name of each file with a generator of its content, so files are written incrementally"""
     if file_format and file_format not in DELIMITERS:
         raise ValueError('Invalid file_format: {}'.format(file_format))
     parsed_files = []
     for filename, header, rows in files:
-        header_display = header
-        if add_header_prefix:
-            header_display = ['{}-{}'.format(str(header_tuple[0]).zfill(2), header_tuple[1]) for header_tuple in
-                              enumerate(header)]
-            header_display[0] = header[0]
-        content_rows = [[str(row.get(key) or blank_value) for key in header] for row in rows]
-        content = '\n'.join([
-            DELIMITERS[file_format].join(row) for row in [header_display] + content_rows
-            if any(val != blank_value for val in row)
-        ])
-        content = str(content.encode('utf-8'), 'ascii', errors='ignore')  # Strip unicode chars in the content
         file_name = '{}.{}'.format(filename, (file_suffixes or {}).get(filename, file_format)) if file_format else filename
-        parsed_files.append((file_name, content))
+        parsed_files.append((file_name, _iter_file_content(header, rows, file_format, add_header_prefix, blank_value)))
     return parsed_files
 
 
+def _iter_file_content(header, rows, file_format, add_header_prefix, blank_value):
+    header_display = header
+    if add_header_prefix:
+        header_display = ['{}-{}'.format(str(header_tuple[0]).zfill(2), header_tuple[1]) for header_tuple in
+                          enumerate(header)]
+        header_display[0] = header[0]
+    content_rows = ([str(row.get(key) or blank_value) for key in header] for row in rows)
+    lines = (
+        DELIMITERS[file_format].join(row) for row in chain([header_display], content_rows)
+        if any(val != blank_value for val in row)
+    )
+    # Lines are written in batches, so only one batch of a file is held in memory at a time
+    is_first_chunk = True
+    for chunk in iter(lambda: list(islice(lines, FILE_CHUNK_NUM_LINES)), []):
+        content = '\n'.join(chunk)
+        content = str(content.encode('utf-8'), 'ascii', errors='ignore')  # Strip unicode chars in the content
+        yield content if is_first_chunk else f'\n{content}'
+        is_first_chunk = False
+    if is_first_chunk:
+        yield ''
+
+
 def export_multiple_files(files, zip_filename, **kwargs):
-    with NamedTemporaryFile() as temp_file:
-        with zipfile.ZipFile(temp_file, 'w') as zip_file:
-            for filename, content in _format_files_content(files, **kwargs):
-                zip_file.writestr(filename, content)
-        temp_file.seek(0)
-        response = HttpResponse(temp_file, content_type='application/zip')
-        response['Content-Disposition'] = 'attachment; filename="{}.zip"'.format(zip_filename).encode('ascii', 'ignore')
-        return response
+    temp_file = TemporaryFile()
+    with zipfile.ZipFile(temp_file, 'w') as zip_file:
+        for filename, content in _format_files_content(files, **kwargs):
+            with zip_file.open(filename, 'w') as zip_entry:
+                for chunk in content:
+                    zip_entry.write(chunk.encode('utf-8'))
+    return _temporary_file_response(temp_file, 'application/zip', f'{zip_filename}.zip')
 
 
 def write_multiple_files(files, file_path, user, gzip_file=False, **kwargs):
@@ -105,6 +132,7 @@ def write_multiple_files(files, file_path, user, gzip_file=False, **kwargs):
             if gzip_file:
                 current_file += '.gz'
             with open_func(current_file, open_mode) as f:
-                f.write(content)
+                for chunk in content:
+                    f.write(chunk)
         if is_gs_path:
             mv_file_to_gs(f'{temp_dir_name}/*', f'{file_path}/', user)
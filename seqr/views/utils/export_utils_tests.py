@@ -4,6 +4,7 @@ from django.test import TestCase
 from openpyxl import load_workbook
 from io import BytesIO
 import mock
+import zipfile
 
 from seqr.views.utils.export_utils import export_table, export_multiple_files
 
@@ -13,42 +14,48 @@ class ExportTableUtilsTest(TestCase):
 
     def test_export_table(self):
         header = ['column1', 'column2']
-        rows = [['row1_v1\xe2', 'row1_v2'], ['row2_v1', 'row2_v2']]
+        rows = [['row1_v1\xe2', 'row1_v2'], ['row2_v1', None]]
 
         # test tsv format
-        response = export_table('test_file', header, rows, file_format='tsv')
+        response = export_table('test_file', header, iter(rows), file_format='tsv')
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.get('content-disposition'), 'attachment; filename="test_file.tsv"')
-        self.assertEqual(response.content, ('\n'.join(['\t'.join(row) for row in [header]+rows]) + '\n').encode('utf-8'))
+        self.assertEqual(
+            b''.join(response.streaming_content), 'column1\tcolumn2\nrow1_v1\xe2\trow1_v2\nrow2_v1\t\n'.encode('utf-8'),
+        )
 
         # test Excel format
-        response = export_table('test_file', header, rows, file_format='xls')
+        response = export_table('test_file', header, iter(rows), file_format='xls')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.get('content-disposition'), 'attachment; filename="test_file.xlsx"')
-        wb = load_workbook(BytesIO(response.content))
+        wb = load_workbook(BytesIO(b''.join(response.streaming_content)))
         worksheet = wb.active
 
         self.assertListEqual([cell.value for cell in worksheet['A']], ['Column1', 'row1_v1\xe2', 'row2_v1'])
-        self.assertListEqual([cell.value for cell in worksheet['B']], ['Column2', 'row1_v2', 'row2_v2'])
+        self.assertListEqual([cell.value for cell in worksheet['B']], ['Column2', 'row1_v2', None])
         self.assertEqual([cell.value for cell in worksheet['C']], [None, None, None])
 
+        response = export_table('test_file', header, iter(rows), file_format='xls', titlecase_header=False)
+        wb = load_workbook(BytesIO(b''.join(response.streaming_content)))
+        self.assertListEqual([cell.value for cell in wb.active['A']], ['column1', 'row1_v1\xe2', 'row2_v1'])
+
         # test invalid input
         with self.assertRaises(ValueError) as cm:
             export_table('test_file', header, rows, file_format='unknown_format')
         self.assertEqual(str(cm.exception), 'Invalid file_format: unknown_format')
 
+        # tsv rows are only validated as the response is streamed
+        response = export_table('test_file', ['column1'], rows)
         with self.assertRaises(ValueError) as cm:
-            export_table('test_file', ['column1'], rows)
+            b''.join(response.streaming_content)
         self.assertEqual(str(cm.exception), 'len(header) != len(row): 1 != 2\ncolumn1\nrow1_v1\xe2,row1_v2')
 
-    @mock.patch('seqr.views.utils.export_utils.zipfile.ZipFile')
-    def test_export_multiple_files(self, mock_zip):
-        mock_zip_content = {}
-        def mock_write_zip(file, content):
-            mock_zip_content[file] = content
-        mock_zip.return_value.__enter__.return_value.writestr.side_effect = mock_write_zip
+    def _get_zip_content(self, response):
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as zip_file:
+            return {name: zip_file.read(name).decode() for name in zip_file.namelist()}
 
+    def test_export_multiple_files(self):
         header1 = ['col1', 'col2']
         header2 = ['col1']
         header3 = ['col2', 'col3', 'col1']
@@ -58,11 +65,10 @@ class ExportTableUtilsTest(TestCase):
         response = export_multiple_files([['file1', header1, rows], ['file2', header2, rows]], 'zipfile')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.get('content-disposition'), 'attachment; filename="zipfile.zip"')
-        self.assertDictEqual(mock_zip_content, {
+        self.assertDictEqual(self._get_zip_content(response), {
             'file1.csv': 'col1,col2\nrow1_v1,row1_v2\nrow2_v1,',
             'file2.csv': 'col1\nrow1_v1\nrow2_v1',
         })
-        mock_zip_content = {}
 
         # test tsv format with a filename in unicode
         response = export_multiple_files(
@@ -70,21 +76,28 @@ class ExportTableUtilsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         filename = response.get('content-disposition')
         self.assertEqual(filename, 'attachment; filename="zipfilenme.zip"')
-        self.assertDictEqual(mock_zip_content, {
+        self.assertDictEqual(self._get_zip_content(response), {
             'file1.tsv': 'col1\tcol2\nrow1_v1\trow1_v2\nrow2_v1\t',
             'file2.tsv': 'col1\nrow1_v1\nrow2_v1',
         })
-        mock_zip_content = {}
 
         response = export_multiple_files(
             [['file1', header1, rows], ['file2', header3, rows]], 'zipfile', add_header_prefix=True, blank_value='X')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.get('content-disposition'), 'attachment; filename="zipfile.zip"')
-        self.assertDictEqual(mock_zip_content, {
+        self.assertDictEqual(self._get_zip_content(response), {
             'file1.csv': 'col1,01-col2\nrow1_v1,row1_v2\nrow2_v1,X',
             'file2.csv': 'col2,01-col3,02-col1\nrow1_v2,X,row1_v1\nX,X,row2_v1',
         })
-        mock_zip_content = {}
+
+        # test files are written in multiple chunks
+        with mock.patch('seqr.views.utils.export_utils.FILE_CHUNK_NUM_LINES', 1):
+            response = export_multiple_files(
+                [['file1', header1, iter(rows)], ['file2', header2, []]], 'zipfile', file_format='tsv')
+        self.assertDictEqual(self._get_zip_content(response), {
+            'file1.tsv': 'col1\tcol2\nrow1_v1\trow1_v2\nrow2_v1\t',
+            'file2.tsv': 'col1',
+        })
 
         # test unknown format
         with self.assertRaises(ValueError) as cm:
@@ -1,6 +1,7 @@
 from collections import defaultdict
 
 from clickhouse_search.models.postgres_dicts import AffectedDict, SexDict, IndividualMetadataDict
+from clickhouse_search.search import reset_cached_sample_metadata
 from matchmaker.models import MatchmakerSubmission, MatchmakerResult
 from seqr.models import Dataset, IgvSample, RnaSample, Individual, Family, FamilyNote
 from seqr.utils.middleware import ErrorsWarningsException
@@ -79,6 +80,8 @@ def add_or_update_individuals_and_families(project, individual_records, user, ge
         SexDict.reload(user)
     if updated_metadata or num_created_families > 0 or num_created_individuals > 0:
         IndividualMetadataDict.reload(user)
+    if updated_individuals:
+        reset_cached_sample_metadata([project.guid])
 
     pedigree_json = None
     if get_update_json:
@@ -7,7 +7,7 @@ from guardian.shortcuts import get_objects_for_user
 
 from seqr.models import Project, CAN_VIEW, CAN_EDIT
 from seqr.utils.logging_utils import SeqrLogger
-from seqr.utils.redis_utils import safe_redis_get_json, safe_redis_set_json
+from seqr.utils.redis_utils import safe_tiered_cache_get_json, safe_tiered_cache_set_json, safe_tiered_cache_delete
 from seqr.views.utils.terra_api_utils import is_anvil_authenticated, user_get_workspace_acl, list_anvil_workspaces,\
     anvil_enabled, user_get_workspace_access_level, get_anvil_group_members, user_get_anvil_groups, \
     WRITER_ACCESS_LEVEL, OWNER_ACCESS_LEVEL, PROJECT_OWNER_ACCESS_LEVEL, CAN_SHARE_PERM
@@ -244,8 +244,8 @@ def get_project_guids_user_can_view(user, limit_data_manager=True):
     if user_is_data_manager(user) and not limit_data_manager:
         return list(Project.objects.values_list('guid', flat=True))
 
-    cache_key = 'projects__{}'.format(user)
-    project_guids = safe_redis_get_json(cache_key)
+    cache_key = _project_guids_cache_key(user)
+    project_guids = safe_tiered_cache_get_json(cache_key)
     if project_guids is not None:
         return project_guids
 
@@ -262,11 +262,20 @@ def get_project_guids_user_can_view(user, limit_data_manager=True):
 
     project_guids = [p.guid for p in projects.distinct().only('guid')]
 
-    safe_redis_set_json(cache_key, sorted(project_guids), expire=TERRA_WORKSPACE_CACHE_EXPIRE_SECONDS)
+    safe_tiered_cache_set_json(cache_key, sorted(project_guids), expire=TERRA_WORKSPACE_CACHE_EXPIRE_SECONDS)
 
     return project_guids
 
 
+def _project_guids_cache_key(user):
+    return 'projects__{}'.format(user)
+
+
+def reset_cached_project_guids_user_can_view(users):
+    """Clears the cached viewable projects for the given users, should be called whenever their project access changes"""
+    safe_tiered_cache_delete({_project_guids_cache_key(user) for user in users})
+
+
 def check_mme_permissions(submission, user):
     project = submission.individual.family.project
     check_project_permissions(project, user)
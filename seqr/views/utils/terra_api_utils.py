@@ -9,7 +9,7 @@ from urllib.parse import urljoin
 from django.core.exceptions import PermissionDenied
 from social_django.utils import load_strategy
 from seqr.utils.logging_utils import SeqrLogger
-from seqr.utils.redis_utils import safe_redis_get_json, safe_redis_set_json
+from seqr.utils.redis_utils import safe_tiered_cache_get_json, safe_tiered_cache_set_json
 
 from settings import SEQR_VERSION, TERRA_API_ROOT_URL, TERRA_PERMS_CACHE_EXPIRE_SECONDS, SERVICE_ACCOUNT_CREDENTIALS, \
     TERRA_WORKSPACE_CACHE_EXPIRE_SECONDS, SERVICE_ACCOUNT_FOR_ANVIL, SOCIAL_AUTH_PROVIDER
@@ -112,7 +112,7 @@ def anvil_call(method, path, access_token, user=None, headers=None, root_url=Non
                cache_time=None, cache_key_id=None, process_response=None):
     cache_key = f'terra_req__{cache_key_id or user}__{path}'
     if cache_time:
-        r = safe_redis_get_json(cache_key)
+        r = safe_tiered_cache_get_json(cache_key)
         if r:
             logger.info('Terra API cache hit for: GET {} {}'.format(path, user), user)
             return r
@@ -149,7 +149,7 @@ def anvil_call(method, path, access_token, user=None, headers=None, root_url=Non
         data = process_response(data)
 
     if data and cache_time:
-        safe_redis_set_json(cache_key, data, cache_time)
+        safe_tiered_cache_set_json(cache_key, data, cache_time)
 
     return data
 
@@ -141,9 +141,7 @@ class TerraApiUtilsCallsCase(AuthenticationTestCase):
         ])
         responses.assert_call_count(url, 1)
         mock_redis.return_value.set.assert_called_with(
-            'terra_req__test_user__api/workspaces?fields=public,workspace.name,workspace.namespace', json.dumps(workspaces))
-        mock_redis.return_value.expire.assert_called_with(
-            'terra_req__test_user__api/workspaces?fields=public,workspace.name,workspace.namespace', 300)
+            'terra_req__test_user__api/workspaces?fields=public,workspace.name,workspace.namespace', json.dumps(workspaces), ex=300)
 
         self.reset_logs()
         responses.reset()
@@ -213,9 +211,7 @@ class TerraApiUtilsCallsCase(AuthenticationTestCase):
         responses.assert_call_count(url, 1)
         mock_redis.return_value.set.assert_called_with(
             'terra_req__test_user__api/workspaces/my-seqr-billing/my-seqr-workspace?fields=accessLevel,canShare',
-            json.dumps(permission))
-        mock_redis.return_value.expire.assert_called_with(
-            'terra_req__test_user__api/workspaces/my-seqr-billing/my-seqr-workspace?fields=accessLevel,canShare', 60)
+            json.dumps(permission), ex=60)
 
         self._check_handled_exceptions(path, user_get_workspace_access_level, ('my-seqr-billing', 'my-seqr-workspace'))
         responses.assert_call_count(url, 5)
@@ -293,8 +289,7 @@ class TerraApiUtilsCallsCase(AuthenticationTestCase):
         self.assertEqual(responses.calls[0].request.headers['Authorization'], 'Bearer ya29.EXAMPLE')
         mock_redis.return_value.get.assert_called_with('terra_req__test_user__api/groups/TGG_USERS')
         mock_redis.return_value.set.assert_called_with(
-            'terra_req__test_user__api/groups/TGG_USERS', json.dumps(members))
-        mock_redis.return_value.expire.assert_called_with('terra_req__test_user__api/groups/TGG_USERS', 300)
+            'terra_req__test_user__api/groups/TGG_USERS', json.dumps(members), ex=300)
 
         # test with service account credentials
         mock_datetime.now.return_value = datetime(2021, 1, 1)
@@ -304,8 +299,7 @@ class TerraApiUtilsCallsCase(AuthenticationTestCase):
         self.assertEqual(responses.calls[1].request.headers['Authorization'], 'Bearer ya29.SA_EXAMPLE')
         mock_credentials.refresh.assert_not_called()
         mock_redis.return_value.get.assert_called_with('terra_req__SA__api/groups/TGG_USERS')
-        mock_redis.return_value.set.assert_called_with('terra_req__SA__api/groups/TGG_USERS', json.dumps(members))
-        mock_redis.return_value.expire.assert_called_with('terra_req__SA__api/groups/TGG_USERS', 300)
+        mock_redis.return_value.set.assert_called_with('terra_req__SA__api/groups/TGG_USERS', json.dumps(members), ex=300)
 
         mock_credentials.expiry = datetime(2021, 1, 1)
         get_anvil_group_members(self.analyst_user, USERS_GROUP, use_sa_credentials=True)
@@ -336,8 +330,7 @@ class TerraApiUtilsCallsCase(AuthenticationTestCase):
         self.assertListEqual(groups, ['TGG_Users', 'External_Users'])
         self.assert_json_logs(self.analyst_user, [('GET https://terra.api/api/groups 200 183', None)])
         responses.assert_call_count(url, 1)
-        mock_redis.return_value.set.assert_called_with('terra_req__test_user__api/groups', json.dumps(groups))
-        mock_redis.return_value.expire.assert_called_with('terra_req__test_user__api/groups', 300)
+        mock_redis.return_value.set.assert_called_with('terra_req__test_user__api/groups', json.dumps(groups), ex=300)
 
         mock_redis.return_value.get.return_value = None
         self._check_exceptions('api/groups', user_get_anvil_groups, (self.analyst_user,))
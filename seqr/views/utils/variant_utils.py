@@ -3,17 +3,19 @@ from clickhouse_backend.models import ArrayField, StringField
 from django.contrib.auth.models import User
 from django.contrib.postgres.aggregates import ArrayAgg
 from django.db.models import F, Q, Count, Value
+import hashlib
 import json
 import logging
-import redis
 
 from clickhouse_search.backend.functions import ArrayDistinct, ArrayMap
-from clickhouse_search.search import get_variants_queryset, get_clickhouse_variant_annotations
+from clickhouse_search.search import get_variants_queryset, get_clickhouse_variant_annotations, \
+    reset_cached_sample_metadata, VARIANT_DETAILS_CACHE_NAMESPACE
 from matchmaker.models import MatchmakerSubmissionGenes, MatchmakerSubmission
 from reference_data.models import TranscriptInfo, Omim, GENOME_VERSION_GRCh38
-from seqr.models import SavedVariant, VariantSearchResults, Family, LocusList, LocusListInterval, LocusListGene, \
+from seqr.models import SavedVariant, Family, LocusList, LocusListInterval, LocusListGene, \
     RnaSeqTpm, PhenotypePrioritization, Project, Dataset, RnaSample, VariantTag, VariantTagType
 from seqr.utils.gene_utils import get_genes_for_variants
+from seqr.utils.redis_utils import redis_delete_tagged_keys, redis_reset_namespace, safe_redis_namespace_versions
 from seqr.utils.xpos_utils import parse_variant_id, get_chrom_pos
 from seqr.views.utils.json_to_orm_utils import create_model_from_json
 from seqr.views.utils.orm_to_json_utils import get_json_for_saved_variants_child_entities, get_json_for_locus_lists, \
@@ -21,7 +23,6 @@ from seqr.views.utils.orm_to_json_utils import get_json_for_saved_variants_child
     get_json_for_matchmaker_submissions
 from seqr.views.utils.permissions_utils import has_case_review_permissions, user_is_analyst, get_project_guids_user_can_view
 from seqr.views.utils.project_context_utils import add_project_tag_types, add_families_context
-from settings import REDIS_SERVICE_HOSTNAME, REDIS_SERVICE_PORT
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +30,10 @@ logger = logging.getLogger(__name__)
 DISCOVERY_CATEGORY = 'CMG Discovery Tags'
 OMIM_GENOME_VERSION = GENOME_VERSION_GRCh38
 
+SEARCH_RESULTS_CACHE_NAMESPACE = 'search_results'
+VARIANT_LOOKUP_CACHE_NAMESPACE = 'variant_lookup_results'
+SEARCH_DATA_VERSION_NAMESPACE = 'search_data'
+
 
 def parse_saved_variant_json(variant_json, family_id):
     xpos = variant_json['xpos']
@@ -210,24 +215,75 @@ def get_saved_variant_annotations(variant_keys: abc.Iterable[tuple[int, str]], g
     return {v[group_by_field or key_field]: v for v in qs.values(*variant_fields, **variant_values)}
 
 
-def reset_cached_search_results(project, reset_index_metadata=False):
+def _project_cache_tag(project_guid):
+    return f'project__{project_guid}'
+
+
+def _dataset_type_cache_tag(dataset_type):
+    return f'dataset_type__{dataset_type}'
+
+
+def _search_data_version_namespace(dataset_type):
+    return f'{SEARCH_DATA_VERSION_NAMESPACE}__{dataset_type}'
+
+
+def _get_search_dataset_types(families, search):
+    dataset_types = set(Dataset.objects.filter(
+        active_individuals__family__in=families,
+    ).values_list('dataset_type', flat=True).distinct())
+    if search.get('no_access_project_genome_version'):
+        dataset_types.add(Dataset.DATASET_TYPE_VARIANT_CALLS)
+    return sorted(dataset_types)
+
+
+def get_search_results_cache_tags(families, search):
+    project_guids = Project.objects.filter(family__in=families).values_list('guid', flat=True).distinct()
+    return [_project_cache_tag(guid) for guid in project_guids] + [
+        _dataset_type_cache_tag(dataset_type) for dataset_type in _get_search_dataset_types(families, search)
+    ]
+
+
+def get_search_results_cache_id(families, search):
+    """Returns a hash of the search content and the loaded version of each searched dataset type"""
+    data_version_namespaces = {
+        dataset_type: _search_data_version_namespace(dataset_type)
+        for dataset_type in _get_search_dataset_types(families, search)
+    }
+    data_versions = safe_redis_namespace_versions(data_version_namespaces.values())
+    search_content = json.dumps({
+        'families': sorted(families.values_list('guid', flat=True)),
+        'search': search,
+        'dataVersions': {
+            dataset_type: data_versions[namespace] for dataset_type, namespace in data_version_namespaces.items()
+        },
+    }, sort_keys=True)
+    return hashlib.md5(search_content.encode('utf-8')).hexdigest()  # nosec
+
+
+def reset_cached_search_results(project, dataset_types=None):
     try:
-        redis_client = redis.StrictRedis(host=REDIS_SERVICE_HOSTNAME, port=REDIS_SERVICE_PORT, socket_connect_timeout=3)
-        keys_to_delete = []
-        if project:
-            result_guids = [res.guid for res in VariantSearchResults.objects.filter(families__project=project)]
-            for guid in result_guids:
-                keys_to_delete += redis_client.keys(pattern='search_results__{}*'.format(guid))
-        else:
-            keys_to_delete = redis_client.keys(pattern='search_results__*')
-        keys_to_delete += redis_client.keys(pattern='variant_lookup_results__*')
-        if reset_index_metadata:
-            keys_to_delete += redis_client.keys(pattern='index_metadata__*')
-        if keys_to_delete:
-            redis_client.delete(*keys_to_delete)
-            logger.info('Reset {} cached results'.format(len(keys_to_delete)))
+        if project or dataset_types:
+            tags = [_project_cache_tag(project.guid)] if project else [
+                _dataset_type_cache_tag(dataset_type) for dataset_type in sorted(dataset_types)
+            ]
+            num_reset = redis_delete_tagged_keys(tags)
+            if project:
+                reset_cached_sample_metadata([project.guid])
+            for dataset_type in sorted(dataset_types or []):
+                redis_reset_namespace(_search_data_version_namespace(dataset_type))
+            if Dataset.DATASET_TYPE_VARIANT_CALLS in (dataset_types or []):
+                # Loading new data also reloads the variant details table
+                redis_reset_namespace(VARIANT_DETAILS_CACHE_NAMESPACE)
+            if num_reset:
+                logger.info('Reset {} cached results'.format(num_reset))
+            else:
+                logger.info('No cached results to reset')
         else:
-            logger.info('No cached results to reset')
+            redis_reset_namespace(SEARCH_RESULTS_CACHE_NAMESPACE)
+            redis_reset_namespace(VARIANT_DETAILS_CACHE_NAMESPACE)
+            reset_cached_sample_metadata()
+            logger.info('Reset all cached results')
+        redis_reset_namespace(VARIANT_LOOKUP_CACHE_NAMESPACE)
     except Exception as e:
         logger.error("Unable to reset cached search results: {}".format(e))
 
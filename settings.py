@@ -158,6 +158,15 @@ else:
 
 LOADING_DATASETS_DIR = os.environ.get('LOADING_DATASETS_DIR')
 PIPELINE_DATA_DIR = os.environ.get('PIPELINE_DATA_DIR')
+# Local directory with UCSC liftover chain files. If unset, chain files are downloaded on first use
+LIFTOVER_CHAIN_FILE_DIR = os.environ.get('LIFTOVER_CHAIN_FILE_DIR')
+# Runs for independent genome versions and dataset types are loaded concurrently when more than one worker is configured
+PIPELINE_RUN_MAX_WORKERS = int(os.environ.get('PIPELINE_RUN_MAX_WORKERS', '1'))
+# Parsed RNA-seq data is compressed and written to the per-sample files concurrently when more than one worker is configured
+RNA_SEQ_LOADING_MAX_WORKERS = int(os.environ.get('RNA_SEQ_LOADING_MAX_WORKERS', '1'))
+# Google Storage API used to stream IGV tracks. Can be pointed at a local fake object store for testing
+GS_STORAGE_URL = os.environ.get('GS_STORAGE_URL', 'https://storage.googleapis.com')
+GS_STREAMING_POOL_SIZE = int(os.environ.get('GS_STREAMING_POOL_SIZE', '10'))
 
 LOGGING = {
     'version': 1,
@@ -265,6 +274,9 @@ DATABASE_ROUTERS = ['reference_data.models.ReferenceDataRouter', 'clickhouse_sea
 
 CLICKHOUSE_IN_MEMORY_DIR = os.environ.get('CLICKHOUSE_IN_MEMORY_DIR', '/in-memory-dir')
 CLICKHOUSE_DATA_DIR = os.getenv('CLICKHOUSE_DATA_DIR', '/var/seqr/clickhouse-data')
+# Independent per-dataset type search queries are run concurrently when more than one worker is configured
+CLICKHOUSE_SEARCH_MAX_WORKERS = int(os.environ.get('CLICKHOUSE_SEARCH_MAX_WORKERS', '1'))
+CLICKHOUSE_SEARCH_QUERY_TIMEOUT = int(os.environ.get('CLICKHOUSE_SEARCH_QUERY_TIMEOUT', '300'))
 
 TEST_RUNNER = "seqr.testrunner.OrderedDatabaseDeletionRunner"
 
@@ -359,6 +371,12 @@ IS_ANVIL_LOADING_DELAY = bool(os.environ.get('IS_ANVIL_LOADING_DELAY'))
 # External service settings
 REDIS_SERVICE_HOSTNAME = os.environ.get('REDIS_SERVICE_HOSTNAME', 'localhost')
 REDIS_SERVICE_PORT = int(os.environ.get('REDIS_SERVICE_PORT', '6379'))
+# JSON values at least this large are gzip compressed before caching in redis. Set to 0 to disable compression
+REDIS_COMPRESSION_MIN_BYTES = int(os.environ.get('REDIS_COMPRESSION_MIN_BYTES', '0'))
+# Small, frequently read values can additionally be cached in each worker's memory for up to this many seconds. Set to
+# 0 to disable the in-process cache
+REDIS_LOCAL_CACHE_EXPIRE_SECONDS = int(os.environ.get('REDIS_LOCAL_CACHE_EXPIRE_SECONDS', '0'))
+REDIS_LOCAL_CACHE_MAX_SIZE = int(os.environ.get('REDIS_LOCAL_CACHE_MAX_SIZE', '1000'))
 
 PIPELINE_RUNNER_HOSTNAME = os.environ.get('PIPELINE_RUNNER_HOSTNAME', 'pipeline-runner')
 PIPELINE_RUNNER_PORT = os.environ.get('PIPELINE_RUNNER_PORT', '6000')
@@ -1,4 +1,6 @@
+import asyncio
 import clickhouse_connect
+from clickhouse_connect.driver.httputil import get_pool_manager
 import os
 from typing import Optional, Tuple
 
@@ -10,6 +12,8 @@ CLICKHOUSE_CONNECTION_PARAMS = {
     'password': os.environ.get('CLICKHOUSE_VLM_PASSWORD'),
     'database': os.environ.get('CLICKHOUSE_DATABASE', 'seqr'),
 }
+CLICKHOUSE_MAX_CONCURRENT_QUERIES = int(os.environ.get('CLICKHOUSE_VLM_MAX_CONCURRENT_QUERIES', '8'))
+CLICKHOUSE_QUERY_TIMEOUT = int(os.environ.get('CLICKHOUSE_VLM_QUERY_TIMEOUT', '30'))
 
 CHROMOSOMES = [
     '1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '11', '12', '13', '14', '15', '16', '17', '18', '19',
@@ -17,14 +21,85 @@ CHROMOSOMES = [
 ]
 
 
-def get_clickhouse_variant_counts(chrom: str, pos: int, genome_build: str, ref: str, alt: str) -> Optional[Tuple[int, int]]:
-    query = "SELECT plus(gt_stats.1, gt_stats.2), plus(gt_stats.3, gt_stats.4) FROM (SELECT dictGet(%(gt_stats_dict)s, ('ac_wes', 'ac_wgs', 'hom_wes', 'hom_wgs'), key) AS gt_stats FROM %(key_lookup_table)s WHERE variantId=%(variant_id)s)"
-    params = {'gt_stats_dict': f'{genome_build}/SNV_INDEL/gt_stats_dict'}
-    results = _get_clickhouse_variant_query_result(chrom, pos, genome_build, ref, alt, query, params)
-    return results[0] if results else None
+class ClickhouseClientPool:
 
+    def __init__(self, max_concurrent_queries: int = CLICKHOUSE_MAX_CONCURRENT_QUERIES, query_timeout: int = CLICKHOUSE_QUERY_TIMEOUT):
+        """Process-wide pool of ClickHouse connections, shared by all requests and queried without blocking the event loop"""
+        self._max_concurrent_queries = max_concurrent_queries
+        self._query_timeout = query_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent_queries)
+        self._client = None
+        self._client_lock = asyncio.Lock()
 
-def get_clickhouse_variant_details(chrom: str, pos: int, genome_build: str, ref: str, alt: str) -> list[tuple]:
+    async def _get_client(self) -> clickhouse_connect.driver.AsyncClient:
+        # The client is created on first use so the service can start while ClickHouse is unavailable
+        async with self._client_lock:
+            if self._client is None:
+                self._client = await clickhouse_connect.get_async_client(
+                    **CLICKHOUSE_CONNECTION_PARAMS,
+                    executor_threads=self._max_concurrent_queries,
+                    pool_mgr=get_pool_manager(maxsize=self._max_concurrent_queries),
+                    send_receive_timeout=self._query_timeout,
+                )
+            return self._client
+
+    async def query(self, query: str, parameters: dict) -> list[tuple]:
+        client = await self._get_client()
+        await self._semaphore.acquire()
+        # ClickHouse stops the query server-side once it exceeds the timeout
+        task = asyncio.ensure_future(client.query(
+            query, parameters=parameters, settings={'max_execution_time': self._query_timeout},
+        ))
+        # The slot is held until the underlying query finishes, even if the caller has stopped waiting for it, so timed
+        # out queries still count towards the concurrency limit
+        task.add_done_callback(self._release_query_slot)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), timeout=self._query_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f'ClickHouse query timed out after {self._query_timeout} seconds')
+        return result.result_set
+
+    def _release_query_slot(self, task: asyncio.Future) -> None:
+        self._semaphore.release()
+        if not task.cancelled():
+            # Retrieve the error of queries no caller is waiting on, so it is not reported as unhandled
+            task.exception()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+CLICKHOUSE_CLIENT_POOL: Optional[ClickhouseClientPool] = None
+
+
+def init_clickhouse_client_pool() -> ClickhouseClientPool:
+    global CLICKHOUSE_CLIENT_POOL
+    CLICKHOUSE_CLIENT_POOL = ClickhouseClientPool()
+    return CLICKHOUSE_CLIENT_POOL
+
+
+async def get_clickhouse_variant_counts(chrom: str, pos: int, genome_build: str, ref: str, alt: str) -> Optional[Tuple[int, int]]:
+    results = await get_clickhouse_variant_counts_batch(genome_build, [(chrom, pos, ref, alt)])
+    return results.get((chrom, pos, ref, alt))
+
+
+async def get_clickhouse_variant_counts_batch(genome_build: str, variants: list[tuple[str, int, str, str]]) -> dict[tuple[str, int, str, str], Tuple[int, int]]:
+    variants_by_id = {f'{chrom}-{pos}-{ref}-{alt}': (chrom, pos, ref, alt) for chrom, pos, ref, alt in variants}
+    query = "SELECT variantId, plus(gt_stats.1, gt_stats.2), plus(gt_stats.3, gt_stats.4) FROM (SELECT variantId, dictGet(%(gt_stats_dict)s, ('ac_wes', 'ac_wgs', 'hom_wes', 'hom_wgs'), key) AS gt_stats FROM %(key_lookup_table)s WHERE variantId IN %(variant_ids)s)"
+    results = await CLICKHOUSE_CLIENT_POOL.query(
+        query,
+        parameters={
+            'variant_ids': tuple(variants_by_id.keys()),
+            'key_lookup_table': f'{genome_build}/SNV_INDEL/key_lookup',
+            'gt_stats_dict': f'{genome_build}/SNV_INDEL/gt_stats_dict',
+        },
+    )
+    return {variants_by_id[variant_id]: (ac, hom) for variant_id, ac, hom in results}
+
+
+async def get_clickhouse_variant_details(chrom: str, pos: int, genome_build: str, ref: str, alt: str) -> list[tuple]:
     query = """SELECT arrayMap(
       x -> tupleConcat((
         dictGetOrDefault(seqrdb_affected_status_dict, 'affected', (family_guid, x.sampleId), 'U'), 
@@ -45,16 +120,21 @@ def get_clickhouse_variant_details(chrom: str, pos: int, genome_build: str, ref:
         'entries_table': f'{genome_build}/SNV_INDEL/entries',
         'xpos': ((1 + CHROMOSOMES.index(chrom))*int(1e9)) + pos,
     }
-    return _get_clickhouse_variant_query_result(chrom, pos, genome_build, ref, alt, query, params)
+    return await _get_clickhouse_variant_query_result(chrom, pos, genome_build, ref, alt, query, params)
 
 
-def _get_clickhouse_variant_query_result(chrom: str, pos: int, genome_build: str, ref: str, alt: str, query: str, params: dict) -> list[tuple]:
-    client = clickhouse_connect.get_client(**CLICKHOUSE_CONNECTION_PARAMS)
-    return client.query(
+async def _get_clickhouse_variant_query_result(chrom: str, pos: int, genome_build: str, ref: str, alt: str, query: str, params: dict) -> list[tuple]:
+    return await CLICKHOUSE_CLIENT_POOL.query(
         query,
         parameters={
             'variant_id': f'{chrom}-{pos}-{ref}-{alt}',
             'key_lookup_table': f'{genome_build}/SNV_INDEL/key_lookup',
             **params,
         },
-    ).result_set
+    )
+
+
+async def get_clickhouse_hpo_labels(hpo_ids: list[str]) -> dict[str, str]:
+    query = "SELECT hpo_id, dictGet(seqrdb_hpo, 'name', hpo_id) FROM (SELECT arrayJoin(%(hpo_ids)s) AS hpo_id) WHERE dictHas(seqrdb_hpo, hpo_id)"
+    results = await CLICKHOUSE_CLIENT_POOL.query(query, parameters={'hpo_ids': hpo_ids})
+    return dict(results)
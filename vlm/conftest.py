@@ -11,7 +11,7 @@ def django_db_setup(request, django_db_blocker,django_db_keepdb):
     from clickhouse_search.models.gt_stats_models import ProjectsToGtStatsGRCh37SnvIndel, ProjectsToGtStatsSnvIndel, \
         GtStatsDictGRCh37SnvIndel, GtStatsDictSnvIndel
     from clickhouse_search.models.postgres_dicts import AffectedDict, SexDict, IndividualMetadataDict, \
-        DiscoveryVariantDict, ExcludedVariantDict, OmimDict
+        DiscoveryVariantDict, ExcludedVariantDict, OmimDict, HpoDict
 
     with django_db_blocker.unblock():
         db_cfg = setup_databases(
@@ -28,7 +28,7 @@ def django_db_setup(request, django_db_blocker,django_db_keepdb):
         ProjectsToGtStatsSnvIndel.refresh()
         for d in [
             GtStatsDictGRCh37SnvIndel, GtStatsDictSnvIndel, SexDict, IndividualMetadataDict, DiscoveryVariantDict,
-            ExcludedVariantDict, OmimDict,
+            ExcludedVariantDict, OmimDict, HpoDict,
         ]:
             d.reload()
 
@@ -1,22 +1,24 @@
-from aiohttp import ClientSession
+import asyncio
 from aiohttp.web import HTTPBadRequest
+from collections import defaultdict
 from collections.abc import Callable
 from datetime import datetime
+from functools import lru_cache
 import json
 import os
 from pyliftover.liftover import LiftOver
 import re
 from typing import Optional, Tuple
 
-from vlm.clickhouse_utils import get_clickhouse_variant_counts, get_clickhouse_variant_details, CHROMOSOMES
+from vlm.clickhouse_utils import get_clickhouse_variant_counts, get_clickhouse_variant_counts_batch, \
+    get_clickhouse_variant_details, CHROMOSOMES
+from vlm import ontology_utils
 
 SEQR_BASE_URL = os.environ.get('SEQR_BASE_URL')
 VLM_DEFAULT_CONTACT_EMAIL = os.environ.get('VLM_DEFAULT_CONTACT_EMAIL')
 NODE_ID = os.environ.get('NODE_ID')
 LIFTOVER_DIR = f'{os.path.dirname(os.path.abspath(__file__))}/liftover_references'
 
-ONTOLOGY_API_URL = 'https://ontology.jax.org/'
-
 BEACON_HANDOVER_TYPE = {
     'id': NODE_ID,
     'label': f'{NODE_ID} browser'
@@ -49,6 +51,8 @@ ASSEMBLY_LOOKUP = {
 MIN_POS = 1
 MAX_POS = 300_000_000
 
+MAX_BATCH_VARIANTS = int(os.environ.get('VLM_MAX_BATCH_VARIANTS', '1000'))
+
 
 async def get_variant_match(query: dict) -> dict:
     return await _get_variant_match(query, get_match=get_clickhouse_variant_counts, get_results=_get_match_results)
@@ -61,9 +65,14 @@ async def get_variant_match_details(query: dict) -> dict:
 async def _get_variant_match(query: dict, get_match: Callable, get_results: Callable) -> dict:
     chrom, pos, ref, alt, genome_build = _parse_match_query(query)
 
-    match = get_match(chrom, pos, genome_build, ref, alt)
     liftover = _liftover_variant(chrom, pos, genome_build)
-    lift_match = get_match(*liftover, ref, alt) if liftover else None
+    if liftover:
+        match, lift_match = await asyncio.gather(
+            get_match(chrom, pos, genome_build, ref, alt), get_match(*liftover, ref, alt),
+        )
+    else:
+        match = await get_match(chrom, pos, genome_build, ref, alt)
+        lift_match = None
 
     url = _get_contact_url(
         chrom, pos, ref, alt, genome_build, liftover if lift_match and not match else None,
@@ -72,6 +81,36 @@ async def _get_variant_match(query: dict, get_match: Callable, get_results: Call
     return _format_results(total, results_set, url, schema)
 
 
+async def get_variant_batch_match(body: dict) -> dict:
+    variants = _parse_batch_match_query(body)
+    liftovers = [_liftover_variant(chrom, pos, genome_build) for chrom, pos, _, _, genome_build in variants]
+
+    # Look up all variants and their liftovers with a single query per genome build
+    variants_by_build = defaultdict(set)
+    for (chrom, pos, ref, alt, genome_build), liftover in zip(variants, liftovers):
+        variants_by_build[genome_build].add((chrom, pos, ref, alt))
+        if liftover:
+            lift_chrom, lift_pos, lift_genome_build = liftover
+            variants_by_build[lift_genome_build].add((lift_chrom, lift_pos, ref, alt))
+    genome_builds = sorted(variants_by_build.keys())
+    build_matches = await asyncio.gather(*[
+        get_clickhouse_variant_counts_batch(genome_build, sorted(variants_by_build[genome_build]))
+        for genome_build in genome_builds
+    ])
+    matches = dict(zip(genome_builds, build_matches))
+
+    results = []
+    for (chrom, pos, ref, alt, genome_build), liftover in zip(variants, liftovers):
+        match = matches[genome_build].get((chrom, pos, ref, alt))
+        lift_match = matches[liftover[2]].get((liftover[0], liftover[1], ref, alt)) if liftover else None
+        url = _get_contact_url(
+            chrom, pos, ref, alt, genome_build, liftover if lift_match and not match else None,
+        )
+        total, results_set, schema = await _get_match_results(match, lift_match)
+        results.append(_format_results(total, results_set, url, schema))
+    return {'results': results}
+
+
 def _get_contact_url(chrom: str, pos: int, ref: str, alt: str, genome_build: str, liftover: Optional[Tuple[str, int, str]]) -> str:
     if not SEQR_BASE_URL:
         return SEQR_BASE_URL
@@ -110,6 +149,24 @@ def _parse_match_query(query: dict) -> tuple[str, int, str, str, str]:
     return chrom, start, query['referenceBases'], query['alternateBases'], genome_build
 
 
+def _parse_batch_match_query(body: dict) -> list[tuple[str, int, str, str, str]]:
+    variants = body.get('variants') if isinstance(body, dict) else None
+    if not variants or not isinstance(variants, list):
+        raise HTTPBadRequest(reason='Missing required parameters: variants')
+    if len(variants) > MAX_BATCH_VARIANTS:
+        raise HTTPBadRequest(reason=f'Too many variants: {len(variants)} (max {MAX_BATCH_VARIANTS})')
+
+    parsed_variants = []
+    for i, variant in enumerate(variants):
+        if not isinstance(variant, dict):
+            raise HTTPBadRequest(reason=f'Invalid variant {i}')
+        try:
+            parsed_variants.append(_parse_match_query({key: str(value) for key, value in variant.items()}))
+        except HTTPBadRequest as e:
+            raise HTTPBadRequest(reason=f'Invalid variant {i}: {e.reason}')
+    return parsed_variants
+
+
 async def _get_match_results(match: Optional[Tuple[int, int]], lift_match: Optional[Tuple[int, int]]) -> tuple[int, list[tuple[str, int, list[dict]]], dict]:
     build_ac, build_hom = match or (0, 0)
     lift_ac, lift_hom = lift_match or (0, 0)
@@ -164,57 +221,68 @@ MONDO_RESOURCE = {
 
 
 async def _get_match_detail_results(match: list[tuple], lift_match: Optional[list[tuple]]) -> tuple[int, list[tuple[Optional[str], int, list[dict]]], dict]:
+    families = match + (lift_match or [])
+    label_map = await ontology_utils.ONTOLOGY_LABEL_STORE.get_labels(_get_ontology_term_ids(families))
+
     results = []
-    hpo_label_map = {}
-    mondo_label_map = {}
-    async with ClientSession(ONTOLOGY_API_URL) as session:
-        for f_i, (samples, has_discovery, has_excluded) in enumerate(match + (lift_match or [])):
-            family_id = f'F_{f_i}'
-            proband = None
-            relatives = []
-            pedigree = []
-            for s_i, (affected, sex, *sample) in enumerate(samples):
-                individual_id = f'I_{f_i}_{s_i}'
-                sex = SEX_LOOKUP.get(sex, 'OTHER_SEX')
-                pedigree.append({
-                    'family_id': family_id,
-                    'individual_id': individual_id,
-                    'paternal_id': '0',
-                    'maternal_id': '0',
-                    'sex': sex,
-                    'affected_status': AFFECTED_LOOKUP[affected],
-                })
-
-                phenopacket = await _format_phenopacket(
-                    hpo_label_map, mondo_label_map, session, individual_id, has_discovery, has_excluded, sex, *sample,
-                )
-                if affected == 'A' and proband is None:
-                    proband = phenopacket
-                else:
-                    relatives.append(phenopacket)
-
-            if not proband:
-                proband = relatives[0]
-                relatives = relatives[1:]
-
-            results.append({
-                'id': family_id,
-                'proband': proband,
-                'relatives': relatives,
-                'pedigree': {'persons': pedigree},
-                'meta_data': {'phenopacket_schema_version': '2.0', 'resources': []},
+    for f_i, (samples, has_discovery, has_excluded) in enumerate(families):
+        family_id = f'F_{f_i}'
+        proband = None
+        relatives = []
+        pedigree = []
+        for s_i, (affected, sex, *sample) in enumerate(samples):
+            individual_id = f'I_{f_i}_{s_i}'
+            sex = SEX_LOOKUP.get(sex, 'OTHER_SEX')
+            pedigree.append({
+                'family_id': family_id,
+                'individual_id': individual_id,
+                'paternal_id': '0',
+                'maternal_id': '0',
+                'sex': sex,
+                'affected_status': AFFECTED_LOOKUP[affected],
             })
 
+            phenopacket = _format_phenopacket(label_map, individual_id, has_discovery, has_excluded, sex, *sample)
+            if affected == 'A' and proband is None:
+                proband = phenopacket
+            else:
+                relatives.append(phenopacket)
+
+        if not proband:
+            proband = relatives[0]
+            relatives = relatives[1:]
+
+        results.append({
+            'id': family_id,
+            'proband': proband,
+            'relatives': relatives,
+            'pedigree': {'persons': pedigree},
+            'meta_data': {'phenopacket_schema_version': '2.0', 'resources': []},
+        })
+
     result_sets = [
         (None, len(results), results),
     ]
     return len(results), result_sets, PHENOPACKET_SCHEMA
 
 
-async def _format_phenopacket(
-    hpo_label_map: dict[str, str], mondo_label_map: dict[str, str], session: ClientSession, individual_id: str,
-    has_discovery: bool, has_excluded: bool, sex: str, gt: str, omim_label: str, omim_id: int, mondo_id: str,
-    features: str, is_solved: bool, vlm_contact_email: str, restrict_sharing: bool,
+def _get_ontology_term_ids(families: list[tuple]) -> set[str]:
+    term_ids = set()
+    for samples, _, _ in families:
+        for _, _, _, _, omim_id, mondo_id, features, _, _, restrict_sharing in samples:
+            if restrict_sharing:
+                continue
+            if features:
+                term_ids.update(feature['id'] for feature in json.loads(features))
+            if mondo_id and not omim_id:
+                term_ids.add(mondo_id)
+    return term_ids
+
+
+def _format_phenopacket(
+    label_map: dict[str, str], individual_id: str, has_discovery: bool, has_excluded: bool, sex: str, gt: str,
+    omim_label: str, omim_id: int, mondo_id: str, features: str, is_solved: bool, vlm_contact_email: str,
+    restrict_sharing: bool,
 ) -> dict:
     if restrict_sharing:
         features = None
@@ -226,11 +294,7 @@ async def _format_phenopacket(
     phenotypic_features = []
     if features:
         for feature in json.loads(features):
-            hpo_id = feature['id']
-            if hpo_id not in hpo_label_map:
-                async with session.get(f'/api/hp/terms/{hpo_id}') as resp:
-                    hpo_label_map[hpo_id] = (await resp.json())['name']
-            phenotypic_features.append({'id': hpo_id, 'label': hpo_label_map[hpo_id]})
+            phenotypic_features.append({'id': feature['id'], 'label': label_map[feature['id']]})
         resources.append({**HPO_RESOURCE, 'version': datetime.now().strftime('%Y-%m-%d')})
     interpretation = {
         'subject_or_biosample_id': individual_id,
@@ -242,10 +306,7 @@ async def _format_phenopacket(
         diagnosis['disease'] = {'id': f'OMIM:{omim_id}', 'label': omim_label}
         resources.append({**OMIM_RESOURCE, 'version': datetime.now().strftime('%Y-%m-%d')})
     elif mondo_id:
-        if mondo_id not in mondo_label_map:
-            async with session.get(f'/api/mondo/terms/{mondo_id}') as resp:
-                mondo_label_map[mondo_id] = (await resp.json())['name']
-        diagnosis['disease'] = {'id': mondo_id, 'label': mondo_label_map[mondo_id]}
+        diagnosis['disease'] = {'id': mondo_id, 'label': label_map[mondo_id]}
         resources.append({**MONDO_RESOURCE, 'version': datetime.now().strftime('%Y-%m-%d')})
 
     return {
@@ -300,8 +361,10 @@ LIFTOVERS = {
     GENOME_VERSION_GRCh38: None,
     GENOME_VERSION_GRCh37: None,
 }
+LIFTOVER_CACHE_SIZE = 100000
 
 
+@lru_cache(maxsize=LIFTOVER_CACHE_SIZE)
 def _liftover_variant(chrom: str, pos: int, genome_build: str) -> Optional[Tuple[str, int, str]]:
     liftover_genome_build = GENOME_VERSION_GRCh38 if genome_build == GENOME_VERSION_GRCh37 else GENOME_VERSION_GRCh37
     if not LIFTOVERS[genome_build]:
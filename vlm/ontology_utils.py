@@ -0,0 +1,73 @@
+from aiohttp import ClientSession
+import asyncio
+import os
+from typing import Optional
+
+from vlm.clickhouse_utils import get_clickhouse_hpo_labels
+
+ONTOLOGY_API_URL = 'https://ontology.jax.org/'
+MONDO_OBO_PATH = os.environ.get(
+    'MONDO_OBO_PATH', f'{os.path.dirname(os.path.abspath(__file__))}/ontology_references/mondo.obo',
+)
+
+HPO_PREFIX = 'HP:'
+MONDO_PREFIX = 'MONDO:'
+
+
+def _parse_obo_term_labels(file_path: str, prefix: str) -> dict[str, str]:
+    labels = {}
+    term_id = None
+    with open(file_path) as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith('['):
+                term_id = None
+            elif line.startswith('id: '):
+                term_id = line[len('id: '):]
+            elif line.startswith('name: ') and term_id and term_id.startswith(prefix):
+                labels[term_id] = line[len('name: '):]
+    return labels
+
+
+class OntologyLabelStore:
+
+    def __init__(self, mondo_obo_path: Optional[str] = MONDO_OBO_PATH):
+        """Process-wide lookup of HPO and MONDO term labels, shared by all requests
+
+        HPO labels are loaded in bulk from the seqr reference data, MONDO labels from the bundled ontology file, and
+        the ontology API is only queried for terms missing from both
+        """
+        self._labels = _parse_obo_term_labels(mondo_obo_path, MONDO_PREFIX) \
+            if mondo_obo_path and os.path.isfile(mondo_obo_path) else {}
+
+    async def get_labels(self, term_ids: set[str]) -> dict[str, str]:
+        missing_ids = {term_id for term_id in term_ids if term_id not in self._labels}
+
+        missing_hpo_ids = sorted(term_id for term_id in missing_ids if term_id.startswith(HPO_PREFIX))
+        if missing_hpo_ids:
+            self._labels.update(await get_clickhouse_hpo_labels(missing_hpo_ids))
+            missing_ids -= self._labels.keys()
+
+        if missing_ids:
+            async with ClientSession(ONTOLOGY_API_URL) as session:
+                remote_labels = await asyncio.gather(*[
+                    self._get_remote_label(session, term_id) for term_id in sorted(missing_ids)
+                ])
+            self._labels.update(remote_labels)
+
+        return {term_id: self._labels[term_id] for term_id in term_ids}
+
+    @staticmethod
+    async def _get_remote_label(session: ClientSession, term_id: str) -> tuple[str, str]:
+        ontology = 'hp' if term_id.startswith(HPO_PREFIX) else 'mondo'
+        async with session.get(f'/api/{ontology}/terms/{term_id}') as resp:
+            return term_id, (await resp.json())['name']
+
+
+ONTOLOGY_LABEL_STORE: Optional[OntologyLabelStore] = None
+
+
+def init_ontology_label_store() -> OntologyLabelStore:
+    global ONTOLOGY_LABEL_STORE
+    ONTOLOGY_LABEL_STORE = OntologyLabelStore()
+    return ONTOLOGY_LABEL_STORE
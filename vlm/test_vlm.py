@@ -1,10 +1,15 @@
 from aiohttp.test_utils import AioHTTPTestCase
 from aioresponses import aioresponses
+import asyncio
 from datetime import datetime
 import jwt
 import logging
+import os
 import pytest
+from unittest import IsolatedAsyncioTestCase, mock
 
+from vlm.clickhouse_utils import ClickhouseClientPool
+from vlm.ontology_utils import OntologyLabelStore, _parse_obo_term_labels
 from vlm.web_app import init_web_app
 
 REQUESTER_CLIENT_ID = 'abc123'
@@ -207,6 +212,62 @@ class VlmTestCase(AioHTTPTestCase):
         }
         await self._test_match_endpoint('match', mocked_responses, response, only_37_response, empty_response)
 
+        async with self.client.request('POST', '/vlm/match_batch', headers=self._get_auth_headers(mocked_responses), json={
+            'variants': [
+                {'assemblyId': 'GRCh38', 'referenceName': '1', 'start': 38724419, 'referenceBases': 'T', 'alternateBases': 'G'},
+                {'assemblyId': 'hg19', 'referenceName': 'chr7', 'start': '143270172', 'referenceBases': 'A', 'alternateBases': 'G'},
+                {'assemblyId': 'GRCh38', 'referenceName': 'chr7', 'start': 143573079, 'referenceBases': 'A', 'alternateBases': 'G'},
+                {'assemblyId': 'hg38', 'referenceName': 'chr7', 'start': 143270172, 'referenceBases': 'A', 'alternateBases': 'G'},
+            ],
+        }) as resp:
+            self.assertEqual(resp.status, 200)
+            resp_json = await resp.json()
+        self.assertDictEqual(resp_json, {'results': [response, only_37_response, only_37_response, empty_response]})
+
+    @aioresponses(passthrough=['http://127.0.0.1'])
+    async def test_match_batch_error(self, mocked_responses):
+        async with self.client.request('POST', '/vlm/match_batch', json={'variants': []}) as resp:
+            self.assertEqual(resp.status, 403)
+            self.assertEqual(resp.reason, 'Invalid authorization header')
+
+        headers = self._get_auth_headers(mocked_responses)
+        async with self.client.request('POST', '/vlm/match_batch', headers=headers, data='foo') as resp:
+            self.assertEqual(resp.status, 400)
+            self.assertEqual(resp.reason, 'Invalid JSON body')
+
+        async with self.client.request('POST', '/vlm/match_batch', headers=headers, json={'variants': []}) as resp:
+            self.assertEqual(resp.status, 400)
+            self.assertEqual(resp.reason, 'Missing required parameters: variants')
+
+        variant = {'assemblyId': 'hg38', 'referenceName': '7', 'start': 143270172, 'referenceBases': 'A', 'alternateBases': 'G'}
+        with mock.patch('vlm.match.MAX_BATCH_VARIANTS', 2):
+            async with self.client.request('POST', '/vlm/match_batch', headers=headers, json={'variants': [variant] * 3}) as resp:
+                self.assertEqual(resp.status, 400)
+                self.assertEqual(resp.reason, 'Too many variants: 3 (max 2)')
+
+        async with self.client.request('POST', '/vlm/match_batch', headers=headers, json={'variants': [variant, 'foo']}) as resp:
+            self.assertEqual(resp.status, 400)
+            self.assertEqual(resp.reason, 'Invalid variant 1')
+
+        async with self.client.request('POST', '/vlm/match_batch', headers=headers, json={
+            'variants': [variant, {**variant, 'alternateBases': 'GAG'}],
+        }) as resp:
+            self.assertEqual(resp.status, 400)
+            self.assertEqual(resp.reason, 'Invalid variant 1: Invalid alternateBases: GAG')
+
+    @staticmethod
+    def _get_auth_headers(mocked_responses):
+        mocked_responses.post(
+            'https://vlm-auth.us.auth0.com/oauth/token', payload={'access_token': 'test_token'}, repeat=True,  # nosec
+        )
+        mocked_responses.get(
+            f'https://vlm-auth.us.auth0.com/api/v2/clients/{REQUESTER_CLIENT_ID}',
+            payload={'tenant': 'vlm-auth', 'name': 'Test Node'},
+            repeat=True,
+        )
+        jwt_body = {'iss': 'https://vlm-auth.us.auth0.com/', 'azp': REQUESTER_CLIENT_ID}
+        return {'Authorization': f'Bearer {jwt.encode(jwt_body, "")}'}
+
     @aioresponses(passthrough=['http://127.0.0.1'])
     async def test_match_details(self, mocked_responses):
         mocked_responses.get('https://ontology.jax.org/api/hp/terms/HP:0002011', repeat=True, payload={
@@ -214,11 +275,6 @@ class VlmTestCase(AioHTTPTestCase):
             'name': 'Morphological central nervous system abnormality',
             'definition': 'A structural abnormality of the central nervous system.',
         })
-        mocked_responses.get('https://ontology.jax.org/api/hp/terms/HP:0011675', repeat=True, payload={
-            'id': 'HP:0011675',
-            'name': 'Arrhythmia',
-            'definition': 'Any cardiac rhythm other than the normal sinus rhythm.',
-        })
         mocked_responses.get('https://ontology.jax.org/api/mondo/terms/MONDO:0044970', repeat=True, payload={
             'id': 'MONDO:0044970',
             'name': 'mitochondrial disease',
@@ -924,4 +980,94 @@ class VlmTestCase(AioHTTPTestCase):
 
         async with self.client.request('GET', f'/vlm/{path}?assemblyId=hg38&referenceName=7&start=143270172&referenceBases=A&alternateBases=GAG', headers=headers) as resp:
             self.assertEqual(resp.status, 400)
-            self.assertEqual(resp.reason,'Invalid alternateBases: GAG')
\ No newline at end of file
+            self.assertEqual(resp.reason,'Invalid alternateBases: GAG')
+
+
+class ClickhouseClientPoolTestCase(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.running_queries = 0
+        self.max_running_queries = 0
+        self.completed_queries = []
+        self.query_duration = 0.05
+
+        async def _mock_query(query, parameters=None, settings=None):
+            self.running_queries += 1
+            self.max_running_queries = max(self.max_running_queries, self.running_queries)
+            await asyncio.sleep(self.query_duration)
+            self.running_queries -= 1
+            self.completed_queries.append(query)
+            return mock.MagicMock(result_set=[(query,)])
+
+        self.mock_client = mock.MagicMock()
+        self.mock_client.query = mock.MagicMock(side_effect=_mock_query)
+        self.mock_client.close = mock.AsyncMock()
+        patcher = mock.patch('vlm.clickhouse_utils.clickhouse_connect.get_async_client', new_callable=mock.AsyncMock)
+        patcher.start().return_value = self.mock_client
+        self.addCleanup(patcher.stop)
+
+    async def test_concurrency_limit(self):
+        pool = ClickhouseClientPool(max_concurrent_queries=2, query_timeout=5)
+        results = await asyncio.gather(*[pool.query(f'query_{i}', {'i': i}) for i in range(5)])
+
+        self.assertListEqual(results, [[(f'query_{i}',)] for i in range(5)])
+        self.assertEqual(self.max_running_queries, 2)
+        self.mock_client.query.assert_called_with(
+            'query_4', parameters={'i': 4}, settings={'max_execution_time': 5},
+        )
+        await pool.close()
+        self.mock_client.close.assert_awaited_once()
+
+    async def test_query_timeout(self):
+        self.query_duration = 0.2
+        pool = ClickhouseClientPool(max_concurrent_queries=1, query_timeout=0.05)
+        with self.assertRaises(TimeoutError) as cm:
+            await pool.query('slow_query', {})
+        self.assertEqual(str(cm.exception), 'ClickHouse query timed out after 0.05 seconds')
+        self.mock_client.query.assert_called_with('slow_query', parameters={}, settings={'max_execution_time': 0.05})
+
+        # The timed out query still holds its slot until it finishes, so the next query waits for it
+        self.assertListEqual(self.completed_queries, [])
+        self.query_duration = 0
+        self.assertListEqual(await pool.query('next_query', {}), [('next_query',)])
+        self.assertListEqual(self.completed_queries, ['slow_query', 'next_query'])
+        self.assertEqual(self.max_running_queries, 1)
+
+
+MONDO_OBO_FIXTURE = f'{os.path.dirname(os.path.abspath(__file__))}/fixtures/mondo.obo'
+
+
+class OntologyLabelStoreTestCase(IsolatedAsyncioTestCase):
+
+    def test_parse_obo_term_labels(self):
+        self.assertDictEqual(_parse_obo_term_labels(MONDO_OBO_FIXTURE, 'MONDO:'), {
+            'MONDO:0044970': 'mitochondrial disease',
+            'MONDO:0000001': 'disease',
+        })
+        self.assertDictEqual(_parse_obo_term_labels(MONDO_OBO_FIXTURE, 'HP:'), {
+            'HP:0000118': 'Phenotypic abnormality',
+        })
+
+    @mock.patch('vlm.ontology_utils.get_clickhouse_hpo_labels')
+    async def test_mondo_labels_from_file(self, mock_get_hpo_labels):
+        mock_get_hpo_labels.return_value = {'HP:0002011': 'Morphological central nervous system abnormality'}
+        store = OntologyLabelStore(mondo_obo_path=MONDO_OBO_FIXTURE)
+
+        with aioresponses() as mocked_responses:
+            labels = await store.get_labels({'MONDO:0044970', 'HP:0002011'})
+            self.assertDictEqual(labels, {
+                'MONDO:0044970': 'mitochondrial disease',
+                'HP:0002011': 'Morphological central nervous system abnormality',
+            })
+            mock_get_hpo_labels.assert_called_once_with(['HP:0002011'])
+            self.assertDictEqual(mocked_responses.requests, {})
+
+        # Labels are only loaded once
+        mock_get_hpo_labels.reset_mock()
+        self.assertDictEqual(await store.get_labels({'HP:0002011'}), {
+            'HP:0002011': 'Morphological central nervous system abnormality',
+        })
+        mock_get_hpo_labels.assert_not_called()
+
+    def test_missing_mondo_file(self):
+        self.assertDictEqual(OntologyLabelStore(mondo_obo_path='/missing/mondo.obo')._labels, {})
@@ -3,7 +3,9 @@ import logging
 import traceback
 
 from vlm.auth import authenticate
-from vlm.match import get_variant_match, get_variant_match_details
+from vlm.clickhouse_utils import init_clickhouse_client_pool
+from vlm.match import get_variant_match, get_variant_match_details, get_variant_batch_match
+from vlm.ontology_utils import init_ontology_label_store
 
 logger = logging.getLogger(__name__)
 
@@ -38,11 +40,24 @@ async def match_details(request: web.Request) -> web.Response:
     return web.json_response(await get_variant_match_details(request.query))
 
 
+async def match_batch(request: web.Request) -> web.Response:
+    await authenticate(request)
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(reason='Invalid JSON body')
+    return web.json_response(await get_variant_batch_match(body))
+
+
 async def init_web_app():
     app = web.Application(middlewares=[error_middleware], client_max_size=(1024 ** 2) * 10)
     app.add_routes([
         web.get('/vlm/match', match),
         web.get('/vlm/match_details', match_details),
+        web.post('/vlm/match_batch', match_batch),
         web.get('/vlm/status', status),
     ])
+    clickhouse_client_pool = init_clickhouse_client_pool()
+    init_ontology_label_store()
+    app.on_cleanup.append(lambda app: clickhouse_client_pool.close())
     return app